@@ -0,0 +1,245 @@
+import os
+import csv
+import shutil
+import argparse
+import numpy as np
+import plotly.graph_objects as graph_obj
+from jinja2 import Environment, FileSystemLoader
+import plots
+from report import load_report
+
+# Per-genome metrics plotted on the dashboard, with their labels
+METRICS = [
+    ('essential_percentage', 'Essential Term Completeness (%)'),
+    ('metacyc_complete_percentage', 'Pathway Coherence (%)'),
+    ('complete_has_part_percentage', 'Process Coherence (%)'),
+    ('complex_coherence', 'Protein Complex Coherence (%)'),
+    ('consistency_percentage', 'Taxonomic Consistency (%)'),
+    ('ic_depth', 'IC Depth'),
+    ('ic_breadth', 'IC Breadth'),
+    ('normalized_ic_breadth', 'Normalized IC Breadth'),
+]
+
+# Columns of each output table, as (name, type)
+TABLES = {
+    'genomes': [('assembly_name', 'string')] + [(m, 'float') for m, _ in METRICS] + [
+        ('metacyc_completed', 'int'), ('metacyc_annotated', 'int'), ('satisfiable', 'bool'),
+        ('taxon_id', 'string'), ('violated_constraints', 'int')],
+    'pathways': [('assembly_name', 'string'), ('pathway', 'string'), ('go_term', 'string'),
+                 ('complete', 'bool'), ('missing_components', 'int')],
+    'complexes': [('assembly_name', 'string'), ('go_term', 'string'), ('status', 'string')],
+    'essential_terms': [('assembly_name', 'string'), ('term', 'string'), ('function', 'string'),
+                        ('category', 'string'), ('found', 'bool')],
+}
+
+# Rows buffered per table before a Parquet row group is written
+ROW_GROUP_SIZE = 100000
+
+# Genomes listed per side in each metric's outlier table
+OUTLIERS_SHOWN = 20
+
+REPORT_SUFFIXES = ('_report.json', '_report.json.gz', '_report.msgpack')
+
+
+class TsvTableWriter(object):
+    """Appends rows to {output_dir}/{name}.tsv as they arrive."""
+
+    def __init__(self, path, columns):
+        self.path = path + '.tsv'
+        self.file = open(self.path, 'w', newline='')
+        self.writer = csv.writer(self.file, delimiter='\t')
+        self.writer.writerow([c for c, _ in columns])
+
+    def write(self, row):
+        self.writer.writerow(['' if v is None else v for v in row])
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetTableWriter(object):
+    """
+    Writes rows to {output_dir}/{name}.parquet through the optional pyarrow
+    package, one row group per ROW_GROUP_SIZE buffered rows.
+    """
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet tables requires the 'pyarrow' package (pip install pyarrow); use --format tsv otherwise")
+        types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'bool': pa.bool_()}
+        self.pa = pa
+        self.path = path + '.parquet'
+        self.schema = pa.schema([(c, types[t]) for c, t in columns])
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression='zstd')
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            columns = list(zip(*self.rows))
+            self.writer.write_table(self.pa.Table.from_arrays(
+                [self.pa.array(col, type=field.type) for col, field in zip(columns, self.schema)], schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {'parquet': ParquetTableWriter, 'tsv': TsvTableWriter}
+
+
+def find_reports(paths):
+    """Yields the report files given directly or found in the given directories, in name order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(REPORT_SUFFIXES):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def report_rows(report):
+    """
+    Rows of every table for one report (as read by report.load_report).
+
+    Returns:
+    - dict: {table name: list of row tuples in TABLES column order}
+    """
+    name = report['assembly_name']
+    genome = (name,) + tuple(_float(report.get(m)) for m, _ in METRICS) + (
+        report.get('metacyc_completed'), report.get('metacyc_annotated'), report.get('satisfiable'),
+        None if report.get('taxon_id') is None else str(report['taxon_id']), report.get('violated_constraints'))
+
+    pathways = [(name, pathway, d.get('original_go_term'), bool(d.get('complete')), len(d.get('missing_components') or ()))
+                for pathway, d in (report.get('pathway_details') or {}).items()]
+    complexes = [(name, term, status) for term, status in (report.get('complex_classifications') or {}).items()]
+
+    found = report.get('found_terms') or set()
+    essential = []
+    for categories in (report.get('go_categories_core') or {}, report.get('go_categories_periph') or {}):
+        for category, entries in categories.items():
+            for e in entries:
+                essential.append((name, e['term'], e.get('Function'), category, e['term'] in found))
+
+    return {'genomes': [genome], 'pathways': pathways, 'complexes': complexes, 'essential_terms': essential}
+
+
+def outliers(names, values):
+    """
+    Genomes outside Tukey's fences (1.5 IQR beyond the quartiles) of one
+    metric, as (low, high) lists of (assembly_name, value), most extreme first.
+    """
+    known = ~np.isnan(values)
+    if known.sum() < 4:
+        return [], []
+    q1, q3 = np.percentile(values[known], [25, 75])
+    lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    order = np.argsort(values, kind='stable')
+    low = [(names[i], float(values[i])) for i in order.tolist() if known[i] and values[i] < lo]
+    high = [(names[i], float(values[i])) for i in order[::-1].tolist() if known[i] and values[i] > hi]
+    return low[:OUTLIERS_SHOWN], high[:OUTLIERS_SHOWN]
+
+
+def write_dashboard(names, metric_values, term_found, term_labels, output_file, assets=plots.CDN_ASSETS):
+    """
+    HTML dashboard: a histogram and outlier lists per metric and, per
+    essential term, the share of genomes where it was found.
+    """
+    sections = []
+    for i, (metric, label) in enumerate(METRICS):
+        values = metric_values[:, i]
+        known = values[~np.isnan(values)]
+        if not len(known):
+            continue
+        fig = graph_obj.Figure(graph_obj.Histogram(x=known, nbinsx=50))
+        fig.update_layout(xaxis_title=label, yaxis_title='Genomes', height=300, margin={'t': 20})
+        low, high = outliers(names, values)
+        sections.append({
+            'metric': metric, 'label': label, 'low': low, 'high': high,
+            'genomes': len(known), 'median': float(np.median(known)),
+            'plot_html': plots.figure_html(fig, f'hist-{metric}', assets),
+        })
+
+    terms = sorted(term_found, key=lambda t: term_found[t])
+    share = np.array([term_found[t] for t in terms], dtype=np.float64) / max(len(names), 1) * 100
+    fig = graph_obj.Figure(graph_obj.Bar(x=share, y=[f"{term_labels[t]} ({t})" for t in terms], orientation='h'))
+    fig.update_layout(xaxis_title='Genomes with the term (%)', height=max(300, 18 * len(terms)), margin={'t': 20})
+
+    env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')))
+    html = env.get_template('dashboard_template.html').render(
+        genomes=len(names), sections=sections, assets=assets,
+        essential_plot_html=plots.figure_html(fig, 'essential-terms', assets))
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return output_file
+
+
+def aggregate(report_files, output_dir, fmt='tsv', assets=None):
+    """
+    Streams report files (any format of report.write_report_data) into one table per entry of TABLES and an
+    HTML dashboard in output_dir.
+
+    Reports are read one at a time and their rows go straight to the table
+    writers, so memory is bounded by one report plus the per-genome metric
+    values kept for the dashboard.
+
+    Returns:
+    - int: number of genomes aggregated
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {name: WRITERS[fmt](os.path.join(output_dir, name), columns) for name, columns in TABLES.items()}
+    names = []
+    metric_values = []
+    term_found = {}
+    term_labels = {}
+    try:
+        for path in report_files:
+            report = load_report(path)
+            rows = report_rows(report)
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    writers[table].write(row)
+            names.append(report['assembly_name'])
+            metric_values.append([np.nan if v is None else v for v in rows['genomes'][0][1:len(METRICS) + 1]])
+            for _, term, function, _, found in rows['essential_terms']:
+                term_labels[term] = function
+                term_found[term] = term_found.get(term, 0) + found
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    metric_values = np.array(metric_values, dtype=np.float64).reshape(len(names), len(METRICS))
+    if assets is None:
+        # The CDN_ASSETS stylesheet is relative to the repository, so the
+        # dashboard gets its own copy
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), plots.STYLESHEET),
+                        os.path.join(output_dir, 'styles.css'))
+        assets = dict(plots.CDN_ASSETS, stylesheet='styles.css')
+    write_dashboard(names, metric_values, term_found, term_labels, os.path.join(output_dir, 'dashboard.html'), assets)
+    return len(names)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate the reports of many genomes into tables and a dashboard.')
+    parser.add_argument('reports', nargs='+', help='_report.json/.json.gz/.msgpack files, or directories holding them')
+    parser.add_argument('--output_dir', required=True, help='Directory for the tables and dashboard.html')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='tsv', help='Table format (parquet needs the optional pyarrow package)')
+    parser.add_argument('--report_assets', choices=['cdn', 'shared'], default='cdn', help='Load plotly.js from the CDN, or write it to {output_dir}/report_assets/ for offline viewing')
+    args = parser.parse_args()
+
+    assets = plots.write_report_assets(args.output_dir) if args.report_assets == 'shared' else None
+    n = aggregate(find_reports(args.reports), args.output_dir, args.format, assets)
+    print(f"Aggregated {n} genomes into {args.output_dir}")
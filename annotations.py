@@ -0,0 +1,254 @@
+import io
+import csv
+import gzip
+from array import array
+from collections.abc import Mapping
+import numpy as np
+import scipy.sparse as sp
+from utils import expand_annotations
+
+# Proteins expanded or filtered per sparse product; bounds the size of the
+# expanded block held in memory at any time.
+BLOCK_SIZE = 20000
+
+
+def open_annotation_file(annotation_file):
+    """
+    Opens an annotation TSV for reading as text. Files ending in .gz are
+    read through gzip and files ending in .zst through the optional
+    zstandard package; anything else is read as plain text.
+    """
+    if annotation_file.endswith('.gz'):
+        return gzip.open(annotation_file, 'rt', newline='')
+    if annotation_file.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading .zst annotation files requires the 'zstandard' package (pip install zstandard)")
+        raw = open(annotation_file, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), newline='')
+    return open(annotation_file, 'r', newline='')
+
+
+def iter_annotations(annotation_file):
+    """Yields (protein_id, [GO_terms]) rows of an annotation TSV, one at a time."""
+    with open_annotation_file(annotation_file) as f:
+        for row in csv.reader(f, delimiter='\t'):
+            if row:
+                yield row[0], row[1:]
+
+
+class AnnotationMatrix(Mapping):
+    """
+    Protein x term incidence matrix of one genome, readable as a
+    {protein_id: set(GO_terms)} mapping.
+
+    Rows are GOGraph term indices (alt_ids resolve to their primary term;
+    unknown and obsolete terms have no column). Rows holding such terms also
+    keep their original strings in raw_terms, so that the mapping view
+    returns exactly the terms that were read. Iterating items() or values()
+    builds one row set at a time.
+    """
+
+    def __init__(self, proteins, matrix, go, raw_terms=None):
+        self.proteins = proteins
+        self.matrix = matrix
+        self.go = go
+        self.raw_terms = raw_terms or {}
+        self._rows = None
+
+    def __len__(self):
+        return len(self.proteins)
+
+    def __iter__(self):
+        return iter(self.proteins)
+
+    def __getitem__(self, protein_id):
+        return self.row_terms(self.row_index(protein_id))
+
+    def row_index(self, protein_id):
+        if self._rows is None:
+            self._rows = {p: r for r, p in enumerate(self.proteins)}
+        return self._rows[protein_id]
+
+    def row_terms(self, r):
+        if r in self.raw_terms:
+            return set(self.raw_terms[r])
+        ids = self.go.ids
+        return set(map(ids.__getitem__, self.matrix.indices[self.matrix.indptr[r]:self.matrix.indptr[r + 1]].tolist()))
+
+    def items(self):
+        for r, protein_id in enumerate(self.proteins):
+            yield protein_id, self.row_terms(r)
+
+    def values(self):
+        for r in range(len(self.proteins)):
+            yield self.row_terms(r)
+
+    def blocks(self, block_size=BLOCK_SIZE):
+        """Yields (start, stop) row ranges of at most block_size proteins."""
+        for start in range(0, len(self.proteins), block_size):
+            yield start, min(start + block_size, len(self.proteins))
+
+    def genome_term_indices(self):
+        """Sorted term indices annotated to at least one protein."""
+        return np.unique(self.matrix.indices)
+
+    def expanded_genome_terms(self, relations=None):
+        """
+        Genome-level union of the annotated terms and all their ancestors,
+        taken from the closure rows of the distinct annotated terms only.
+        """
+        annotated = self.genome_term_indices()
+        closure = self.go.ancestor_closure(relations)
+        ids = self.go.ids
+        return set(map(ids.__getitem__, np.unique(closure[annotated].indices).tolist()))
+
+    def expanded(self, relations=None, block_size=BLOCK_SIZE, matrix=None):
+        """Mapping view of the ancestor-expanded annotations (see ExpandedAnnotations)."""
+        return ExpandedAnnotations(self, relations, block_size, matrix)
+
+    def specific(self, block_size=BLOCK_SIZE):
+        """
+        Most specific terms per protein (see utils.get_specific), computed one
+        block of proteins at a time.
+
+        Returns:
+        - AnnotationMatrix: the same proteins with redundant ancestors removed
+        """
+        strict = self.go.strict_ancestor_closure()
+        term_index = self.go.term_index
+        blocks = []
+        raw_terms = {}
+        for start, stop in self.blocks(block_size):
+            block = self.matrix[start:stop]
+            redundant = block.multiply(block @ strict).tocsr()
+            blocks.append((block.astype(np.int8) - redundant.astype(np.int8)).astype(bool))
+            for r in range(start, stop):
+                if r in self.raw_terms:
+                    drop = set(redundant.indices[redundant.indptr[r - start]:redundant.indptr[r - start + 1]].tolist())
+                    raw_terms[r] = {t for t in self.raw_terms[r] if term_index(t) not in drop}
+        matrix = sp.vstack(blocks, format='csr') if blocks else self.matrix.copy()
+        matrix.eliminate_zeros()
+        return AnnotationMatrix(self.proteins, matrix, self.go, raw_terms)
+
+
+class ExpandedAnnotations(Mapping):
+    """
+    Read-only {protein_id: set(GO_terms + ancestors)} view of an
+    AnnotationMatrix. items() expands block_size proteins per sparse
+    product, so only one expanded block is ever held in memory. An already
+    expanded matrix (e.g. from an incremental evaluation state) can be
+    passed instead and is then only sliced.
+    """
+
+    def __init__(self, annotations, relations=None, block_size=BLOCK_SIZE, matrix=None):
+        self.annotations = annotations
+        self.relations = relations
+        self.block_size = block_size
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def __iter__(self):
+        return iter(self.annotations)
+
+    def __getitem__(self, protein_id):
+        annotations = self.annotations
+        r = annotations.row_index(protein_id)
+        if self.matrix is not None:
+            expanded = self.matrix[r]
+        else:
+            expanded = expand_annotations(annotations.matrix[r], annotations.go, self.relations)
+        return set(map(annotations.go.ids.__getitem__, expanded.indices.tolist()))
+
+    def matrix_blocks(self):
+        """Yields (first row, expanded CSR block) for consecutive blocks of proteins."""
+        annotations = self.annotations
+        for start, stop in annotations.blocks(self.block_size):
+            if self.matrix is not None:
+                yield start, self.matrix[start:stop]
+            else:
+                yield start, expand_annotations(annotations.matrix[start:stop], annotations.go, self.relations)
+
+    def items(self):
+        ids = self.annotations.go.ids
+        proteins = self.annotations.proteins
+        for start, expanded in self.matrix_blocks():
+            indptr, indices = expanded.indptr, expanded.indices
+            for r in range(expanded.shape[0]):
+                yield proteins[start + r], set(map(ids.__getitem__, indices[indptr[r]:indptr[r + 1]].tolist()))
+
+    def values(self):
+        for _, terms in self.items():
+            yield terms
+
+
+def build_annotation_matrix(rows, go):
+    """
+    Builds an AnnotationMatrix from an iterable of (protein_id, GO_terms)
+    rows without holding them: GO IDs are interned to term indices as they
+    arrive and appended to growing CSR buffers. As with a dict, a protein
+    listed twice keeps its first position and its last terms.
+    """
+    interned = {}
+    proteins = []
+    positions = {}
+    duplicates = False
+    raw_terms = {}
+    indptr = array('q', [0])
+    indices = array('i')
+    ids = go.ids
+
+    for protein_id, terms in rows:
+        idx = set()
+        verbatim = True
+        for term in terms:
+            i = interned.get(term)
+            if i is None:
+                i = go.term_index(term)
+                i = -1 if i is None else i
+                interned[term] = i
+            if i < 0:
+                verbatim = False
+            else:
+                idx.add(i)
+                if ids[i] != term:
+                    verbatim = False
+        r = len(proteins)
+        if not verbatim:
+            raw_terms[r] = set(terms)
+        if protein_id in positions:
+            duplicates = True
+        positions[protein_id] = r
+        proteins.append(protein_id)
+        indices.extend(sorted(idx))
+        indptr.append(len(indices))
+
+    matrix = sp.csr_matrix((np.ones(len(indices), dtype=bool),
+                            np.frombuffer(indices, dtype=np.int32) if indices else np.zeros(0, dtype=np.int32),
+                            np.frombuffer(indptr, dtype=np.int64)),
+                           shape=(len(proteins), len(go)))
+
+    if duplicates:
+        # Keep dict semantics: first position, last occurrence
+        keep = []
+        seen = set()
+        for protein_id in proteins:
+            if protein_id not in seen:
+                seen.add(protein_id)
+                keep.append(positions[protein_id])
+        proteins = [proteins[r] for r in keep]
+        raw_terms = {new: raw_terms[old] for new, old in enumerate(keep) if old in raw_terms}
+        matrix = matrix[keep]
+
+    return AnnotationMatrix(proteins, matrix, go, raw_terms)
+
+
+def load_annotation_matrix(annotation_file, go):
+    """
+    Streams a plain, gzip (.gz) or zstandard (.zst) annotation TSV into an
+    AnnotationMatrix (see build_annotation_matrix).
+    """
+    return build_annotation_matrix(iter_annotations(annotation_file), go)
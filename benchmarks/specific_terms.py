@@ -0,0 +1,76 @@
+"""
+Benchmark of most-specific-term filtering (utils.get_specific).
+
+Compares the batch implementation against the previous per-protein set
+subtraction on the bundled model-organism annotation sets, and checks that
+both produce identical _specific_GO_terms.tsv rows.
+
+Usage (from the repository root):
+    python benchmarks/specific_terms.py [--obo data/go-basic.obo] [--repeat 3]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import load_annotations
+from utils import Ontology, load_go_graph, get_specific
+
+DEFAULT_INPUTS = sorted(glob.glob('manuscript_data/model_organisms/*.tsv')) + ['examples/input/example_annotation_file.tsv']
+
+
+def legacy_get_specific(protein_go_terms, go):
+    # Previous implementation: one ancestor-set subtraction per term
+    result = {}
+    for protein_id, terms in protein_go_terms.items():
+        specific = set(terms)
+        for term in terms:
+            ancestors = set(go.get_ancestors(term))
+            ancestors.discard(term)
+            specific -= ancestors
+        result[protein_id] = specific
+    return result
+
+
+def run_legacy(protein_go_terms, ontology):
+    # The legacy ancestor memo lived for one call, so start from an empty one
+    ontology.ancestors = {}
+    return legacy_get_specific(protein_go_terms, ontology)
+
+
+def specific_rows(result):
+    return [protein + "\t" + "\t".join(sorted(terms)) for protein, terms in result.items() if terms]
+
+
+def best_of(repeat, fn, *args):
+    best, out = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark utils.get_specific against the legacy implementation.')
+    parser.add_argument('--obo', default='data/go-basic.obo', help='Path to go-basic.obo')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per input (best time is reported)')
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS, help='Annotation files')
+    args = parser.parse_args()
+
+    ontology = Ontology(args.obo)
+    go = load_go_graph(args.obo)
+    go.ancestor_closure()
+    go.strict_ancestor_closure()
+
+    print("file\tproteins\tlegacy_s\tbatch_s\tspeedup\tidentical")
+    for path in args.inputs:
+        protein_go_terms = load_annotations(path)
+        legacy_time, legacy = best_of(args.repeat, run_legacy, protein_go_terms, ontology)
+        batch_time, batch = best_of(args.repeat, get_specific, protein_go_terms, go)
+        identical = specific_rows(legacy) == specific_rows(batch)
+        print(f"{os.path.basename(path)}\t{len(protein_go_terms)}\t{legacy_time:.3f}\t{batch_time:.3f}\t"
+              f"{legacy_time / batch_time:.1f}x\t{identical}")
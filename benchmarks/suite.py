@@ -0,0 +1,220 @@
+"""
+Benchmark suite of the evaluation pipeline.
+
+Runs the resource build (ontology parsing and closure, constraint and
+pathway compilation, without the binary cache) and the full evaluation
+(main.evaluation with a profiling.Profiler, which times every stage) on
+the bundled model-organism annotation sets and on synthetic proteomes of
+the given sizes. Synthetic proteomes resample rows of the model organisms
+under new protein IDs, so their term distribution matches real genomes.
+
+Each input is evaluated in its own forked process, so peak RSS is per
+input; rss_delta_mb is the growth over the process's RSS before the
+evaluation (the shared resources). For every stage the best wall time over
+--repeat runs is reported with its CPU time and throughput in proteins/s.
+
+Results are compared against a stored baseline (benchmarks/baseline.json,
+written with --save_baseline): a stage whose wall time or memory growth
+exceeds the baseline by more than --tolerance is reported as a regression
+and the exit status is 1. Baselines are machine-specific and not tracked
+in git; record one on the machine the comparison runs on.
+
+Usage (from the repository root):
+    python benchmarks/suite.py [--sizes 10000 100000 1000000] [--repeat 3]
+    python benchmarks/suite.py --save_baseline
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import coherence
+from utils import load_go_graph
+from profiling import Profiler, _peak_rss_mb
+from consistency import load_taxon_constraints, compile_taxon_constraints, load_taxon_lattice, taxon_ontology_files
+
+DEFAULT_INPUTS = sorted(glob.glob('manuscript_data/model_organisms/*.tsv')) + ['examples/input/example_annotation_file.tsv']
+DEFAULT_SIZES = [10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+RESOURCES = 'resources'
+
+# Stages faster than this (in the baseline) are too noisy to compare
+MIN_COMPARED_S = 0.01
+MIN_COMPARED_MB = 16
+
+_resources = None
+
+
+def synthetic_proteome(sources, size, output_file, seed=0):
+    """Writes size proteins sampled (with replacement) from the rows of the source annotation files."""
+    rows = []
+    for path in sources:
+        with open(path) as f:
+            rows.extend(line.rstrip('\n').split('\t', 1)[1] for line in f if '\t' in line)
+    picks = np.random.default_rng(seed).integers(0, len(rows), size)
+    with open(output_file, 'w') as f:
+        for i, r in enumerate(picks.tolist()):
+            f.write(f"synthetic_{i}\t{rows[r]}\n")
+    return output_file
+
+
+def build_resources(profiler):
+    # load_resources without the binary cache, one stage per resource
+    with profiler.stage('go_graph') as counts:
+        go = load_go_graph(main.ontology_file)
+        counts['terms'] = len(go)
+    with profiler.stage('go_closure') as counts:
+        go.closure = go.ancestor_closure()
+        counts['closure_pairs'] = int(go.closure.nnz)
+    with profiler.stage('taxon_constraints') as counts:
+        constraints = compile_taxon_constraints(*load_taxon_constraints(main.taxa_constraints_file), go)
+        counts['constrained_terms'] = len(constraints)
+    with profiler.stage('taxon_lattice') as counts:
+        lattice = load_taxon_lattice(taxon_ontology_files)
+        counts['taxa'] = len(lattice)
+    with profiler.stage('ec2go') as counts:
+        ec2go = coherence.parse_ec2go(main.ec2go_file)
+        counts['ec_numbers'] = len(ec2go)
+    with profiler.stage('has_part') as counts:
+        has_part = coherence.parse_has_part(main.has_part_file)
+        counts['terms'] = len(has_part)
+    with profiler.stage('pathways') as counts:
+        pathways = coherence.compile_pathways(coherence.load_pathway_slots(main.pathway_file), ec2go)
+        counts['pathways'] = len(pathways.pathways)
+    with profiler.stage('complexes') as counts:
+        complexes = coherence.compile_complexes(coherence.load_complex_classifications(main.complexes_file), go)
+        counts['complexes'] = len(complexes)
+
+
+def _evaluate(path):
+    profiler = Profiler()
+    with tempfile.TemporaryDirectory() as output_dir:
+        with profiler.stage('evaluation'):
+            # native_ic: time the IC stage without a JVM
+            main.evaluation('benchmark', path, resources=_resources, output_dir=output_dir, native_ic=True, profiler=profiler)
+    return profiler
+
+
+def run_input(name, path, repeat):
+    """
+    Benchmarks one input (RESOURCES for the resource build) in the calling
+    process. Returns {stage: measurements}, with the best wall time of
+    each stage over repeat runs.
+    """
+    start_rss = _peak_rss_mb()
+    stages = {}
+    for _ in range(repeat):
+        if name == RESOURCES:
+            profiler = Profiler()
+            build_resources(profiler)
+        else:
+            profiler = _evaluate(path)
+        for s in profiler.summary():
+            best = stages.get(s['stage'])
+            if best is None or s['wall_s'] < best['wall_s']:
+                stages[s['stage']] = {'wall_s': s['wall_s'], 'cpu_s': s['cpu_s'], 'counts': s['counts']}
+    peak = _peak_rss_mb()
+    proteins = stages.get('load_annotations', {}).get('counts', {}).get('proteins')
+    for stage in stages.values():
+        if proteins and stage['wall_s'] > 0:
+            stage['proteins_per_s'] = round(proteins / stage['wall_s'], 1)
+    return {'proteins': proteins, 'peak_rss_mb': round(peak, 1), 'rss_delta_mb': round(peak - start_rss, 1), 'stages': stages}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of results against the baseline, as (input, stage, metric,
+    baseline value, value) tuples.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('inputs', {}).get(name)
+        if base is None:
+            continue
+        if base['rss_delta_mb'] >= MIN_COMPARED_MB and result['rss_delta_mb'] > base['rss_delta_mb'] * tolerance:
+            regressions.append((name, '*', 'rss_delta_mb', base['rss_delta_mb'], result['rss_delta_mb']))
+        for stage, m in result['stages'].items():
+            b = base['stages'].get(stage)
+            if b is not None and b['wall_s'] >= MIN_COMPARED_S and m['wall_s'] > b['wall_s'] * tolerance:
+                regressions.append((name, stage, 'wall_s', b['wall_s'], m['wall_s']))
+    return regressions
+
+
+def print_results(results, baseline):
+    print("input\tproteins\tstage\twall_s\tcpu_s\tproteins_per_s\tbaseline_wall_s\tratio")
+    for name, result in results.items():
+        base = baseline.get('inputs', {}).get(name, {}).get('stages', {})
+        for stage, m in result['stages'].items():
+            b = base.get(stage, {}).get('wall_s')
+            ratio = f"{m['wall_s'] / b:.2f}" if b else ''
+            print(f"{name}\t{result['proteins'] or ''}\t{stage}\t{m['wall_s']:.4f}\t{m['cpu_s']:.4f}\t"
+                  f"{m.get('proteins_per_s', '')}\t{'' if b is None else f'{b:.4f}'}\t{ratio}")
+    print("input\tpeak_rss_mb\trss_delta_mb\tbaseline_rss_delta_mb")
+    for name, result in results.items():
+        b = baseline.get('inputs', {}).get(name, {}).get('rss_delta_mb', '')
+        print(f"{name}\t{result['peak_rss_mb']}\t{result['rss_delta_mb']}\t{b}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the evaluation stages and compare them against a stored baseline.')
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS, help='Annotation files')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES, help='Protein counts of the synthetic proteomes (e.g. 10000 100000 1000000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per input (best time per stage is reported)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against or write')
+    parser.add_argument('--save_baseline', action='store_true', help='Write the results as the new baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Slowdown or memory growth factor over the baseline reported as a regression')
+    parser.add_argument('--output', default=None, help='Also write the full results to this JSON file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    inputs = {RESOURCES: None}
+    inputs.update((os.path.basename(path), path) for path in args.inputs)
+    for size in args.sizes:
+        inputs[f"synthetic_{size}"] = synthetic_proteome(DEFAULT_INPUTS[:-1] or args.inputs, size,
+                                                         os.path.join(tmp, f"synthetic_{size}.tsv"))
+
+    # Resources are loaded (from the binary cache) before forking, like in
+    # batch mode, so each input process starts from the same shared state
+    _resources = main.load_resources()
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    results = {}
+    for name, path in inputs.items():
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results[name] = pool.submit(run_input, name, path, args.repeat).result()
+        print(f"# {name}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    document = {'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+                'repeat': args.repeat, 'inputs': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(document, f, indent=1)
+        print(f"Saved baseline {args.baseline}")
+    elif not baseline:
+        print(f"No baseline at {args.baseline}; record one with --save_baseline", file=sys.stderr)
+    else:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, stage, metric, before, after in regressions:
+            print(f"REGRESSION\t{name}\t{stage}\t{metric}\t{before} -> {after}")
+        print(f"{len(regressions)} regressions (tolerance {args.tolerance}x)")
+        sys.exit(1 if regressions else 0)
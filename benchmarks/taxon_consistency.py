@@ -0,0 +1,102 @@
+"""
+Benchmark of taxon constraint loading and consistency.check_consistency.
+
+Compares the compiled, vectorized join against the previous iterrows
+loader and per-protein, per-term dictionary lookups on the bundled
+model-organism annotation sets, and checks that both write the same
+_consistency.tsv rows (compared as sorted rows with sorted taxa).
+
+Usage (from the repository root):
+    python benchmarks/taxon_consistency.py [--obo data/go-basic.obo] [--repeat 3]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+from collections import defaultdict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import load_annotations, taxa_constraints_file
+from utils import load_go_graph, get_ancestors
+from annotations import load_annotation_matrix
+from consistency import load_taxon_constraints, compile_taxon_constraints, check_consistency
+
+DEFAULT_INPUTS = sorted(glob.glob('manuscript_data/model_organisms/*.tsv')) + ['examples/input/example_annotation_file.tsv']
+
+
+def legacy_load_taxon_constraints(constraints_file):
+    # Previous implementation: one pandas row object per constraint
+    constraints = pd.read_csv(constraints_file, sep="\t", dtype=str)
+    only_map = defaultdict(set)
+    never_map = defaultdict(set)
+    for _, row in constraints.iterrows():
+        if row["Constraint_Type"] == "only_in_taxon":
+            only_map[row["GO_ID"]].add(row["Taxon_ID"])
+        elif row["Constraint_Type"] == "never_in_taxon":
+            never_map[row["GO_ID"]].add(row["Taxon_ID"])
+    return only_map, never_map
+
+
+def legacy_check_consistency(annotation_file, go, only_map, never_map, output_file):
+    # Previous implementation: dict of expanded sets, one lookup per protein and term
+    protein_go_terms = get_ancestors(load_annotations(annotation_file), go)
+    with open(output_file, 'w') as out:
+        out.write("protein_name\tGO_ID\tnever_in_taxon\tonly_in_taxon\n")
+        for protein_id, go_terms in protein_go_terms.items():
+            for term in go_terms:
+                only_taxa = list(only_map[term])
+                never_taxa = list(never_map[term])
+                if only_taxa or never_taxa:
+                    out.write("\t".join([protein_id, term, ",".join(never_taxa), ",".join(only_taxa)]) + "\n")
+
+
+def compiled_check_consistency(annotation_file, go, constraints, output_file):
+    check_consistency(load_annotation_matrix(annotation_file, go).expanded(), constraints, output_file)
+
+
+def normalized_rows(output_file):
+    with open(output_file) as f:
+        return sorted('\t'.join(','.join(sorted(c.split(','))) for c in line.rstrip('\n').split('\t')) for line in f)
+
+
+def best_of(repeat, fn, *args):
+    best, out = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark consistency.check_consistency against the legacy implementation.')
+    parser.add_argument('--obo', default='data/go-basic.obo', help='Path to go-basic.obo')
+    parser.add_argument('--constraints', default=taxa_constraints_file, help='Taxon constraints TSV')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per input (best time is reported)')
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS, help='Annotation files')
+    args = parser.parse_args()
+
+    go = load_go_graph(args.obo)
+    go.ancestor_closure()
+
+    legacy_load, (legacy_only, legacy_never) = best_of(args.repeat, legacy_load_taxon_constraints, args.constraints)
+    load_time, (only_map, never_map) = best_of(args.repeat, load_taxon_constraints, args.constraints)
+    compile_time, constraints = best_of(args.repeat, compile_taxon_constraints, only_map, never_map, go)
+    print(f"load\tlegacy {legacy_load:.3f}s\tvectorized {load_time:.3f}s + compile {compile_time:.3f}s\t"
+          f"{legacy_load / (load_time + compile_time):.1f}x")
+
+    tmp = tempfile.mkdtemp()
+    legacy_file = os.path.join(tmp, 'legacy_consistency.tsv')
+    compiled_file = os.path.join(tmp, 'compiled_consistency.tsv')
+    print("file\trows\tlegacy_s\tcompiled_s\tspeedup\tidentical")
+    for path in args.inputs:
+        legacy_time, _ = best_of(args.repeat, legacy_check_consistency, path, go, legacy_only, legacy_never, legacy_file)
+        compiled_time, _ = best_of(args.repeat, compiled_check_consistency, path, go, constraints, compiled_file)
+        legacy_rows, compiled_rows = normalized_rows(legacy_file), normalized_rows(compiled_file)
+        print(f"{os.path.basename(path)}\t{len(compiled_rows) - 1}\t{legacy_time:.3f}\t{compiled_time:.3f}\t"
+              f"{legacy_time / compiled_time:.1f}x\t{legacy_rows == compiled_rows}")
@@ -0,0 +1,259 @@
+"""
+Builds every constraint file derived from a GO release in one pass.
+
+The full go.obo (go-basic.obo has no has_part edges) is streamed once and
+the derived files are written to --output_dir:
+
+- metacyc_GO_v{GO_VERSION}.tsv: GO classes and their MetaCyc pathway xrefs
+  (what generate_constraints/GO2Metacyc.py writes), the input of
+  generate_constraints/extract_ECs.py
+- has_part_relations.txt: one "part whole" line per has_part edge
+- complex_descendants.tsv: the is_a/part_of descendants of protein-containing
+  complex (GO:0032991) with their names and definitions, the terms
+  protein_complexes.tsv classifies
+
+The precompiled index bundle main.py loads (the binary cache entries of
+main.load_resources) is then built into --cache_dir, so the first
+evaluation starts warm. main.py reads its constraint files from
+constraints/, so the bundle is only built for that --output_dir; pass
+--no_index to write the files elsewhere.
+
+Builds are incremental: {output_dir}/.build_manifest.json records the
+digest of the source and of each output, so a file is only rebuilt when it
+is missing or edited, its source changed or ARTIFACT_VERSIONS was bumped,
+and the OBO is only parsed when something is stale. Index entries are
+content-addressed by cache.cached and rebuilt on the same terms.
+
+Usage:
+    python build_constraints.py --obo go.obo --go_version {GO_VERSION} [--output_dir constraints] [--no_index] [--force]
+"""
+import os
+import json
+import argparse
+
+import main
+import cache
+import coherence
+from utils import parse_obo, load_go_graph, IS_A, PART_OF
+from consistency import (load_taxon_constraints, compile_taxon_constraints, load_taxon_lattice, taxon_ontology_files,
+                         load_taxon_parents)
+
+HAS_PART = 'has_part'
+MANIFEST = '.build_manifest.json'
+
+# Bump an artifact's version whenever the way it is derived changes, so
+# existing files are rebuilt
+ARTIFACT_VERSIONS = {
+    'metacyc_xrefs': 1,
+    'has_part': 1,
+    'complex_descendants': 1,
+}
+
+
+def metacyc_xrefs(xrefs):
+    """(GO term, MetaCyc pathway) pairs of the MetaCyc pathway xrefs, in file order."""
+    return [(term_id, value.split(' ')[0].split(':')[1]) for term_id, value in xrefs
+            if value.startswith('MetaCyc:') and 'PWY' in value]
+
+
+def has_part_pairs(go):
+    """(part, whole) pairs of every has_part edge of the graph, in file order."""
+    if HAS_PART not in go.relations:
+        return []
+    code = go.relations.index(HAS_PART)
+    pairs = []
+    for i, whole in enumerate(go.ids):
+        lo, hi = go.parent_ptr[i], go.parent_ptr[i + 1]
+        for p, rel in zip(go.parent_idx[lo:hi].tolist(), go.parent_rel[lo:hi].tolist()):
+            if rel == code:
+                pairs.append((go.ids[p], whole))
+    return pairs
+
+
+def complex_descendants(go, definitions):
+    """
+    Returns:
+    - list: (GO term, name, definition) of protein-containing complex and its
+      is_a/part_of descendants, sorted by GO term
+    """
+    terms = coherence.get_all_child_terms(coherence.MACROMOLECULAR_COMPLEX, go, (IS_A, PART_OF))
+    terms.add(coherence.MACROMOLECULAR_COMPLEX)
+    return [(t, go.get_name(t), definitions.get(t, '')) for t in sorted(terms)]
+
+
+def _definition(value):
+    # def: "text" [references]
+    if value.startswith('"'):
+        end = value.rfind('" [')
+        return value[1:end if end > 0 else len(value)].replace('\\"', '"')
+    return value
+
+
+def write_metacyc_xrefs(pairs, output_file):
+    with open(output_file, 'w') as f:
+        f.write('GO_Term\tMetaCyc_Pathway\n')
+        for term_id, pathway in pairs:
+            f.write(f"{term_id}\t{pathway}\n")
+
+
+def write_has_part(pairs, output_file):
+    with open(output_file, 'w') as f:
+        for part, whole in pairs:
+            f.write(f"{part} {whole}\n")
+
+
+def write_complex_descendants(rows, output_file):
+    with open(output_file, 'w') as f:
+        f.write('GO_term\tname\tdefinition\n')
+        for term_id, name, definition in rows:
+            f.write(f"{term_id}\t{name}\t{definition}\n")
+
+
+class _OboParse(object):
+    """The OBO, parsed on first use only."""
+
+    def __init__(self, obo_file):
+        self.obo_file = obo_file
+        self._parsed = None
+
+    def __call__(self):
+        if self._parsed is None:
+            print(f"Parsing {self.obo_file}")
+            go, tags = parse_obo(self.obo_file, ('xref', 'def'))
+            self._parsed = go, tags['xref'], {t: _definition(v) for t, v in tags['def']}
+        return self._parsed
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(output_dir, manifest):
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def _is_current(entry, version, source, output_file):
+    return (entry is not None and entry['version'] == version and entry['source'] == source
+            and os.path.exists(output_file) and cache.file_digest([output_file]) == entry['output'])
+
+
+def build_artifacts(obo_file, go_version, output_dir, parse, force=False):
+    """
+    Writes the OBO-derived files that are missing or stale.
+
+    Returns:
+    - dict: {output file: True if it was rebuilt}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+    source = cache.file_digest([obo_file])
+
+    def metacyc():
+        go, xrefs, definitions = parse()
+        write_metacyc_xrefs(metacyc_xrefs(xrefs), path)
+
+    def has_part():
+        go, xrefs, definitions = parse()
+        write_has_part(has_part_pairs(go), path)
+
+    def complexes():
+        go, xrefs, definitions = parse()
+        write_complex_descendants(complex_descendants(go, definitions), path)
+
+    artifacts = [
+        ('metacyc_xrefs', f"metacyc_GO_v{go_version}.tsv", metacyc),
+        ('has_part', os.path.basename(main.has_part_file), has_part),
+        ('complex_descendants', 'complex_descendants.tsv', complexes),
+    ]
+    rebuilt = {}
+    for name, file_name, build in artifacts:
+        path = os.path.join(output_dir, file_name)
+        version = ARTIFACT_VERSIONS[name]
+        if not force and _is_current(manifest.get(file_name), version, source, path):
+            rebuilt[path] = False
+            continue
+        build()
+        manifest[file_name] = {'artifact': name, 'version': version, 'source': source,
+                               'output': cache.file_digest([path])}
+        _save_manifest(output_dir, manifest)
+        rebuilt[path] = True
+    return rebuilt
+
+
+def build_index(ontology_file, cache_dir, parse=None):
+    """
+    Builds the binary cache entries of main.load_resources from the same
+    constraint files it reads, reusing parse (an _OboParse) when it reads
+    ontology_file.
+
+    Returns:
+    - dict: {cache entry: True if it was rebuilt}
+    """
+    has_part_file, pathway_file, ec2go_file = main.has_part_file, main.pathway_file, main.ec2go_file
+    taxa_constraints_file = main.taxa_constraints_file
+    rebuilt = {}
+
+    def tracked(name, build):
+        def wrapped():
+            rebuilt[name] = True
+            return build()
+        rebuilt[name] = False
+        return wrapped
+
+    def graph():
+        if parse is not None and os.path.abspath(parse.obo_file) == os.path.abspath(ontology_file):
+            return parse()[0]
+        return load_go_graph(ontology_file)
+
+    go = cache.cached('go_graph', [ontology_file], tracked('go_graph', graph),
+                      cache.encode_go_graph, cache.decode_go_graph, cache_dir)
+    go.closure = cache.cached('go_closure', [ontology_file], tracked('go_closure', go.ancestor_closure),
+                              cache.encode_closure, cache.decode_closure, cache_dir)
+    cache.cached('taxon_constraints', [taxa_constraints_file, ontology_file],
+                 tracked('taxon_constraints', lambda: compile_taxon_constraints(*load_taxon_constraints(taxa_constraints_file), go)),
+                 cache.encode_taxon_constraints, cache.decode_taxon_constraints, cache_dir)
+    cache.cached('taxon_lattice', taxon_ontology_files, tracked('taxon_lattice', lambda: load_taxon_lattice(taxon_ontology_files)),
+                 cache.encode_taxon_lattice, cache.decode_taxon_lattice, cache_dir)
+    if os.path.exists(main.taxonomy_file):
+        cache.cached('taxon_parents', [main.taxonomy_file], tracked('taxon_parents', lambda: load_taxon_parents(main.taxonomy_file)),
+                     cache.encode_taxon_parents, cache.decode_taxon_parents, cache_dir)
+    ec2go_mapping = cache.cached('ec2go', [ec2go_file], tracked('ec2go', lambda: coherence.parse_ec2go(ec2go_file)),
+                                 cache.encode_str_map, cache.decode_str_list_map, cache_dir)
+    cache.cached('has_part', [has_part_file], tracked('has_part', lambda: coherence.parse_has_part(has_part_file)),
+                 cache.encode_str_map, cache.decode_str_map, cache_dir)
+    cache.cached('pathways', [pathway_file, ec2go_file],
+                 tracked('pathways', lambda: coherence.compile_pathways(coherence.load_pathway_slots(pathway_file), ec2go_mapping)),
+                 cache.encode_pathway_index, cache.decode_pathway_index, cache_dir)
+    cache.cached('complexes', [main.complexes_file, ontology_file],
+                 tracked('complexes', lambda: coherence.compile_complexes(coherence.load_complex_classifications(main.complexes_file), go)),
+                 cache.encode_complex_index, cache.decode_complex_index, cache_dir)
+    return rebuilt
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the constraint files derived from a GO release and the precompiled index bundle.')
+    parser.add_argument('--obo', required=True, help='Full go.obo of the GO release (go-basic.obo lacks has_part)')
+    parser.add_argument('--go_version', required=True, help='GO release, used in the name of metacyc_GO_v{GO_VERSION}.tsv')
+    parser.add_argument('--output_dir', default=os.path.dirname(main.has_part_file), help='Directory for the constraint files')
+    parser.add_argument('--ontology', default=main.ontology_file, help='Ontology main.py evaluates against, for the index bundle')
+    parser.add_argument('--cache_dir', default=cache.CACHE_DIR, help='Directory for the index bundle (binary cache)')
+    parser.add_argument('--no_index', action='store_true', help='Only write the constraint files, without the index bundle')
+    parser.add_argument('--force', action='store_true', help='Rebuild every constraint file, even if it is up to date (index entries follow their sources)')
+    args = parser.parse_args()
+    if not args.no_index and os.path.abspath(args.output_dir) != os.path.abspath(os.path.dirname(main.has_part_file)):
+        # The index would be keyed on files main.py does not read
+        parser.error(f"the index bundle is built from {os.path.dirname(main.has_part_file)}/, "
+                     f"which main.py reads; pass --no_index with another --output_dir")
+
+    parse = _OboParse(args.obo)
+    rebuilt = build_artifacts(args.obo, args.go_version, args.output_dir, parse, args.force)
+    if not args.no_index:
+        rebuilt.update(build_index(args.ontology, args.cache_dir, parse))
+    for output, built in rebuilt.items():
+        print(f"{'rebuilt' if built else 'up to date'}\t{output}")
+    print(f"{sum(rebuilt.values())} rebuilt, {len(rebuilt) - sum(rebuilt.values())} up to date")
@@ -0,0 +1,262 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from utils import GOGraph
+from coherence import PathwayIndex, ComplexIndex
+from consistency import TaxonConstraints, TaxonLattice
+
+CACHE_DIR = os.environ.get('GAEF_CACHE_DIR', '.gaef_cache')
+
+# Bump an entry's version whenever its parser or encoding changes so that
+# existing cache entries are rebuilt instead of silently reused.
+PARSER_VERSIONS = {
+    'go_graph': 1,
+    'go_closure': 1,
+    'taxon_constraints': 3,
+    'ec2go': 3,
+    'has_part': 1,
+    'pathways': 3,
+    'complexes': 1,
+    'taxon_lattice': 1,
+    'taxon_parents': 1,
+}
+
+
+def file_digest(paths, chunk_size=1 << 20):
+    """SHA-256 over the contents of one or more source files."""
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def save_arrays(directory, arrays):
+    os.makedirs(directory, exist_ok=True)
+    for key, value in arrays.items():
+        np.save(os.path.join(directory, key + '.npy'), value, allow_pickle=False)
+
+
+def load_arrays(directory):
+    arrays = {}
+    for fname in os.listdir(directory):
+        if fname.endswith('.npy'):
+            arrays[fname[:-4]] = np.load(os.path.join(directory, fname), mmap_mode='r', allow_pickle=False)
+    return arrays
+
+
+def cached(name, sources, build, encode, decode, cache_dir=None):
+    """
+    Returns build() through an on-disk binary cache.
+
+    Each entry lives in `{cache_dir}/{name}-v{version}-{digest}/` as one
+    .npy file per array, loaded memory-mapped on a warm start. The digest
+    covers the contents of every source file, so editing a source (or
+    bumping PARSER_VERSIONS[name]) makes the old entry unreachable; it is
+    removed the next time the entry is rebuilt. Caching is skipped when
+    cache_dir is False.
+    """
+    if cache_dir is False:
+        return build()
+    cache_dir = cache_dir or CACHE_DIR
+    key = f"{name}-v{PARSER_VERSIONS[name]}-{file_digest(sources)[:16]}"
+    entry = os.path.join(cache_dir, key)
+
+    if os.path.isdir(entry):
+        try:
+            return decode(load_arrays(entry))
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    obj = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.' + key, dir=cache_dir)
+        save_arrays(tmp, encode(obj))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another process published the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        for stale in os.listdir(cache_dir):
+            if stale.startswith(name + '-v') and stale != key:
+                shutil.rmtree(os.path.join(cache_dir, stale), ignore_errors=True)
+    except OSError as e:
+        print(f"Warning: could not write cache entry {key}: {e}")
+    return obj
+
+
+#### ENCODERS ####
+
+def str_array(values):
+    """Iterable of str -> numpy unicode array (also when empty), for save_arrays."""
+    values = list(values)
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype='U1')
+
+
+def _ptr_array(lengths):
+    ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ptr[1:])
+    return ptr
+
+
+def encode_str_map(mapping):
+    """{str: iterable(str)} -> keys/ptr/values arrays."""
+    keys = list(mapping)
+    values = [list(mapping[k]) for k in keys]
+    return {
+        'keys': str_array(keys),
+        'ptr': _ptr_array([len(v) for v in values]),
+        'values': str_array(v for vs in values for v in vs),
+    }
+
+
+def decode_str_map(arrays, container=set):
+    keys = arrays['keys'].tolist()
+    ptr = arrays['ptr'].tolist()
+    values = arrays['values'].tolist()
+    return {k: container(values[ptr[i]:ptr[i + 1]]) for i, k in enumerate(keys)}
+
+
+def decode_str_list_map(arrays):
+    return decode_str_map(arrays, container=list)
+
+
+def encode_go_graph(go):
+    return {
+        'ids': str_array(go.ids),
+        'names': str_array(go.names),
+        'namespace': go.namespace,
+        'obsolete': go.obsolete,
+        'alt_keys': str_array(go.alt_ids.keys()),
+        'alt_values': str_array(go.alt_ids.values()),
+        'relations': str_array(go.relations),
+        'parent_ptr': go.parent_ptr,
+        'parent_idx': go.parent_idx,
+        'parent_rel': go.parent_rel,
+    }
+
+
+def decode_go_graph(arrays):
+    return GOGraph(
+        arrays['ids'].tolist(),
+        arrays['names'].tolist(),
+        arrays['namespace'],
+        arrays['obsolete'],
+        zip(arrays['alt_keys'].tolist(), arrays['alt_values'].tolist()),
+        arrays['relations'].tolist(),
+        arrays['parent_ptr'],
+        arrays['parent_idx'],
+        arrays['parent_rel'])
+
+
+def encode_closure(closure):
+    return {'indptr': closure.indptr, 'indices': closure.indices}
+
+
+def decode_closure(arrays):
+    indptr, indices = arrays['indptr'], arrays['indices']
+    n = len(indptr) - 1
+    return sp.csr_matrix((np.ones(len(indices), dtype=bool), indices, indptr), shape=(n, n))
+
+
+def encode_pathway_index(index):
+    return {
+        'pathways': str_array(index.pathways),
+        'terms': str_array(index.terms),
+        'ecs': str_array(index.ecs),
+        'original_idx': index.original_idx,
+        'path_ptr': index.path_ptr,
+        'slot_ptr': index.slot_ptr,
+        'alt_ptr': index.alt_ptr,
+        'alt_ec': index.alt_ec,
+        'term_ptr': index.term_ptr,
+        'alt_terms': index.alt_terms,
+    }
+
+
+def decode_pathway_index(arrays):
+    return PathwayIndex(
+        arrays['pathways'].tolist(),
+        arrays['terms'].tolist(),
+        arrays['ecs'].tolist(),
+        arrays['original_idx'],
+        arrays['path_ptr'],
+        arrays['slot_ptr'],
+        arrays['alt_ptr'],
+        arrays['alt_ec'],
+        arrays['term_ptr'],
+        arrays['alt_terms'])
+
+
+def encode_complex_index(index):
+    return {
+        'is_complex': index.is_complex,
+        'min_proteins': index.min_proteins,
+        'homodimer_ok': index.homodimer_ok,
+        'closure_ptr': index.closure_ptr,
+        'closure_cols': index.closure_cols,
+    }
+
+
+def decode_complex_index(arrays):
+    return ComplexIndex(
+        arrays['is_complex'],
+        arrays['min_proteins'],
+        arrays['homodimer_ok'],
+        arrays['closure_ptr'],
+        arrays['closure_cols'])
+
+
+def encode_taxon_constraints(constraints):
+    return {
+        'go_ids': str_array(constraints.go_ids),
+        'terms': constraints.terms,
+        'taxa': str_array(constraints.taxa),
+        'only_ptr': constraints.only_ptr,
+        'only_idx': constraints.only_idx,
+        'never_ptr': constraints.never_ptr,
+        'never_idx': constraints.never_idx,
+    }
+
+
+def decode_taxon_constraints(arrays):
+    return TaxonConstraints(
+        arrays['go_ids'].tolist(),
+        arrays['terms'],
+        arrays['taxa'].tolist(),
+        arrays['only_ptr'],
+        arrays['only_idx'],
+        arrays['never_ptr'],
+        arrays['never_idx'])
+
+
+def encode_taxon_lattice(lattice):
+    return {
+        'taxa': str_array(lattice.taxa),
+        'parent_ptr': lattice.parent_ptr,
+        'parent_idx': lattice.parent_idx,
+        'disjoint_a': lattice.disjoint_a,
+        'disjoint_b': lattice.disjoint_b,
+    }
+
+
+def decode_taxon_lattice(arrays):
+    return TaxonLattice(
+        arrays['taxa'].tolist(),
+        arrays['parent_ptr'],
+        arrays['parent_idx'],
+        arrays['disjoint_a'],
+        arrays['disjoint_b'])
+
+
+def encode_taxon_parents(parents):
+    return {'parents': parents}
+
+
+def decode_taxon_parents(arrays):
+    return arrays['parents']
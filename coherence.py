@@ -1,6 +1,9 @@
 import ast
-import re
+import json
+import numpy as np
+import scipy.sparse as sp
 from collections import defaultdict
+from utils import IS_A, PART_OF
 
 #### PROCESS COHERENCE ####
 def parse_has_part(file_path):
@@ -29,36 +32,50 @@ def parse_has_part(file_path):
 def check_has_part(protein_go_terms, has_part_dict):
     """
     Check if the required 'has-part' GO terms are included in the genome's GO terms.
-    Returns the percentage of missing 'has-part' relations at the genome level.
+    Returns the percentage of present 'has-part' relations at the genome level.
+
+    Missing parts are computed once per annotated has_part term against the
+    genome-wide term set, so the cost is linear in the number of annotations.
+    Details are listed by protein, in row order, then by has_part term.
     """
     genome_go_terms = set()
-    for go_terms in protein_go_terms.values():
+    carriers = []
+    for protein_id, go_terms in protein_go_terms.items():
         genome_go_terms.update(go_terms)
+        has_part_terms = sorted(t for t in go_terms if t in has_part_dict)
+        if has_part_terms:
+            carriers.append((protein_id, has_part_terms))
 
     missing_relations_count = 0
     total_relations_count = 0
+    missing_parts = {}
     protein_details = []
-    for protein_id, go_terms in protein_go_terms.items():
-        for go_term in genome_go_terms:
-            if go_term in has_part_dict:
+    for protein_id, has_part_terms in carriers:
+        for go_term in has_part_terms:
+            if go_term not in missing_parts:
                 required_parts = has_part_dict[go_term]
-                missing = sorted(required_parts - genome_go_terms)
-                missing_relations_count += len(missing)
+                missing_parts[go_term] = sorted(required_parts - genome_go_terms)
+                missing_relations_count += len(missing_parts[go_term])
                 total_relations_count += len(required_parts)
-                protein_details.append({
-						  "protein_id": protein_id,
-						  "annotated_term": go_term,
-						  "missing_parts": missing
-					 })
+            protein_details.append({
+                "protein_id": protein_id,
+                "annotated_term": go_term,
+                "missing_parts": missing_parts[go_term]
+            })
 
     if total_relations_count == 0:
-        return 0
+        return 0, protein_details
     missing_percentage = (missing_relations_count / total_relations_count) * 100
     process_coherence = (100 - missing_percentage)
     return process_coherence, protein_details
 
 #### PATHWAY COHERENCE ####
 def parse_ec2go(filename):
+    """
+    Parse an ec2go file.
+
+    Returns the EC -> [GO terms] mapping, in file order.
+    """
     ec2go = {}
     with open(filename, 'r') as file:
         for line in file:
@@ -73,167 +90,365 @@ def parse_ec2go(filename):
     return ec2go
 
 
-def map_pathways_to_go_terms(pathway_file, ec2go):
-    pathway_to_go = {}
+PATHWAY_SLOTS_HEADER = ['GO_Term', 'MetaCyc_Pathway', 'Reaction_Slots']
+
+
+def combinations_to_slots(ec_combinations):
+    """
+    Converts the EC_Combinations of one pathway, the cartesian products of
+    the alternative EC numbers of the reactions of each path, back into
+    paths of reaction slots.
+
+    Combinations that differ in one position only are merged into one with
+    the union of the alternatives at that position until nothing changes, so
+    the product of every path's alternatives is recovered. The slot paths
+    cover exactly the given combinations.
+
+    Returns:
+    - list: paths, each a list of slots (sorted lists of alternative EC numbers)
+    """
+    by_length = defaultdict(set)
+    for combination in ec_combinations:
+        by_length[len(combination)].add(tuple(frozenset([ec]) for ec in combination))
+    paths = []
+    for length, cubes in by_length.items():
+        merged = True
+        while merged:
+            merged = False
+            for i in range(length):
+                groups = defaultdict(set)
+                for cube in cubes:
+                    groups[cube[:i] + cube[i + 1:]].add(cube[i])
+                if len(groups) < len(cubes):
+                    merged = True
+                    cubes = {rest[:i] + (frozenset().union(*slots),) + rest[i:] for rest, slots in groups.items()}
+        paths.extend([sorted(slot) for slot in cube] for cube in cubes)
+    return sorted(paths)
+
+
+def load_pathway_slots(pathway_file):
+    """
+    Reads pathway requirements: per MetaCyc pathway, its GO term and the
+    paths through it as lists of reaction slots, each slot a list of
+    alternative EC numbers (JSON in the Reaction_Slots column).
+
+    Files in the previous EC_Combinations format (one enumerated EC list
+    per combination) are converted with combinations_to_slots.
+
+    Returns:
+    - dict: {pathway: (original GO term, paths)}
+    """
+    pathway_slots = {}
     with open(pathway_file, 'r') as file:
-        next(file)
+        header = next(file).rstrip('\n').split('\t')
+        combinations = header[2] == 'EC_Combinations'
         for line in file:
-            parts = line.strip().split('\t')
-            original_go_term, pathway, ec_combinations = parts[0], parts[1], parts[2]
-            if ec_combinations.strip() == '':
-                go_terms_sets = []
+            parts = line.rstrip('\n').split('\t')
+            original_go_term, pathway, requirements = parts[0], parts[1], parts[2].strip()
+            if not requirements:
+                paths = []
+            elif combinations:
+                paths = combinations_to_slots(ast.literal_eval(requirements))
             else:
-                ec_combination_lists = ast.literal_eval(ec_combinations)
-                go_terms_sets = []
-                for ec_list in ec_combination_lists:
-                    go_terms_set = set()
-                    for ec in ec_list:
-                        if ec in ec2go:
-                            go_terms_set.update(ec2go[ec])
-                    if go_terms_set:
-                        go_terms_sets.append(go_terms_set)
-            pathway_to_go[pathway] = (original_go_term, go_terms_sets)
-    return pathway_to_go
-
-
-def analyze_genome(protein_go_terms, pathway_to_go, ec2go_mapping):
+                paths = json.loads(requirements)
+            pathway_slots[pathway] = (original_go_term, paths)
+    return pathway_slots
+
+
+def write_pathway_slots(pathway_slots, output_file):
+    """Writes load_pathway_slots output in the Reaction_Slots format."""
+    with open(output_file, 'w') as f:
+        f.write('\t'.join(PATHWAY_SLOTS_HEADER) + '\n')
+        for pathway, (original_go_term, paths) in pathway_slots.items():
+            f.write(f"{original_go_term}\t{pathway}\t{json.dumps(paths, separators=(',', ':')) if paths else ''}\n")
+
+
+class PathwayIndex(object):
+    """
+    Precompiled pathway requirements over local integer term and EC
+    vocabularies.
+
+    A pathway is complete when any of its paths is satisfied; a path is
+    satisfied when each of its reaction slots has an alternative EC whose GO
+    terms (ec2go) are all present, and at least one of these alternatives
+    maps to GO terms. ECs without GO terms are kept as alternatives with no
+    terms: they cannot be checked and satisfy their slot.
+
+    The paths of pathway p are path_ptr[p]..path_ptr[p + 1], the slots of
+    path q are slot_ptr[q]..slot_ptr[q + 1] and the alternatives of slot s
+    are alt_ptr[s]..alt_ptr[s + 1]; alternative a is EC ecs[alt_ec[a]] and
+    requires the terms alt_terms[term_ptr[a]:term_ptr[a + 1]].
+    posting_ptr/posting_alts list, for every term, the alternatives that
+    require it.
+    """
+
+    def __init__(self, pathways, terms, ecs, original_idx, path_ptr, slot_ptr, alt_ptr, alt_ec, term_ptr, alt_terms):
+        self.pathways = list(pathways)
+        self.terms = list(terms)
+        self.ecs = list(ecs)
+        self.term_index = {t: i for i, t in enumerate(self.terms)}
+        self.original_idx = np.asarray(original_idx, dtype=np.int32)
+        self.path_ptr = np.asarray(path_ptr, dtype=np.int64)
+        self.slot_ptr = np.asarray(slot_ptr, dtype=np.int64)
+        self.alt_ptr = np.asarray(alt_ptr, dtype=np.int64)
+        self.alt_ec = np.asarray(alt_ec, dtype=np.int32)
+        self.term_ptr = np.asarray(term_ptr, dtype=np.int64)
+        self.alt_terms = np.asarray(alt_terms, dtype=np.int32)
+
+        n_paths, n_slots, n_alts = len(self.slot_ptr) - 1, len(self.alt_ptr) - 1, len(self.term_ptr) - 1
+        self.path_pathway = np.repeat(np.arange(len(self.pathways), dtype=np.int32), np.diff(self.path_ptr))
+        self.slot_path = np.repeat(np.arange(n_paths, dtype=np.int32), np.diff(self.slot_ptr))
+        self.alt_slot = np.repeat(np.arange(n_slots, dtype=np.int32), np.diff(self.alt_ptr))
+        self.entry_alt = np.repeat(np.arange(n_alts, dtype=np.int32), np.diff(self.term_ptr))
+        self.alt_mapped = np.diff(self.term_ptr) > 0
+        order = np.argsort(self.alt_terms, kind='stable')
+        self.posting_alts = self.entry_alt[order]
+        self.posting_ptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.alt_terms, minlength=len(self.terms)), out=self.posting_ptr[1:])
+
+    def term_presence(self, genome_go_set):
+        return np.fromiter((t in genome_go_set for t in self.terms), dtype=bool, count=len(self.terms))
+
+    def score(self, present):
+        """
+        Scores every pathway against a boolean term-presence vector, slot by
+        slot.
+
+        Returns (annotated, complete, path_satisfied, slot_satisfied)
+        boolean arrays: a pathway without paths is complete.
+        """
+        n_paths, n_slots, n_alts = len(self.slot_ptr) - 1, len(self.alt_ptr) - 1, len(self.term_ptr) - 1
+        alt_ok = np.bincount(self.entry_alt, weights=~present[self.alt_terms], minlength=n_alts) == 0
+        slot_ok = np.bincount(self.alt_slot, weights=alt_ok, minlength=n_slots) > 0
+        slot_checked = np.bincount(self.alt_slot, weights=alt_ok & self.alt_mapped, minlength=n_slots) > 0
+        path_ok = ((np.bincount(self.slot_path, weights=~slot_ok, minlength=n_paths) == 0)
+                   & (np.bincount(self.slot_path, weights=slot_checked, minlength=n_paths) > 0))
+        n_complete = np.bincount(self.path_pathway, weights=path_ok, minlength=len(self.pathways))
+        complete = (n_complete > 0) | (np.diff(self.path_ptr) == 0)
+        return present[self.original_idx], complete, path_ok, slot_ok
+
+    def slot_ecs(self, s):
+        return [self.ecs[e] for e in self.alt_ec[self.alt_ptr[s]:self.alt_ptr[s + 1]].tolist()]
+
+    def pathways_for_terms(self, terms):
+        """Indices of pathways whose slots or original term involve any of the given terms."""
+        idx = np.array([self.term_index[t] for t in terms if t in self.term_index], dtype=np.int64)
+        alts = np.concatenate([self.posting_alts[self.posting_ptr[i]:self.posting_ptr[i + 1]] for i in idx]) if len(idx) else np.zeros(0, dtype=np.int32)
+        hits = set(self.path_pathway[self.slot_path[self.alt_slot[alts]]].tolist())
+        hits.update(np.flatnonzero(np.isin(self.original_idx, idx)).tolist())
+        return hits
+
+
+def compile_pathways(pathway_slots, ec2go):
+    """
+    Builds a PathwayIndex from load_pathway_slots output and the EC -> GO
+    mapping.
+
+    Paths with an empty slot, or whose ECs map to no GO term at all, are
+    dropped: they have no combination of ECs that can be checked.
+    """
+    term_index, ec_index = {}, {}
+    intern = lambda index, key: index.setdefault(key, len(index))
+    pathways, original_idx, path_ptr, slot_ptr, alt_ptr, alt_ec, term_ptr, alt_terms = [], [], [0], [0], [0], [], [0], []
+    for pathway, (original_go_term, paths) in pathway_slots.items():
+        pathways.append(pathway)
+        original_idx.append(intern(term_index, original_go_term))
+        for path in paths:
+            if not all(path) or not any(ec in ec2go for slot in path for ec in slot):
+                continue
+            for slot in path:
+                for ec in slot:
+                    alt_ec.append(intern(ec_index, ec))
+                    alt_terms.extend(intern(term_index, t) for t in sorted(set(ec2go.get(ec, ()))))
+                    term_ptr.append(len(alt_terms))
+                alt_ptr.append(len(alt_ec))
+            slot_ptr.append(len(alt_ptr) - 1)
+        path_ptr.append(len(slot_ptr) - 1)
+    return PathwayIndex(pathways, list(term_index), list(ec_index), original_idx, path_ptr, slot_ptr, alt_ptr, alt_ec, term_ptr, alt_terms)
+
+
+def analyze_genome(genome_go_set, pathway_index, pathways=None):
+    """
+    Pathway coherence for one genome, from its genome-level set of
+    ancestor-expanded GO terms.
+
+    All pathways are scored at once with PathwayIndex.score; only the
+    annotated ones are then walked to report, for the incomplete ones, the
+    missing reaction slots of their paths as lists of alternative EC
+    numbers. A path without any unsatisfied slot can still fail when none
+    of its ECs has its GO terms; its slots with GO-mapped ECs are reported
+    then. `pathways` (pathway indices) restricts the report to those
+    pathways, e.g. the ones touched by a change of the genome's terms.
+    """
     completeness_results = {}
     completed_pathways = []
     annotated_pathways = set()
     pathway_details = {}
 
-    genome_go_set = set(go_term for go_terms in protein_go_terms.values() for go_term in go_terms)
-
-    for pathway, (original_go_term, go_terms_sets) in pathway_to_go.items():
-        # Only proceed if the original GO term is present
-        if original_go_term not in genome_go_set:
-            continue
+    present = pathway_index.term_presence(genome_go_set)
+    annotated, complete, path_ok, slot_ok = pathway_index.score(present)
 
+    selected = np.flatnonzero(annotated)
+    if pathways is not None:
+        selected = np.intersect1d(selected, np.fromiter(pathways, dtype=np.int64))
+    for p in selected.tolist():
+        pathway = pathway_index.pathways[p]
+        pathway_complete = bool(complete[p])
         annotated_pathways.add(pathway)
         missing_components = []
 
-        if not go_terms_sets:
-            pathway_complete = True
-        else:
-            pathway_complete = any(
-                all(go_term in genome_go_set for go_term in combo)
-                for combo in go_terms_sets
-            )
-            if not pathway_complete:
-                for combo in go_terms_sets:
-                    missing_ec_go_terms = [go_term for go_term in combo if go_term not in genome_go_set]
-                    if missing_ec_go_terms:
-                        missing_components.append(missing_ec_go_terms)
+        if not pathway_complete:
+            seen = set()
+            for q in range(pathway_index.path_ptr[p], pathway_index.path_ptr[p + 1]):
+                slots = range(pathway_index.slot_ptr[q], pathway_index.slot_ptr[q + 1])
+                missing = [s for s in slots if not slot_ok[s]]
+                if not missing:
+                    missing = [s for s in slots if pathway_index.alt_mapped[pathway_index.alt_ptr[s]:pathway_index.alt_ptr[s + 1]].any()]
+                for s in missing:
+                    ecs = pathway_index.slot_ecs(s)
+                    if tuple(ecs) not in seen:
+                        seen.add(tuple(ecs))
+                        missing_components.append(ecs)
 
         completeness_results[pathway] = pathway_complete
         if pathway_complete:
             completed_pathways.append(pathway)
-            
-        if ec2go_mapping and missing_components:
-            mapped = []
-            for go_set in missing_components:
-                ecs = set()
-                for go in go_set:
-                    for ec, gos in ec2go_mapping.items():
-                        if go in gos:
-                            ecs.add(ec)
-                if ecs:
-                    mapped.append(list(ecs))
-            missing_components = mapped
 
         pathway_details[pathway] = {
             "complete": pathway_complete,
-            "original_go_term": original_go_term,
+            "original_go_term": pathway_index.terms[pathway_index.original_idx[p]],
             "missing_components": missing_components
         }
 
     return completeness_results, completed_pathways, annotated_pathways, pathway_details
 
+
 #### COMPLEX COHERENCE ####
 MACROMOLECULAR_COMPLEX = "GO:0032991"
 HOMODIMERIZATION = "GO:0042803"
 
-def classify_complexes(protein_go_terms, complex_child_terms, homodimer_terms=None):
-    complex_term_to_proteins = defaultdict(set)
-    for protein_id, terms in protein_go_terms.items():
-        if MACROMOLECULAR_COMPLEX in terms:
-            protein_complex_terms = complex_child_terms.intersection(terms)
-            for term in protein_complex_terms:
-                complex_term_to_proteins[term].add(protein_id)
-
-    complex_classifications = {}
-    for term, proteins in complex_term_to_proteins.items():
-        if homodimer_terms and term in homodimer_terms:
-            complex_classifications[term] = "coherent"
-        elif len(proteins) > 1:
-            complex_classifications[term] = "coherent"
-        else:
-            complex_classifications[term] = "incoherent"
-
-    return complex_classifications, complex_term_to_proteins
-
+# Curated subunit classes of protein_complexes.tsv: homomeric (one protein
+# can form the complex), either homo- or heteromeric, and heteromeric
+SINGLE_SUBUNIT = 'h'
+EITHER = 'a'
+MULTI_SUBUNIT = 'n'
 
-def count_complexes(complex_classifications):
-    coherent_count = sum(1 for c in complex_classifications.values() if c == "coherent")
-    incoherent_count = sum(1 for c in complex_classifications.values() if c == "incoherent")
-    return coherent_count, incoherent_count
 
+def load_complex_classifications(complexes_file):
+    """
+    Reads the curated subunit class (SINGLE_SUBUNIT, EITHER or
+    MULTI_SUBUNIT) of complex terms from a protein_complexes.tsv file
+    (GO_term, classification, definition columns).
 
-def parse_go_ontology(file_path):
-    term_to_children = defaultdict(set)
-    term_to_parents = defaultdict(set)
-    term_to_definition = {}
-
-    current_term = None
-    term_id = None
-
-    with open(file_path, 'r') as f:
+    Returns:
+    - dict: {GO term: class}
+    """
+    classifications = {}
+    with open(complexes_file, 'r') as f:
+        next(f, None)
         for line in f:
-            line = line.strip()
-            if line == '[Term]':
-                current_term = True
-                term_id = None
-                continue
-            if line == '' and current_term:
-                current_term = False
-                continue
-            if not current_term:
-                continue
-            if line.startswith('id:'):
-                term_id = line.split('id:')[1].strip()
-                continue
-            if line.startswith('def:'):
-                if term_id:
-                    definition = line.split('def:')[1].strip()
-                    match = re.search(r'"([^"]*)"', definition)
-                    term_to_definition[term_id] = match.group(1) if match else definition
-                continue
-            if line.startswith('is_a:'):
-                if term_id:
-                    parent_id = line.split('is_a:')[1].split('!')[0].strip()
-                    term_to_parents[term_id].add(parent_id)
-                    term_to_children[parent_id].add(term_id)
-                continue
-            if line.startswith('relationship: part_of'):
-                if term_id:
-                    parent_id = line.split('part_of')[1].split('!')[0].strip()
-                    term_to_parents[term_id].add(parent_id)
-                    term_to_children[parent_id].add(term_id)
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) >= 2 and parts[1] in (SINGLE_SUBUNIT, EITHER, MULTI_SUBUNIT):
+                classifications[parts[0]] = parts[1]
+    return classifications
 
-    return term_to_children, term_to_parents, term_to_definition
 
+class ComplexIndex(object):
+    """
+    Precompiled complex coherence over GOGraph term indices.
+
+    is_complex is the bitset of complex terms (MACROMOLECULAR_COMPLEX and
+    its is_a/part_of descendants); the complex terms, in term index order,
+    are the columns of the index. A complex found in a genome is coherent
+    when at least min_proteins[c] proteins carry it (1 for curated single-
+    subunit or either complexes, 2 otherwise) or, for complexes without a
+    curated class, when a protein carrying it also has HOMODIMERIZATION
+    activity. The complex columns among the ancestors of term i are
+    closure_cols[closure_ptr[i]:closure_ptr[i + 1]], with HOMODIMERIZATION
+    as the extra last column, so a protein x term annotation matrix times
+    this closure gives every protein's complexes in one sparse product.
+    """
 
-def get_all_child_terms(term_id, term_to_children, recursive=True):
-    if not recursive:
-        return term_to_children.get(term_id, set())
+    def __init__(self, is_complex, min_proteins, homodimer_ok, closure_ptr, closure_cols):
+        self.is_complex = np.asarray(is_complex, dtype=bool)
+        self.term_idx = np.flatnonzero(self.is_complex).astype(np.int32)
+        self.min_proteins = np.asarray(min_proteins, dtype=np.int8)
+        self.homodimer_ok = np.asarray(homodimer_ok, dtype=bool)
+        self.closure_ptr = np.asarray(closure_ptr, dtype=np.int64)
+        self.closure_cols = np.asarray(closure_cols, dtype=np.int32)
+        n = len(self.term_idx)
+        self.closure = sp.csr_matrix((np.ones(len(self.closure_cols), dtype=bool), self.closure_cols, self.closure_ptr),
+                                     shape=(len(self.is_complex), n + 1))
+
+    def __len__(self):
+        return len(self.term_idx)
+
+    def counts(self, matrix):
+        """
+        Column reduction of a protein x term annotation matrix (unexpanded)
+        over the complex columns.
+
+        Returns:
+        - array: (2, complexes) proteins carrying each complex, and those
+          of them with HOMODIMERIZATION activity
+        """
+        n = len(self.term_idx)
+        hits = (matrix @ self.closure).tocsr()
+        rows = np.repeat(np.arange(hits.shape[0]), np.diff(hits.indptr))
+        homodimer = np.zeros(hits.shape[0], dtype=bool)
+        homodimer[rows[hits.indices == n]] = True
+        return np.vstack([np.bincount(hits.indices, minlength=n + 1)[:n],
+                          np.bincount(hits.indices[homodimer[rows]], minlength=n + 1)[:n]]).astype(np.int64)
+
+    def classify_counts(self, counts, go):
+        """{complex term: 'coherent' or 'incoherent'} for the complexes with proteins, from counts output."""
+        proteins, homodimers = counts
+        found = np.flatnonzero(proteins)
+        coherent = (proteins[found] >= self.min_proteins[found]) | (self.homodimer_ok[found] & (homodimers[found] > 0))
+        return {go.ids[self.term_idx[c]]: "coherent" if ok else "incoherent"
+                for c, ok in zip(found.tolist(), coherent.tolist())}
+
+    def classify(self, annotations):
+        """Classifies the complexes of an AnnotationMatrix."""
+        return self.classify_counts(self.counts(annotations.matrix), annotations.go)
+
+
+def compile_complexes(classifications, go):
+    """
+    Builds a ComplexIndex from load_complex_classifications output and a
+    GOGraph with its ancestor closure. Classified terms that are not
+    complex terms of this GO release are ignored.
+    """
+    complex_terms = get_all_child_terms(MACROMOLECULAR_COMPLEX, go)
+    complex_terms.add(MACROMOLECULAR_COMPLEX)
+    is_complex = np.zeros(len(go), dtype=bool)
+    is_complex[[i for i in map(go.term_index, complex_terms) if i is not None]] = True
+    term_idx = np.flatnonzero(is_complex)
+    classes = [classifications.get(go.ids[i]) for i in term_idx.tolist()]
+    min_proteins = [1 if c in (SINGLE_SUBUNIT, EITHER) else 2 for c in classes]
+    homodimer_ok = [c is None for c in classes]
+
+    columns = list(term_idx)
+    homodimer = go.term_index(HOMODIMERIZATION)
+    closure = go.ancestor_closure().tocsc()
+    closure = sp.hstack([closure[:, columns],
+                         closure[:, [homodimer]] if homodimer is not None else sp.csc_matrix((len(go), 1), dtype=bool)],
+                        format='csr')
+    closure.sort_indices()
+    return ComplexIndex(is_complex, min_proteins, homodimer_ok, closure.indptr, closure.indices)
 
-    all_children = set()
-    to_process = list(term_to_children.get(term_id, set()))
 
-    while to_process:
-        child = to_process.pop()
-        if child not in all_children:
-            all_children.add(child)
-            to_process.extend(term_to_children.get(child, set()))
+def count_complexes(complex_classifications):
+    coherent_count = sum(1 for c in complex_classifications.values() if c == "coherent")
+    incoherent_count = sum(1 for c in complex_classifications.values() if c == "incoherent")
+    return coherent_count, incoherent_count
 
-    return all_children
+
+def get_all_child_terms(term_id, go, relations=(IS_A, PART_OF)):
+    """
+    Returns all descendants of term_id (excluding itself) following the
+    given relation types in the shared GOGraph.
+    """
+    descendants = go.get_descendants(term_id, relations)
+    descendants.discard(term_id)
+    return descendants
@@ -19,12 +19,6 @@ def read_essential_terms(term_file):
     return core_entries, periph_entries
 
 # Count presence/absence of GO terms
-def count_essential_terms(protein_go_terms, target_go_terms):
-    go_term_presence = {term: 0 for term in target_go_terms}
-
-    for go_terms in protein_go_terms.values():
-        for go_term in go_terms:
-            if go_term in target_go_terms:
-                go_term_presence[go_term] = 1
-
-    return go_term_presence
\ No newline at end of file
+def count_essential_terms(genome_go_terms, target_go_terms):
+    """Presence (1/0) of each target term in the genome-level (expanded) term set."""
+    return {term: int(term in genome_go_terms) for term in target_go_terms}
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Shared fixtures of the tests next to each module: the resources of
+main.load_resources and the bundled example input, so that every rewrite
+can be pinned to the output of the implementation it replaced. The GO
+graph is a synthetic one built from the GO IDs of the bundled files, so
+the tests need no GO release in data/.
+"""
+import os
+import re
+import random
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_INPUT = 'examples/input/example_annotation_file.tsv'
+COMPLEXES_FILE = 'constraints/protein_complexes.tsv'
+# Files whose GO IDs make up the synthetic graph (all present since the baseline)
+GO_ID_SOURCES = [
+    EXAMPLE_INPUT,
+    COMPLEXES_FILE,
+    'constraints/essential_terms.tsv',
+    'constraints/has_part_relations.txt',
+    'constraints/ec2go_v2025-03-16',
+    'constraints/metacyc_GO_v2025-03-16_with_EC.tsv',
+    'constraints/taxon_constraints.tsv',
+    'examples/outputs/example_assembly_specific_GO_terms.tsv',
+    'examples/outputs/example_assembly_consistency.tsv',
+]
+NAMESPACES = {'GO:0008150': 'biological_process', 'GO:0003674': 'molecular_function', 'GO:0005575': 'cellular_component'}
+PROTEIN_COMPLEX = 'GO:0032991'
+HOMODIMERIZATION = 'GO:0042803'
+RELATIONSHIPS = ('part_of', 'regulates', 'has_part', 'occurs_in')
+
+
+def write_synthetic_obo(output_file, seed=1):
+    """
+    Writes a random GO-like DAG over every GO ID of GO_ID_SOURCES: each term
+    is_a 1-2 earlier terms, some terms have an alt_id or a part_of,
+    regulates, has_part or occurs_in relationship, and one term is obsolete.
+    The complexes of protein_complexes.tsv all descend from protein-containing
+    complex, so the complex checks have something to classify.
+    """
+    rng = random.Random(seed)
+    ids, complexes = set(), set()
+    for path in GO_ID_SOURCES:
+        with open(path, errors='ignore') as f:
+            ids.update(re.findall(r'GO:\d{7}', f.read()))
+    with open(COMPLEXES_FILE) as f:
+        next(f)
+        complexes.update(line.split('\t')[0] for line in f if line.startswith('GO:'))
+    ids.add(HOMODIMERIZATION)
+    complexes.discard(PROTEIN_COMPLEX)
+    others = sorted(ids - set(NAMESPACES) - complexes - {PROTEIN_COMPLEX})
+    rng.shuffle(others)
+    complex_order = sorted(complexes)
+    rng.shuffle(complex_order)
+
+    order = list(NAMESPACES) + [PROTEIN_COMPLEX] + complex_order + others
+    namespace = dict(NAMESPACES)
+    lines = ['format-version: 1.2', 'ontology: go', '']
+    for pos, term in enumerate(order):
+        lines += ['[Term]', f'id: {term}', f'name: term {term}']
+        if term in NAMESPACES:
+            lines += [f'namespace: {NAMESPACES[term]}', '']
+            continue
+        if term == PROTEIN_COMPLEX:
+            parents = ['GO:0005575']
+        elif term in complexes:
+            parents = sorted(rng.sample(order[3:pos], min(rng.randint(1, 2), pos - 3)))
+        else:
+            parents = sorted(rng.sample(order[:pos], rng.randint(1, 2)))
+        namespace[term] = namespace[parents[0]]
+        lines.append(f'namespace: {namespace[term]}')
+        if rng.random() < 0.02:
+            lines.append(f'alt_id: GO:9{term[4:]}')
+        lines += [f'is_a: {p} ! term {p}' for p in parents]
+        if pos > 10 and rng.random() < 0.15:
+            target = rng.choice(order[:pos])
+            lines.append(f'relationship: {rng.choice(RELATIONSHIPS)} {target} ! term {target}')
+        lines.append('')
+    lines += ['[Term]', 'id: GO:0000000', 'name: obsolete term', 'namespace: biological_process', 'is_obsolete: true', '']
+    lines += ['[Typedef]', 'id: part_of', 'name: part of', '']
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines))
+    return output_file
+
+
+@pytest.fixture(scope='session', autouse=True)
+def repository_root():
+    # main.py and the constraint loaders use paths relative to the repository
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield ROOT
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def ontology_file(repository_root, tmp_path_factory):
+    """A synthetic go-basic.obo, used by main in place of data/go-basic.obo."""
+    import main
+    obo_file = write_synthetic_obo(str(tmp_path_factory.mktemp('go') / 'go-basic.obo'))
+    original, main.ontology_file = main.ontology_file, obo_file
+    yield obo_file
+    main.ontology_file = original
+
+
+@pytest.fixture(scope='session')
+def resources(ontology_file):
+    import main
+    return main.load_resources(cache_dir=False)
+
+
+@pytest.fixture(scope='session')
+def go(resources):
+    return resources['go']
+
+
+@pytest.fixture(scope='session')
+def example_terms(repository_root):
+    """{protein_id: set(GO_terms)} of the example input, as main.load_annotations reads it."""
+    import main
+    return main.load_annotations(EXAMPLE_INPUT)
+
+
+@pytest.fixture(scope='session')
+def example_annotations(go):
+    from annotations import load_annotation_matrix
+    return load_annotation_matrix(EXAMPLE_INPUT, go)
+
+
+@pytest.fixture(scope='session')
+def legacy_ontology(ontology_file):
+    """The dict-based utils.Ontology the GOGraph replaced."""
+    from utils import Ontology
+    return Ontology(ontology_file, with_rels=True)
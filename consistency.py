@@ -1,42 +1,470 @@
+import csv
+import numpy as np
 import pandas as pd
+import xml.etree.ElementTree as ET
 from collections import defaultdict
 
-def check_consistency(protein_go_terms, constraints_file, output_file):
+# Annotations listed per constraint in an explanation before summarizing
+EXPLANATION_EXAMPLES = 5
+
+def load_taxon_constraints(constraints_file):
     """
-    Check taxonomic consistency of GO annotations and save results to a file.
+    Load GO taxon constraints.
 
     Parameters:
-    - protein_go_terms (dict): Mapping from protein ID to set of GO terms
     - constraints_file (str): Path to the constraints file
+
+    Returns:
+    - tuple: (only_map, never_map), each {GO_ID: set(Taxon_ID)}
+    """
+    constraints = pd.read_csv(constraints_file, sep="\t", dtype=str).dropna(subset=["GO_ID", "Taxon_ID"])
+    maps = []
+    for constraint_type in ("only_in_taxon", "never_in_taxon"):
+        rows = constraints[constraints["Constraint_Type"] == constraint_type]
+        mapping = {}
+        for go_id, lineage in zip(rows["GO_ID"].tolist(), rows["Taxon_ID"].tolist()):
+            mapping.setdefault(go_id, set()).add(lineage)
+        maps.append(mapping)
+    return tuple(maps)
+
+
+class TaxonConstraints(object):
+    """
+    Taxon constraints compiled against a GOGraph: one entry per constrained
+    term, in ascending term-index order, with its only_in_taxon and
+    never_in_taxon taxa as CSR lists over a shared taxon vocabulary.
+
+    `terms` selects the constrained columns of a protein x term matrix, so
+    entry c of the constraints describes column c of matrix[:, terms].
+    `line_tails[c]` is the precomputed "GO_ID<TAB>never<TAB>only" part of
+    every _consistency.tsv row for that term.
+    """
+
+    def __init__(self, go_ids, terms, taxa, only_ptr, only_idx, never_ptr, never_idx):
+        self.go_ids = go_ids
+        self.terms = terms
+        self.taxa = taxa
+        self.only_ptr = only_ptr
+        self.only_idx = only_idx
+        self.never_ptr = never_ptr
+        self.never_idx = never_idx
+        self.line_tails = [
+            "\t".join((go_id, ",".join(self.never_taxa(c)), ",".join(self.only_taxa(c)))) + "\n"
+            for c, go_id in enumerate(go_ids)]
+
+    def __len__(self):
+        return len(self.go_ids)
+
+    def only_taxa(self, c):
+        return [self.taxa[t] for t in self.only_idx[self.only_ptr[c]:self.only_ptr[c + 1]].tolist()]
+
+    def never_taxa(self, c):
+        return [self.taxa[t] for t in self.never_idx[self.never_ptr[c]:self.never_ptr[c + 1]].tolist()]
+
+    def violations(self, taxon_ancestors):
+        """
+        Number of violated constraints of every entry for an organism whose
+        lineage (and taxon groupings) is taxon_ancestors: only_in_taxon taxa
+        outside it plus never_in_taxon taxa inside it.
+        """
+        member = np.array([t in taxon_ancestors for t in self.taxa], dtype=bool)
+        entries = np.arange(len(self.go_ids))
+        only_entry = np.repeat(entries, np.diff(self.only_ptr))
+        never_entry = np.repeat(entries, np.diff(self.never_ptr))
+        return (np.bincount(only_entry, weights=~member[self.only_idx], minlength=len(entries)) +
+                np.bincount(never_entry, weights=member[self.never_idx], minlength=len(entries))).astype(np.int64)
+
+
+def compile_taxon_constraints(only_map, never_map, go):
+    """
+    Builds the TaxonConstraints lookup for the terms of go. Constraints on
+    GO IDs that are not primary terms of go can never match an expanded
+    annotation and are left out.
+    """
+    entries = {}
+    for go_id in set(only_map) | set(never_map):
+        i = go.term_index(go_id)
+        if i is not None and go.ids[i] == go_id:
+            entries[i] = go_id
+    terms = np.array(sorted(entries), dtype=np.int32)
+    go_ids = [entries[i] for i in terms.tolist()]
+
+    taxa = sorted({t for m in (only_map, never_map) for taxa_set in m.values() for t in taxa_set})
+    taxon_index = {t: k for k, t in enumerate(taxa)}
+
+    def csr(mapping):
+        lists = [sorted(taxon_index[t] for t in mapping.get(go_id, ())) for go_id in go_ids]
+        ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(l) for l in lists], out=ptr[1:])
+        return ptr, np.array([t for l in lists for t in l], dtype=np.int32)
+
+    only_ptr, only_idx = csr(only_map)
+    never_ptr, never_idx = csr(never_map)
+    return TaxonConstraints(go_ids, terms, taxa, only_ptr, only_idx, never_ptr, never_idx)
+
+
+def check_consistency(protein_go_terms, constraints, output_file, taxon_ancestors=None):
+    """
+    Check taxonomic consistency of GO annotations and save results to a file.
+
+    Each block of expanded annotations is joined with the constraints by
+    selecting the constrained term columns; every non-zero of that
+    selection is one output row, written in bulk from the precomputed
+    line tails. When the organism's taxon_ancestors are known (see
+    taxon_ancestors()), a 'violated' column flags the rows whose term has a
+    constraint the organism breaks.
+
+    Parameters:
+    - protein_go_terms (ExpandedAnnotations): Ancestor-expanded annotations
+    - constraints (TaxonConstraints): Compiled taxon constraints
     - output_file (str): Path to write the output table
+    - taxon_ancestors (set): Optional taxon names of the evaluated organism
+
+    Returns:
+    - dict: {constraint index: (number of proteins, first EXPLANATION_EXAMPLES
+      protein IDs)} for every constrained term present in the genome
+    """
+    proteins = protein_go_terms.annotations.proteins
+    header = "protein_name\tGO_ID\tnever_in_taxon\tonly_in_taxon"
+    tails = constraints.line_tails
+    if taxon_ancestors is not None:
+        header += "\tviolated"
+        violated = constraints.violations(taxon_ancestors) > 0
+        tails = [tail[:-1] + ("\ttrue\n" if v else "\tfalse\n") for tail, v in zip(tails, violated.tolist())]
+    counts = np.zeros(len(constraints), dtype=np.int64)
+    examples = {}
+
+    with open(output_file, 'w') as out:
+        out.write(header + "\n")
+        for start, block in protein_go_terms.matrix_blocks():
+            hits = block[:, constraints.terms].tocsr()
+            rows, cols = hits.nonzero()
+            rows = rows + start
+            out.writelines([proteins[r] + "\t" + tails[c] for r, c in zip(rows.tolist(), cols.tolist())])
+            counts += np.bincount(cols, minlength=len(constraints))
+
+            # Keep the first few proteins of every constraint for explanations
+            order = np.argsort(cols, kind='stable')
+            present, first = np.unique(cols[order], return_index=True)
+            bounds = np.append(first, len(order))
+            for k, c in enumerate(present.tolist()):
+                kept = examples.setdefault(c, [])
+                if len(kept) < EXPLANATION_EXAMPLES:
+                    take = rows[order[bounds[k]:min(bounds[k + 1], bounds[k] + EXPLANATION_EXAMPLES - len(kept))]]
+                    kept.extend(proteins[r] for r in take.tolist())
+
+    return {c: (int(counts[c]), examples[c]) for c in np.flatnonzero(counts).tolist()}
+
+
+#### TAXON SATISFIABILITY ####
+RDF_NS = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+RDFS_NS = '{http://www.w3.org/2000/01/rdf-schema#}'
+OWL_NS = '{http://www.w3.org/2002/07/owl#}'
+OBO_PREFIX = 'http://purl.obolibrary.org/obo/'
+TAXON_PREFIX = 'NCBITaxon_'
+NEGATION_SUFFIX = '_neg'
+taxon_ontology_files = ["constraints/ncbitaxon_with_disjointness.owl", "constraints/go-taxon-groupings.owl"]
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class TaxonLattice(object):
+    """
+    Named taxon classes of the NCBITaxon disjointness and GO taxon grouping
+    ontologies, with their subclass closure and disjointness axioms held as
+    Python int bitsets over the taxon indices.
+
+    A set of classes is unsatisfiable exactly when one class has an ancestor
+    that is declared disjoint with an ancestor of another (or the same)
+    class. `excluded[i]` is the union of the disjointness bitsets of all
+    ancestors of i, so a pair (a, b) conflicts iff excluded[a] & ancestors[b].
+
+    Parameters:
+    - taxa (list): Class local names, e.g. NCBITaxon_2759, NCBITaxon_2759_neg
+    - parent_ptr, parent_idx (sequences): CSR list of direct superclasses
+    - disjoint_a, disjoint_b (sequences): Index pairs of disjointness axioms
     """
 
-    # === Process constraints ===
-    constraints = pd.read_csv(constraints_file, sep="\t", dtype=str)
-    only_map = defaultdict(set)
-    never_map = defaultdict(set)
+    def __init__(self, taxa, parent_ptr, parent_idx, disjoint_a, disjoint_b):
+        self.taxa = list(taxa)
+        self.index = {t: i for i, t in enumerate(self.taxa)}
+        self.parent_ptr = np.asarray(parent_ptr, dtype=np.int64)
+        self.parent_idx = np.asarray(parent_idx, dtype=np.int32)
+        self.disjoint_a = np.asarray(disjoint_a, dtype=np.int32)
+        self.disjoint_b = np.asarray(disjoint_b, dtype=np.int32)
 
-    for _, row in constraints.iterrows():
-        go_id = row["GO_ID"]
-        lineage = row["Taxon_ID"]
-        if row["Constraint_Type"] == "only_in_taxon":
-            only_map[go_id].add(lineage)
-        elif row["Constraint_Type"] == "never_in_taxon":
-            never_map[go_id].add(lineage)
+        n = len(self.taxa)
+        parents = [self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]].tolist() for i in range(n)]
+        self.ancestors = [0] * n
+        state = [0] * n  # 0 = new, 1 = on stack, 2 = done
+        for root in range(n):
+            if state[root]:
+                continue
+            stack = [(root, iter(parents[root]))]
+            state[root] = 1
+            while stack:
+                node, it = stack[-1]
+                nxt = next(it, None)
+                if nxt is None:
+                    mask = 1 << node
+                    for p in parents[node]:
+                        mask |= self.ancestors[p]
+                    self.ancestors[node] = mask
+                    state[node] = 2
+                    stack.pop()
+                elif state[nxt] == 0:
+                    state[nxt] = 1
+                    stack.append((nxt, iter(parents[nxt])))
+                # state 1 (a subclass cycle) contributes what is known so far
+
+        self.disjoint = [0] * n
+        for a, b in zip(self.disjoint_a.tolist(), self.disjoint_b.tolist()):
+            self.disjoint[a] |= 1 << b
+            self.disjoint[b] |= 1 << a
+        self.excluded = [0] * n
+        for i in range(n):
+            mask = 0
+            for x in _bits(self.ancestors[i]):
+                mask |= self.disjoint[x]
+            self.excluded[i] = mask
+
+    def __len__(self):
+        return len(self.taxa)
+
+    def is_satisfiable(self, classes):
+        """True when the intersection of the given class names is satisfiable."""
+        positive = excluded = 0
+        for name in classes:
+            i = self.index.get(name)
+            if i is not None:
+                positive |= self.ancestors[i]
+                excluded |= self.excluded[i]
+        return not positive & excluded
+
+    def witness(self, a, b):
+        """(x, y): an ancestor x of a declared disjoint with an ancestor y of b."""
+        for x in _bits(self.ancestors[a]):
+            common = self.disjoint[x] & self.ancestors[b]
+            if common:
+                return x, next(_bits(common))
+        return None
+
+    def conflicting_pairs(self, classes):
+        """
+        Minimal unsatisfiable subsets of the given class names: every pair
+        (a, b) whose intersection is already unsatisfiable, including a == b
+        for a class that is unsatisfiable on its own.
+
+        Returns:
+        - list: (a, b, x, y) name tuples, with (x, y) the disjoint ancestors
+        """
+        known = sorted({self.index[c] for c in classes if c in self.index})
+        pairs = []
+        for k, a in enumerate(known):
+            if not self.excluded[a]:
+                continue
+            for b in known[k:]:
+                if self.excluded[a] & self.ancestors[b]:
+                    x, y = self.witness(a, b)
+                    pairs.append((self.taxa[a], self.taxa[b], self.taxa[x], self.taxa[y]))
+        return pairs
+
+
+def load_taxon_lattice(taxon_files=taxon_ontology_files):
+    """
+    Parses the taxon OWL (RDF/XML) files into a TaxonLattice.
+
+    Named classes contribute their rdfs:subClassOf and owl:disjointWith
+    targets; members of an owl:unionOf equivalence become subclasses of the
+    union class. Anonymous restrictions (RO_0002162 'in taxon' axioms) do
+    not involve the taxon classes themselves and are skipped.
+    """
+    taxa = {}
+    parents = defaultdict(set)
+    disjoint = set()
+
+    def local(iri):
+        name = iri[len(OBO_PREFIX):] if iri and iri.startswith(OBO_PREFIX) else None
+        if name is not None and name not in taxa:
+            taxa[name] = len(taxa)
+        return name
+
+    for taxon_file in taxon_files:
+        root = ET.parse(taxon_file).getroot()
+        for element in root:
+            name = local(element.get(RDF_NS + 'about'))
+            if name is None:
+                continue
+            for child in element:
+                target = local(child.get(RDF_NS + 'resource'))
+                if child.tag == RDFS_NS + 'subClassOf' and target is not None:
+                    parents[name].add(target)
+                elif child.tag == OWL_NS + 'disjointWith' and target is not None:
+                    disjoint.add((name, target))
+                elif child.tag == OWL_NS + 'equivalentClass':
+                    for member in child.iter(RDF_NS + 'Description'):
+                        member_name = local(member.get(RDF_NS + 'about'))
+                        if member_name is not None:
+                            parents[member_name].add(name)
+
+    names = sorted(taxa, key=taxa.get)
+    parent_ptr = [0]
+    parent_idx = []
+    for name in names:
+        parent_idx.extend(sorted(taxa[p] for p in parents[name]))
+        parent_ptr.append(len(parent_idx))
+    pairs = sorted((taxa[a], taxa[b]) for a, b in disjoint)
+    return TaxonLattice(names, parent_ptr, parent_idx, [a for a, _ in pairs], [b for _, b in pairs])
+
+
+def _taxon_label(name):
+    label = 'T' + name.replace(TAXON_PREFIX, '', 1)
+    if label.endswith(NEGATION_SUFFIX):
+        return 'not ' + label[:-len(NEGATION_SUFFIX)]
+    return label
+
+
+def check_taxon_consistency(genome_name, hits, constraints, lattice, output_file):
+    """
+    Native replacement for taxon_consistency.groovy.
+
+    Every only_in_taxon constraint of the genome asserts its taxon class and
+    every never_in_taxon constraint the class's negation (NCBITaxon_X_neg);
+    the genome is satisfiable when the intersection of all of them is (see
+    TaxonLattice). Unsatisfiable genomes are explained by their minimal
+    conflicting constraint pairs, each with the first EXPLANATION_EXAMPLES
+    annotations that carry it.
+
+    Parameters:
+    - genome_name (str): Name written in the Genome column
+    - hits (dict): Constraints present in the genome, as returned by
+      check_consistency
+    - constraints (TaxonConstraints): Compiled taxon constraints
+    - lattice (TaxonLattice): Parsed taxon ontologies
+    - output_file (str): Path of the Genome/IsSatisfiable/Explanation table
+
+    Returns:
+    - tuple: (satisfiable, list of conflicting pairs as returned by
+      TaxonLattice.conflicting_pairs)
+    """
+    sources = defaultdict(list)
+    for c in hits:
+        for taxon in constraints.only_taxa(c):
+            sources[taxon].append(c)
+        for taxon in constraints.never_taxa(c):
+            sources[taxon + NEGATION_SUFFIX].append(c)
+
+    satisfiable = lattice.is_satisfiable(sources)
+    pairs = [] if satisfiable else lattice.conflicting_pairs(sources)
+
+    explanations = []
+    for a, b, x, y in pairs:
+        parts = []
+        for cls in ((a,) if a == b else (a, b)):
+            kind = 'never' if cls.endswith(NEGATION_SUFFIX) else 'only'
+            taxon = 'T' + cls.replace(TAXON_PREFIX, '', 1).replace(NEGATION_SUFFIX, '')
+            carriers = [(p, constraints.go_ids[c]) for c in sources[cls] for p in hits[c][1]][:EXPLANATION_EXAMPLES]
+            total = sum(hits[c][0] for c in sources[cls])
+            proteins = ", ".join(f"Protein {p} ({g})" for p, g in carriers)
+            if total > len(carriers):
+                proteins += f" and {total - len(carriers)} more"
+            parts.append(f"{proteins} requires {kind} in taxon {taxon}")
+        relations = [f"{_taxon_label(c)} is a subclass of {_taxon_label(anc)}" for c, anc in ((a, x), (b, y)) if c != anc]
+        relations.append(f"{_taxon_label(x)} and {_taxon_label(y)} are disjoint")
+        explanations.append("; ".join(parts) + ", and " + ", and ".join(relations))
 
-    # === Write output ===
     with open(output_file, 'w') as out:
-        out.write("protein_name\tGO_ID\tnever_in_taxon\tonly_in_taxon\n")
-        for protein_id, go_terms in protein_go_terms.items():
-            for go in go_terms:
-                only_taxa = list(only_map[go])
-                never_taxa = list(never_map[go])
-                if only_taxa or never_taxa:
-                    row = [
-                        protein_id,
-                        go,
-                        ",".join(never_taxa),
-                        ",".join(only_taxa)
-                    ]
-                    out.write("\t".join(row) + "\n")
-    return output_file
+        out.write("Genome\tIsSatisfiable\tExplanation\n")
+        out.write(f"{genome_name}\t{str(satisfiable).lower()}\t{' | '.join(explanations)}\n")
+    return satisfiable, pairs
+
+
+#### TARGET TAXON ####
+def parse_taxon_id(taxon_id):
+    """Accepts 562, '562', 'NCBITaxon:562' or 'NCBITaxon_562' and returns 562."""
+    text = str(taxon_id).strip()
+    for prefix in ('NCBITaxon:', TAXON_PREFIX):
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    if not text.isdigit():
+        raise ValueError(f"Invalid NCBI taxon ID: {taxon_id!r}")
+    return int(text)
+
+
+def load_taxon_parents(nodes_file):
+    """
+    Parses NCBI taxdump nodes.dmp into a parent array indexed by taxon ID
+    (-1 for unused IDs; the root is its own parent).
+    """
+    nodes = pd.read_csv(nodes_file, sep="\t", header=None, usecols=[0, 2], dtype=np.int64,
+                        quoting=csv.QUOTE_NONE, engine="c")
+    taxon, parent = nodes[0].to_numpy(), nodes[2].to_numpy()
+    parents = np.full(int(taxon.max()) + 1 if len(taxon) else 0, -1, dtype=np.int32)
+    parents[taxon] = parent
+    return parents
+
+
+def taxon_ancestors(taxon_id, parents, lattice=None):
+    """
+    The taxon-ancestor index of one organism: the NCBITaxon_ names of its
+    whole lineage, plus the GO taxon groupings (NCBITaxon_Union_) that
+    contain any of them according to the TaxonLattice.
+    """
+    taxon = parse_taxon_id(taxon_id)
+    if taxon >= len(parents) or parents[taxon] < 0:
+        raise ValueError(f"NCBI taxon {taxon} is not in the taxonomy")
+    names = set()
+    while True:
+        names.add(f"{TAXON_PREFIX}{taxon}")
+        parent = int(parents[taxon])
+        if parent == taxon or parent < 0 or len(names) > 1000:
+            break
+        taxon = parent
+    if lattice is not None:
+        mask = 0
+        for name in names:
+            i = lattice.index.get(name)
+            if i is not None:
+                mask |= lattice.ancestors[i]
+        names.update(lattice.taxa[i] for i in _bits(mask))
+    return names
+
+
+def score_consistency(hits, constraints, taxon_ancestors):
+    """
+    Consistency of a genome's constrained annotations with its own taxon.
+
+    Parameters:
+    - hits (dict): Constraints present in the genome (see check_consistency)
+    - constraints (TaxonConstraints): Compiled taxon constraints
+    - taxon_ancestors (set): Taxon names of the organism (see taxon_ancestors())
+
+    Returns:
+    - dict: 'consistency_percentage' (constrained protein annotations that
+      violate none of their constraints), 'violated_constraints' (distinct
+      term/taxon constraints violated) and 'consistency_violations', one
+      {'GO_ID', 'constraint', 'taxon', 'proteins'} entry per violation
+    """
+    violations = constraints.violations(taxon_ancestors)
+    total = violating = 0
+    details = []
+    for c, (count, _) in sorted(hits.items()):
+        total += count
+        if not violations[c]:
+            continue
+        violating += count
+        for kind, taxa, broken in (("only_in_taxon", constraints.only_taxa(c), False),
+                                   ("never_in_taxon", constraints.never_taxa(c), True)):
+            for taxon in taxa:
+                if (taxon in taxon_ancestors) == broken:
+                    details.append({"GO_ID": constraints.go_ids[c], "constraint": kind, "taxon": taxon, "proteins": count})
+    return {
+        'consistency_percentage': (1 - violating / total) * 100 if total else 100.0,
+        'violated_constraints': len(details),
+        'consistency_violations': details,
+    }
@@ -0,0 +1,23 @@
+"""
+Converts a pathway constraint file in the previous EC_Combinations format
+(every combination of alternative EC numbers enumerated) into the
+Reaction_Slots format read by coherence.load_pathway_slots, where each path
+is a list of reaction slots with their alternative EC numbers.
+
+Usage (from the repository root):
+    python generate_constraints/convert_pathway_slots.py metacyc_GO_v{GO_VERSION}_with_EC.tsv metacyc_GO_v{GO_VERSION}_slots.tsv
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coherence import load_pathway_slots, write_pathway_slots
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    pathway_slots = load_pathway_slots(sys.argv[1])
+    write_pathway_slots(pathway_slots, sys.argv[2])
+    paths = sum(len(paths) for _, paths in pathway_slots.values())
+    print(f"Wrote {len(pathway_slots)} pathways ({paths} paths) to {sys.argv[2]}")
@@ -1,83 +1,197 @@
-from pythoncyc import PGDB
-from pythoncyc.PToolsFrame import PFrame
-import pythoncyc.config
+"""
+Extracts the reaction slots (alternative EC numbers per reaction) of every
+path through the MetaCyc pathways listed in metacyc_GO_v{GO_VERSION}.tsv
+from a Pathway Tools API server, and writes metacyc_GO_v{GO_VERSION}_slots.tsv.
+
+Every frame lookup goes through a FrameCache persisted as JSON lines
+(--cache), so a rerun, or a run for another GO release against the same
+MetaCyc version, only asks the server for what it has not seen. Lookups
+are made level by level (pathway frames, reaction predecessors, reaction EC
+numbers) with a bounded pool of --workers concurrent requests. With
+--offline the cache file is the only source: the recorded responses of an
+earlier run stand in for the server (--latency adds a delay per lookup to
+benchmark concurrency). Delete the cache after a MetaCyc update.
+
+Usage:
+    python generate_constraints/extract_ECs.py {GO_VERSION} [--workers 8] [--cache metacyc_frames.jsonl] [--offline]
+"""
+import os
 import re
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import sys
-
-# Set the hostname and port for the Pathway Tools API server
-pythoncyc.config.set_host_name('localhost')
-pythoncyc.config.set_host_port(5008)
-go_version = sys.argv[1]
-
-# Initialize the PGDB object for the 'meta' organism
-meta = PGDB('meta')
-
-# Define the pathway ID
-pathway_id = 'PLPSAL-PWY'
-
-# Retrieve the pathway PFrame object
-pathway = PFrame(pathway_id, meta, getFrameData=True)
-
-# Function to get reactions in a pathway, including handling subpathways
-def get_pathway_reactions(pathway):
-    reactions = set()
-    if hasattr(pathway, 'reaction_list') and pathway.reaction_list is not None:
-        reactions.update(pathway.reaction_list)
-    if hasattr(pathway, 'predecessors') and pathway.predecessors is not None:
-        for pred in pathway.predecessors:
-            if isinstance(pred, PFrame) and pred.classname == 'Pathway':
-                subpathway = PFrame(pred.frameid, meta, getFrameData=True)
-                reactions.update(get_pathway_reactions(subpathway))
-            else:
-                reactions.add(pred)
-    return reactions
-
-# Expand subpathways and get all reactions
-def expand_subpathways(pathway_id):
-    reactions = set()
-    pathway = PFrame(pathway_id, meta, getFrameData=True)
-    if hasattr(pathway, 'reaction_list'):
-        for reaction_id in pathway.reaction_list:
-            reaction = PFrame(reaction_id, meta, getFrameData=True)
+
+# Lookup kinds of the frame cache
+PATHWAY_REACTIONS = 'pathway_reactions'
+PREDECESSORS = 'predecessors'
+REACTION_ECS = 'reaction_ecs'
+
+
+class PathwayToolsSource(object):
+    """Lookups against a Pathway Tools API server (needs the pythoncyc package)."""
+
+    def __init__(self, host='localhost', port=5008, organism='meta'):
+        try:
+            import pythoncyc.config
+            from pythoncyc import PGDB
+            from pythoncyc.PToolsFrame import PFrame
+        except ImportError:
+            raise ImportError("Querying Pathway Tools requires the 'pythoncyc' package; use --offline with a recorded cache otherwise")
+        pythoncyc.config.set_host_name(host)
+        pythoncyc.config.set_host_port(port)
+        self.meta = PGDB(organism)
+        self.PFrame = PFrame
+
+    def lookup(self, kind, key):
+        if kind == PATHWAY_REACTIONS:
+            pathway = self.PFrame(key, self.meta, getFrameData=True)
+            return list(getattr(pathway, 'reaction_list', None) or [])
+        if kind == PREDECESSORS:
+            reaction_id, pathway_id = key.split('|')
+            return list(self.meta.sendPgdbFnCallList('get-predecessors', reaction_id, pathway_id) or [])
+        if kind == REACTION_ECS:
+            reaction = self.PFrame(key, self.meta, getFrameData=True)
+            return list(getattr(reaction, 'ec_number', None) or [])
+        raise ValueError(f"Unknown lookup {kind}")
+
+
+class RecordedSource(object):
+    """Stand-in for the server that only has the responses already in the cache."""
+
+    def lookup(self, kind, key):
+        raise KeyError(f"{kind} {key} was not recorded; run against the Pathway Tools server first")
+
+
+class FrameCache(object):
+    """
+    Thread-safe cache of lookup responses, appended to a JSON lines file as
+    they arrive so an interrupted run keeps what it fetched. Failed lookups
+    are not cached. latency (seconds) is added to every cache hit, to
+    benchmark offline runs as if each lookup went to the server.
+    """
+
+    def __init__(self, path, source, latency=0.0):
+        self.path = path
+        self.source = source
+        self.latency = latency
+        self.values = {}
+        self.lock = threading.Lock()
+        self.hits = self.fetched = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.values[(entry['kind'], entry['key'])] = entry['value']
+        self.file = open(path, 'a') if path else None
+
+    def get(self, kind, key):
+        value = self.values.get((kind, key))
+        if value is not None:
+            with self.lock:
+                self.hits += 1
+            if self.latency:
+                time.sleep(self.latency)
+            return value
+        value = self.source.lookup(kind, key)
+        with self.lock:
+            self.values[(kind, key)] = value
+            self.fetched += 1
+            if self.file is not None:
+                self.file.write(json.dumps({'kind': kind, 'key': key, 'value': value}) + '\n')
+                self.file.flush()
+        return value
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def fetch_all(cache, pool, kind, keys):
+    """
+    Looks up the given keys concurrently. Returns {key: value}, or
+    {key: exception} for the lookups that failed.
+    """
+    def lookup(key):
+        try:
+            return cache.get(kind, key)
+        except Exception as e:
+            return e
+    keys = list(dict.fromkeys(keys))
+    return dict(zip(keys, pool.map(lookup, keys)))
+
+
+# Expand subpathways and get all reactions, for every pathway at once
+def expand_subpathways(pathway_ids, cache, pool):
+    """
+    Returns {pathway: set of reactions (subpathways expanded)} for the
+    pathways whose frames could all be fetched; errors maps the others to
+    their exception.
+    """
+    frames = {}
+    frontier = set(pathway_ids)
+    while frontier:
+        fetched = fetch_all(cache, pool, PATHWAY_REACTIONS, sorted(frontier))
+        frames.update(fetched)
+        frontier = {r for value in fetched.values() if not isinstance(value, Exception)
+                    for r in value if 'PWY' in r and r not in frames}
+
+    def reactions_of(pathway_id, seen):
+        value = frames[pathway_id]
+        if isinstance(value, Exception):
+            raise value
+        reactions = set()
+        for reaction_id in value:
             if 'PWY' in reaction_id:
-                reactions.update(expand_subpathways(reaction_id))
+                if reaction_id not in seen:
+                    reactions.update(reactions_of(reaction_id, seen | {reaction_id}))
             else:
                 reactions.add(reaction_id)
-    return reactions
+        return reactions
 
-# Get all reactions in the pathway, including those in subpathways
-reactions_in_pathway = expand_subpathways(pathway_id)
+    reactions, errors = {}, {}
+    for pathway_id in pathway_ids:
+        try:
+            reactions[pathway_id] = reactions_of(pathway_id, {pathway_id})
+        except Exception as e:
+            errors[pathway_id] = e
+    return reactions, errors
 
-# Function to get predecessors of a reaction
-def get_reaction_predecessors(reaction_id, pathway):
-    try:
-        predecessors = meta.sendPgdbFnCallList('get-predecessors', reaction_id, pathway.frameid)
-        return [PFrame(pred, meta, getFrameData=True) for pred in predecessors]
-    except Exception as e:
-        print(f"Error getting predecessors for {reaction_id}: {e}")
-        return []
-
-# Convert the predecessors data into a dictionary for easy lookup
-predecessors_dict = {}
-for reaction_id in reactions_in_pathway:
-    predecessors = get_reaction_predecessors(reaction_id, pathway)
-    predecessors_dict[reaction_id] = [pred.frameid for pred in predecessors]
 
 # Function to find all possible paths with cycle detection
 def find_all_paths(predecessors_dict):
+    """
+    Every path ending in a reaction that precedes no other, walking
+    predecessors back to reactions without predecessors and cutting cycles.
+
+    The paths of a reaction are memoized when their enumeration did not
+    cut a cycle (then they do not depend on the path that led there), so
+    sub-paths shared by many paths are enumerated once.
+    """
+    memo = {}
+
     def find_paths(reaction, visited):
         if reaction in visited:
-            return []  # Avoid cycles
+            return [], True  # Avoid cycles
+        if reaction in memo:
+            return memo[reaction], False
         if reaction not in predecessors_dict or not predecessors_dict[reaction]:
-            return [[reaction]]
+            return [(reaction,)], False
         paths = []
+        cut = False
         visited.add(reaction)
         for pred in predecessors_dict[reaction]:
-            for path in find_paths(pred, visited):
-                paths.append(path + [reaction])
+            pred_paths, pred_cut = find_paths(pred, visited)
+            cut = cut or pred_cut
+            paths.extend(path + (reaction,) for path in pred_paths)
         visited.remove(reaction)
-        return paths
+        if not cut:
+            memo[reaction] = paths
+        return paths, cut
 
     # Find all starting reactions (reactions with no predecessors)
     all_predecessors = {pred for preds in predecessors_dict.values() for pred in preds}
@@ -90,26 +204,9 @@ def find_all_paths(predecessors_dict):
     # Find all paths from each starting reaction
     all_paths = []
     for start_reaction in starting_reactions:
-        all_paths.extend(find_paths(start_reaction, set()))
+        all_paths.extend(list(path) for path in find_paths(start_reaction, set())[0])
     return all_paths
 
-# Get all possible paths
-all_paths = find_all_paths(predecessors_dict)
-
-# #Print all possible paths with EC numbers
-# print("\nAll Paths with EC Numbers:")
-# for path in all_paths:
-#     ec_path = []
-#     for reaction_id in path:
-#         reaction = PFrame(reaction_id, meta, getFrameData=True)
-#         if hasattr(reaction, 'ec_number') and reaction.ec_number:
-#             ec_numbers = reaction.ec_number
-#         else:
-#             ec_numbers = ['No EC number']
-#         ec_path.append(f"{reaction_id} (EC: {', '.join(ec_numbers)})")
-#     print(" -> ".join(ec_path))
-
-
 
 # Extract EC numbers and format them
 def format_ec_numbers(ec_numbers):
@@ -120,68 +217,100 @@ def format_ec_numbers(ec_numbers):
         formatted_ecs.extend(matches)
     return formatted_ecs
 
-# Function to generate all combinations of paths for multiple EC numbers
-def generate_ec_combinations(paths_with_ecs):
-    if not paths_with_ecs:
-        return [[]]
-    first, rest = paths_with_ecs[0], paths_with_ecs[1:]
-    combinations = []
-    for ec in first:
-        for combination in generate_ec_combinations(rest):
-            combinations.append([ec] + combination)
-    return combinations
-
-def process_pathway(pathway_id):
+
+def process_pathways(pathway_ids, cache, workers=8):
+    """
+    Reaction slots of every path through each pathway: one list of
+    alternative EC numbers per reaction with EC numbers. Identical slot
+    paths are kept once.
+
+    Returns:
+    - dict: {pathway: list of paths}, without the pathways that failed
+    - dict: {pathway: exception} for the pathways that failed
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reactions, errors = expand_subpathways(pathway_ids, cache, pool)
+        keys = [f"{reaction_id}|{pathway_id}" for pathway_id, rs in reactions.items() for reaction_id in sorted(rs)]
+        predecessors = fetch_all(cache, pool, PREDECESSORS, keys)
+
+        predecessors_dicts = {}
+        for pathway_id, rs in reactions.items():
+            predecessors_dict = {}
+            for reaction_id in rs:
+                preds = predecessors[f"{reaction_id}|{pathway_id}"]
+                if isinstance(preds, Exception):
+                    print(f"Error getting predecessors for {reaction_id}: {preds}")
+                    preds = []
+                predecessors_dict[reaction_id] = preds
+            predecessors_dicts[pathway_id] = predecessors_dict
+        all_paths = {pathway_id: find_all_paths(d) for pathway_id, d in predecessors_dicts.items()}
+
+        path_reactions = {reaction_id for paths in all_paths.values() for path in paths for reaction_id in path}
+        ec_numbers = fetch_all(cache, pool, REACTION_ECS, sorted(path_reactions))
+
+    results = {}
+    for pathway_id, paths in all_paths.items():
+        failed = next((ec_numbers[r] for path in paths for r in path if isinstance(ec_numbers[r], Exception)), None)
+        if failed is not None:
+            errors[pathway_id] = failed
+            continue
+        paths_with_ecs = {}
+        for path in paths:
+            path_ecs = [format_ec_numbers(ec_numbers[r]) for r in path if ec_numbers[r]]
+            paths_with_ecs[json.dumps(path_ecs)] = path_ecs
+        # Each path is kept as its reaction slots (the alternative ECs of
+        # each reaction) rather than expanded into every EC combination
+        results[pathway_id] = list(paths_with_ecs.values())
+    return results, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract the reaction slots of MetaCyc pathways from Pathway Tools.')
+    parser.add_argument('go_version', help='GO release of metacyc_GO_v{GO_VERSION}.tsv (GO2Metacyc.py output)')
+    parser.add_argument('--host', default='localhost', help='Pathway Tools API server')
+    parser.add_argument('--port', type=int, default=5008, help='Pathway Tools API port')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests to the server')
+    parser.add_argument('--cache', default='metacyc_frames.jsonl', help='Frame cache / recorded responses (JSON lines)')
+    parser.add_argument('--offline', action='store_true', help='Answer every lookup from the recorded responses in --cache, without a server')
+    parser.add_argument('--latency', type=float, default=0.0, help='With --offline, seconds added to each lookup to simulate the server')
+    args = parser.parse_args()
+
+    source = RecordedSource() if args.offline else PathwayToolsSource(args.host, args.port)
+    cache = FrameCache(args.cache, source, args.latency if args.offline else 0.0)
+
+    # Read the metacyc_GO.tsv file
+    df = pd.read_csv(f'metacyc_GO_v{args.go_version}.tsv', sep='\t')
+
+    start = time.perf_counter()
     try:
-        reactions_in_pathway = expand_subpathways(pathway_id)
-        predecessors_dict = {}
-        for reaction_id in reactions_in_pathway:
-            predecessors = get_reaction_predecessors(reaction_id, PFrame(pathway_id, meta, getFrameData=True))
-            predecessors_dict[reaction_id] = [pred.frameid for pred in predecessors]
-        all_paths = find_all_paths(predecessors_dict)
-        paths_with_ecs = []
-        for path in all_paths:
-            path_ecs = []
-            for reaction_id in path:
-                reaction = PFrame(reaction_id, meta, getFrameData=True)
-                if hasattr(reaction, 'ec_number') and reaction.ec_number:
-                    ec_numbers = reaction.ec_number
-                    formatted_ecs = format_ec_numbers(ec_numbers)
-                    path_ecs.append(formatted_ecs)
-            paths_with_ecs.append(path_ecs)
-        all_ec_paths = []
-        for path_ecs in paths_with_ecs:
-            all_ec_paths.extend(generate_ec_combinations(path_ecs))
-        return all_ec_paths
-    except Exception as e:
-        print(f"Error processing pathway {pathway_id}: {e}")
-        return None  # Return None to indicate an error occurred
-
-# Read the metacyc_GO.tsv file
-df = pd.read_csv(f'metacyc_GO_v{go_version}.tsv', sep='\t')
-
-# Prepare to collect results and skipped pathways
-results = []
-skipped_pathways = []
-
-# Process each pathway
-for index, row in df.iterrows():
-    pathway_id = row['MetaCyc_Pathway']
-    ec_combinations = process_pathway(pathway_id)
-    if ec_combinations is not None:
-        results.append({
-            'GO_Term': row['GO_Term'],
-            'MetaCyc_Pathway': pathway_id,
-            'EC_Combinations': ec_combinations
-        })
-    else:
-        skipped_pathways.append(pathway_id)
-
-# Convert results to DataFrame and save to new file
-results_df = pd.DataFrame(results)
-results_df.to_csv(f'metacyc_GO_v{go_version}_with_EC.tsv', sep='\t', index=False)
-
-# Save skipped pathways to a file
-with open('skipped.txt', 'w') as f:
-    for pathway in skipped_pathways:
-        f.write(pathway + '\n')
+        reaction_slots, errors = process_pathways(list(dict.fromkeys(df['MetaCyc_Pathway'])), cache, args.workers)
+    finally:
+        cache.close()
+    for pathway_id, error in errors.items():
+        print(f"Error processing pathway {pathway_id}: {error}")
+
+    # Prepare to collect results and skipped pathways
+    results = []
+    skipped_pathways = []
+    for _, row in df.iterrows():
+        pathway_id = row['MetaCyc_Pathway']
+        if pathway_id in reaction_slots:
+            results.append({
+                'GO_Term': row['GO_Term'],
+                'MetaCyc_Pathway': pathway_id,
+                'Reaction_Slots': json.dumps(reaction_slots[pathway_id], separators=(',', ':'))
+            })
+        else:
+            skipped_pathways.append(pathway_id)
+
+    # Convert results to DataFrame and save to new file
+    results_df = pd.DataFrame(results, columns=['GO_Term', 'MetaCyc_Pathway', 'Reaction_Slots'])
+    results_df.to_csv(f'metacyc_GO_v{args.go_version}_slots.tsv', sep='\t', index=False, quoting=csv.QUOTE_NONE)
+
+    # Save skipped pathways to a file
+    with open('skipped.txt', 'w') as f:
+        for pathway in skipped_pathways:
+            f.write(pathway + '\n')
+
+    print(f"{len(results)} pathways, {len(skipped_pathways)} skipped in {time.perf_counter() - start:.1f}s; "
+          f"{cache.fetched} lookups fetched, {cache.hits} from the cache")
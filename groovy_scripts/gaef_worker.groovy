@@ -0,0 +1,253 @@
+// Long-lived worker for taxonomic consistency and Information Content (IC).
+//
+// Loads the taxonomy ontologies (with the ELK reasoner) and the GO graph once,
+// then serves requests read line by line from stdin:
+//
+//   taxon<TAB><consistency_file><TAB><output_file>   (as taxon_consistency.groovy)
+//   ic<TAB><specific_terms_file><TAB><output_file>    (as ICVector.groovy)
+//   quit
+//
+// Each request is answered on stdout with a single line, "OK" or
+// "ERROR<TAB><message>". Progress messages go to stderr so that stdout only
+// carries the protocol. The ontologies are loaded lazily, on the first request
+// that needs them.
+@Grapes([
+  @Grab(group='net.sourceforge.owlapi', module='owlapi-distribution', version='5.5.0'),
+  @Grab(group='io.github.liveontologies', module='elk-owlapi', version='0.6.0'),
+  @Grab(group='com.github.sharispe', module='slib-sml', version='0.9.1'),
+  @GrabConfig(systemClassLoader=true)
+])
+
+import org.semanticweb.owlapi.apibinding.OWLManager
+import org.semanticweb.owlapi.model.*
+import org.semanticweb.elk.owlapi.ElkReasonerFactory
+import com.clarkparsia.owlapi.explanation.BlackBoxExplanation
+import com.clarkparsia.owlapi.explanation.HSTExplanationGenerator
+
+import org.openrdf.model.URI
+import org.openrdf.model.vocabulary.RDF
+import slib.graph.model.graph.G
+import slib.graph.model.impl.graph.memory.GraphMemory
+import slib.graph.model.impl.graph.elements.Edge
+import slib.graph.model.impl.repo.URIFactoryMemory
+import slib.graph.io.conf.GDataConf
+import slib.graph.io.util.GFormat
+import slib.graph.io.loader.GraphLoaderGeneric
+import slib.graph.algo.utils.GAction
+import slib.graph.algo.utils.GActionType
+import slib.graph.algo.utils.GraphActionExecutor
+import slib.sml.sm.core.engine.SM_Engine
+import slib.sml.sm.core.metrics.ic.utils.IC_Conf_Corpus
+import slib.sml.sm.core.metrics.ic.utils.ICconf
+import slib.sml.sm.core.utils.SMConstants
+
+System.setProperty("jdk.xml.entityExpansionLimit", "0")
+System.setProperty("jdk.xml.totalEntitySizeLimit", "0")
+
+def log = { msg -> System.err.println(msg) }
+def reply = { msg -> System.out.println(msg); System.out.flush() }
+
+//// TAXON CONSISTENCY ////
+
+def manager = OWLManager.createOWLOntologyManager()
+def df = manager.getOWLDataFactory()
+def baseIRI = "http://purl.obolibrary.org/obo/"
+def reasonerFactory = new ElkReasonerFactory()
+def taxonState = null
+
+def loadTaxonomy = {
+    log "Loading ontologies..."
+    def config = manager.getOntologyLoaderConfiguration()
+        .setMissingImportHandlingStrategy(MissingImportHandlingStrategy.SILENT)
+        .setLoadAnnotationAxioms(false)
+    def taxonFile = new File("constraints/ncbitaxon_with_disjointness.owl")
+    def goTaxonFile = new File("constraints/go-taxon-groupings.owl")
+    if (!taxonFile.exists() || !goTaxonFile.exists()) {
+        throw new FileNotFoundException("Ontology file(s) not found")
+    }
+    def taxonOntology = manager.loadOntologyFromOntologyDocument(new org.semanticweb.owlapi.io.FileDocumentSource(taxonFile), config)
+    def goTaxonOntology = manager.loadOntologyFromOntologyDocument(new org.semanticweb.owlapi.io.FileDocumentSource(goTaxonFile), config)
+    def ontology = manager.createOntology(IRI.create("http://merged.ontology/taxon-go"))
+    manager.addAxioms(ontology, taxonOntology.getAxioms())
+    manager.addAxioms(ontology, goTaxonOntology.getAxioms())
+    log "Ontologies loaded and merged successfully."
+    return [ontology: ontology, reasoner: reasonerFactory.createReasoner(ontology)]
+}
+
+def taxonIRI = { tid -> IRI.create("${baseIRI}${tid}") }
+def negatedTaxonIRI = { tid -> IRI.create("${baseIRI}${tid}_neg") }
+def getTaxonIdFromIRI = { iri -> iri.getFragment()?.replace("NCBITaxon_", "").replace("NCBITaxon_Union_", "").replace("_neg", "") ?: iri.toString() }
+def normalizeTaxonId = { tid -> tid.replace("NCBITaxon_", "").replace("NCBITaxon_Union_", "") }
+def describeRelationship = { axiom, id1, id2 ->
+    if (axiom instanceof OWLDisjointClassesAxiom) return "T${id1} and T${id2} are disjoint"
+    if (axiom instanceof OWLSubClassOfAxiom) {
+        def subClass = getTaxonIdFromIRI(axiom.getSubClass().asOWLClass().getIRI())
+        def superClass = getTaxonIdFromIRI(axiom.getSuperClass().asOWLClass().getIRI())
+        if (subClass == id1 && superClass == id2) return "T${id1} is a subclass of T${id2}"
+        if (subClass == id2 && superClass == id1) return "T${id2} is a subclass of T${id1}"
+    }
+    return "Relationship between T${id1} and T${id2}: ${axiom.getAxiomType()}"
+}
+
+def explain = { ontology, reasoner, conceptClass, annotations, onlySet, neverSet ->
+    def blackBox = new BlackBoxExplanation(ontology, reasonerFactory, reasoner)
+    def explanation = new HSTExplanationGenerator(blackBox).getExplanation(conceptClass)
+    if (!explanation || explanation.isEmpty()) return "Explanation could not be generated."
+
+    def conflictingTaxa = [:]
+    def relationshipAxiom = null
+    explanation.each { ax ->
+        ax.getClassesInSignature().each { cls ->
+            def iri = cls.getIRI()
+            def taxonId = getTaxonIdFromIRI(iri)
+            def type = iri.toString().contains("_neg") ? "never" : "only"
+            if ((type == "only" && onlySet.contains(taxonId)) || (type == "never" && neverSet.contains(taxonId))) {
+                conflictingTaxa[taxonId] = conflictingTaxa.getOrDefault(taxonId, [only: [] as Set, never: [] as Set])
+                conflictingTaxa[taxonId][type].addAll(annotations.findAll { it[type].contains(taxonId) })
+            }
+        }
+        if (!relationshipAxiom && (ax instanceof OWLDisjointClassesAxiom || ax instanceof OWLSubClassOfAxiom)) {
+            relationshipAxiom = ax
+        }
+    }
+    def parts = []
+    conflictingTaxa.each { taxonId, data ->
+        data.each { type, annots ->
+            if (annots) parts << annots.collect { "Protein ${it.protein} (${it.goId})" }.join(", ") + " requires ${type} in taxon T${taxonId}"
+        }
+    }
+    def text = parts.join("; ")
+    if (relationshipAxiom) {
+        def ids = relationshipAxiom.getClassesInSignature().collect { getTaxonIdFromIRI(it.getIRI()) }
+        text += ", and ${describeRelationship(relationshipAxiom, ids[0], ids[1])}"
+    }
+    return text
+}
+
+def checkTaxonConsistency = { String inputPath, String outputPath ->
+    if (taxonState == null) taxonState = loadTaxonomy()
+    def ontology = taxonState.ontology
+    def reasoner = taxonState.reasoner
+
+    def inputFile = new File(inputPath)
+    def genomeName = inputFile.name.replaceAll("_consistency.tsv", "")
+    def annotations = []
+    inputFile.eachLine { line, n ->
+        if (n == 1) return
+        def parts = line.split("\t", -1)
+        if (parts.length < 4) return
+        annotations << [
+            protein: parts[0].trim(),
+            goId: parts[1].trim(),
+            never: parts[2].trim() ? parts[2].split(",").collect { normalizeTaxonId(it.trim()) } as Set : [] as Set,
+            only: parts[3].trim() ? parts[3].split(",").collect { normalizeTaxonId(it.trim()) } as Set : [] as Set
+        ]
+    }
+    def onlySet = annotations.collectMany { it.only } as Set
+    def neverSet = annotations.collectMany { it.never } as Set
+
+    def onlyClasses = onlySet.collect { df.getOWLClass(taxonIRI("NCBITaxon_" + it)) }
+    def neverClasses = neverSet.collect { df.getOWLClass(negatedTaxonIRI("NCBITaxon_" + it)) }
+    def expr = df.getOWLObjectIntersectionOf((onlyClasses + neverClasses) ?: [df.getOWLThing()])
+    def conceptClass = df.getOWLClass(IRI.create("http://example.org#${genomeName}_Taxon_Concept"))
+    def axiom = df.getOWLEquivalentClassesAxiom(conceptClass, expr)
+
+    manager.addAxiom(ontology, axiom)
+    try {
+        reasoner.flush()
+        boolean isSatisfiable = reasoner.isSatisfiable(conceptClass)
+        String explanationText = ""
+        if (!isSatisfiable) {
+            try {
+                explanationText = explain(ontology, reasoner, conceptClass, annotations, onlySet, neverSet)
+            } catch (Exception ex) {
+                explanationText = "Error during explanation: ${ex.message}"
+            }
+        }
+        new File(outputPath).withWriter { writer ->
+            writer.println("Genome\tIsSatisfiable\tExplanation")
+            writer.println("${genomeName}\t${isSatisfiable}\t${explanationText}")
+        }
+    } finally {
+        manager.removeAxiom(ontology, axiom)
+        reasoner.flush()
+    }
+}
+
+//// INFORMATION CONTENT ////
+
+def factory = URIFactoryMemory.getSingleton()
+def goGraph = null
+def virtualRoot = factory.getURI("http://purl.obolibrary.org/obo/virtualRoot")
+ICconf icConf = new IC_Conf_Corpus("ResnikIC", SMConstants.FLAG_IC_ANNOT_RESNIK_1995_NORMALIZED)
+
+def loadGoGraph = {
+    log "Loading data/go-basic.owl..."
+    G graph = new GraphMemory(factory.getURI("http://purl.obolibrary.org/obo/"))
+    GraphLoaderGeneric.populate(new GDataConf(GFormat.RDF_XML, "data/go-basic.owl"), graph)
+    graph.addV(virtualRoot)
+    return graph
+}
+
+def getURIfromName = { name ->
+    def id = name.split('\\:')
+    return factory.getURI("http://purl.obolibrary.org/obo/${id[0]}_${id[1]}")
+}
+
+def computeIC = { String annotationsPath, String outputPath ->
+    if (goGraph == null) goGraph = loadGoGraph()
+    def edgesBefore = new HashSet(goGraph.getE())
+    def verticesBefore = new HashSet(goGraph.getV())
+    def genes = []
+    try {
+        // Same corpus construction and row order as ICVector.groovy (genes.push
+        // puts each gene first, so rows come out in reverse file order),
+        // undone after the request
+        new File(annotationsPath).splitEachLine('\t') { items ->
+            URI idURI = factory.getURI("http://purl.obolibrary.org/obo/" + items[0])
+            def annots = new LinkedHashSet()
+            for (int i = 1; i < items.size(); i++) {
+                goGraph.addE(new Edge(idURI, RDF.TYPE, factory.getURI("http://purl.obolibrary.org/obo/" + items[i])))
+                annots.add(getURIfromName(items[i]))
+            }
+            genes.push(annots)
+        }
+        GAction rooting = new GAction(GActionType.REROOTING)
+        rooting.addParameter("root_uri", virtualRoot.stringValue())
+        GraphActionExecutor.applyAction(factory, rooting, goGraph)
+
+        Map<URI, Double> ics = new SM_Engine(goGraph).getIC_results(icConf)
+        new File(outputPath).withWriter { out ->
+            genes.each { annots ->
+                out.write(annots.collect { ics.getOrDefault(it, 0.0).toString() }.join('\t') + '\n')
+            }
+        }
+    } finally {
+        goGraph.getE().findAll { !edgesBefore.contains(it) }.each { goGraph.removeE(it) }
+        goGraph.getV().findAll { !verticesBefore.contains(it) }.each { goGraph.removeV(it) }
+    }
+}
+
+//// REQUEST LOOP ////
+
+def stdin = new BufferedReader(new InputStreamReader(System.in))
+reply "READY"
+String line
+while ((line = stdin.readLine()) != null) {
+    def parts = line.split("\t", -1)
+    if (parts[0] == "quit") break
+    try {
+        if (parts[0] == "taxon" && parts.length == 3) {
+            checkTaxonConsistency(parts[1], parts[2])
+        } else if (parts[0] == "ic" && parts.length == 3) {
+            computeIC(parts[1], parts[2])
+        } else {
+            throw new IllegalArgumentException("Unknown request: ${line}")
+        }
+        reply "OK"
+    } catch (Throwable e) {
+        log e.toString()
+        reply "ERROR\t${e.toString().replaceAll('[\\t\\n]', ' ')}"
+    }
+}
+if (taxonState != null) taxonState.reasoner.dispose()
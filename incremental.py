@@ -0,0 +1,267 @@
+import os
+import json
+import shutil
+import tempfile
+from collections import Counter, defaultdict
+import numpy as np
+import scipy.sparse as sp
+import coherence
+from utils import expand_annotations
+from annotations import AnnotationMatrix
+from cache import save_arrays, load_arrays, encode_str_map, decode_str_map, str_array
+
+# Bump whenever the saved layout or the meaning of a saved field changes
+STATE_VERSION = 3
+
+
+class EvaluationState(object):
+    """
+    What an --incremental evaluation keeps between two runs of the same
+    genome, so that a revised annotation file only costs work proportional
+    to the proteins that changed.
+
+    - annotations: the last AnnotationMatrix that was evaluated
+    - expanded: its ancestor-expanded protein x term matrix
+    - term_counts: proteins per expanded term (column sums of expanded)
+    - complex_counts: coherence.ComplexIndex.counts of the annotations
+    - term_strings: {annotated term string: proteins}, the unexpanded genome
+      set used by the has_part check
+    - pathways: {pathway: details} for the annotated pathways
+    - has_part: {has_part term: [missing parts, set(carrier proteins)]}
+    - fingerprint: digest of the resource files the state was computed with
+
+    Only the metrics above are incremental. The most specific terms, the
+    taxon constraint checks and IC are recomputed over the whole genome on
+    every update (from the saved expanded matrix, which is not re-expanded).
+    """
+
+    def __init__(self, annotations, expanded, term_counts, complex_counts, term_strings, pathways, has_part,
+                 fingerprint):
+        self.annotations = annotations
+        self.expanded = expanded
+        self.term_counts = term_counts
+        self.complex_counts = complex_counts
+        self.term_strings = term_strings
+        self.pathways = pathways
+        self.has_part = has_part
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def empty(cls, go, fingerprint):
+        none = sp.csr_matrix((0, len(go)), dtype=bool)
+        return cls(AnnotationMatrix([], none, go), none.copy(), np.zeros(len(go), dtype=np.int64),
+                   np.zeros((2, 0), dtype=np.int64), Counter(), {}, {}, fingerprint)
+
+    def update(self, annotations, pathway_index, has_part_dict, complex_index):
+        """
+        Moves the state to a new AnnotationMatrix of the same genome.
+
+        Proteins whose annotation row is unchanged keep their expanded row;
+        only added and modified rows are expanded. The genome terms whose
+        presence flips decide which pathways are rescored and which has_part
+        terms are rechecked. On an empty state everything is new, so a first
+        run goes through the same path.
+
+        Returns:
+        - dict: numbers of added, removed and changed proteins, genome terms
+          that appeared or disappeared, and pathways rescored
+        """
+        go = annotations.go
+        old = self.annotations
+
+        # Diff: each new row either reuses an old row or is (re)expanded
+        source = np.full(len(annotations), -1, dtype=np.int64)
+        for r, protein_id in enumerate(annotations.proteins):
+            try:
+                o = old.row_index(protein_id)
+            except KeyError:
+                continue
+            if _same_row(old, o, annotations, r):
+                source[r] = o
+        fresh = np.flatnonzero(source < 0)
+        stale = np.setdiff1d(np.arange(len(old), dtype=np.int64), source[source >= 0])
+        added = sum(1 for r in fresh.tolist() if annotations.proteins[r] not in old)
+
+        fresh_expanded = expand_annotations(annotations.matrix[fresh], go)
+        stale_expanded = self.expanded[stale]
+
+        # Per-term and per-complex protein counts
+        term_counts = self.term_counts - _column_counts(stale_expanded) + _column_counts(fresh_expanded)
+        complex_counts = complex_index.counts(annotations.matrix[fresh]) - complex_index.counts(old.matrix[stale])
+        if old.proteins:
+            complex_counts += self.complex_counts
+        flipped = np.flatnonzero((term_counts > 0) != (self.term_counts > 0))
+        changed_terms = {go.ids[i] for i in flipped.tolist()}
+
+        source[fresh] = self.expanded.shape[0] + np.arange(len(fresh))
+        self.expanded = sp.vstack([self.expanded, fresh_expanded], format='csr')[source]
+
+        # Unexpanded term strings and has_part carriers of the changed rows
+        term_strings = self.term_strings
+        before = set(term_strings)
+        touched = set()
+        for o in stale.tolist():
+            protein_id = old.proteins[o]
+            for term in old.row_terms(o):
+                term_strings[term] -= 1
+                if term in has_part_dict:
+                    self.has_part[term][1].discard(protein_id)
+                    touched.add(term)
+        for r in fresh.tolist():
+            protein_id = annotations.proteins[r]
+            for term in annotations.row_terms(r):
+                term_strings[term] += 1
+                if term in has_part_dict:
+                    self.has_part.setdefault(term, [[], set()])[1].add(protein_id)
+                    touched.add(term)
+        term_strings += Counter()  # drop counts that reached zero
+        changed_strings = before.symmetric_difference(term_strings)
+
+        # Recheck has_part terms whose carriers or parts changed
+        if changed_strings:
+            touched.update(t for t in self.has_part if not has_part_dict[t].isdisjoint(changed_strings))
+        for term in touched:
+            if self.has_part[term][1]:
+                self.has_part[term][0] = sorted(has_part_dict[term] - term_strings.keys())
+            else:
+                del self.has_part[term]
+
+        # Rescore pathways involving a term whose presence flipped
+        if old.proteins:
+            rescored = pathway_index.pathways_for_terms(changed_terms)
+        else:
+            rescored = set(range(len(pathway_index.pathways)))
+        if rescored:
+            genome_go_terms = {go.ids[i] for i in np.flatnonzero(term_counts).tolist()}
+            _, _, _, details = coherence.analyze_genome(genome_go_terms, pathway_index, rescored)
+            for p in rescored:
+                self.pathways.pop(pathway_index.pathways[p], None)
+            self.pathways.update(details)
+
+        self.annotations = annotations
+        self.term_counts = term_counts
+        self.complex_counts = complex_counts
+        return {
+            'added': added,
+            'removed': len(stale) - (len(fresh) - added),
+            'changed': len(fresh) - added,
+            'changed_terms': len(changed_terms),
+            'rescored_pathways': len(rescored),
+        }
+
+    def genome_terms(self):
+        """Genome-level set of expanded terms."""
+        ids = self.annotations.go.ids
+        return {ids[i] for i in np.flatnonzero(self.term_counts).tolist()}
+
+    def expanded_annotations(self):
+        """ExpandedAnnotations view backed by the saved expanded matrix."""
+        return self.annotations.expanded(matrix=self.expanded)
+
+    def pathway_results(self, pathway_index):
+        """Same (completeness, completed, annotated, details) as coherence.analyze_genome."""
+        details = {p: self.pathways[p] for p in pathway_index.pathways if p in self.pathways}
+        completeness_results = {p: d['complete'] for p, d in details.items()}
+        completed = [p for p, complete in completeness_results.items() if complete]
+        return completeness_results, completed, set(details), details
+
+    def has_part_results(self, has_part_dict):
+        """Same (process_coherence, protein_details) as coherence.check_has_part."""
+        missing_relations_count = 0
+        total_relations_count = 0
+        carried = defaultdict(list)
+        for term, (missing, carriers) in self.has_part.items():
+            missing_relations_count += len(missing)
+            total_relations_count += len(has_part_dict[term])
+            for protein_id in carriers:
+                carried[protein_id].append(term)
+        protein_details = []
+        for protein_id in sorted(carried, key=self.annotations.row_index):
+            for term in sorted(carried[protein_id]):
+                protein_details.append({
+                    "protein_id": protein_id,
+                    "annotated_term": term,
+                    "missing_parts": self.has_part[term][0]
+                })
+        if total_relations_count == 0:
+            return 0, protein_details
+        return 100 - (missing_relations_count / total_relations_count) * 100, protein_details
+
+    def complex_classifications(self, complex_index):
+        """Same classification as coherence.ComplexIndex.classify, from complex_counts."""
+        return complex_index.classify_counts(self.complex_counts, self.annotations.go)
+
+    def save(self, directory):
+        """Writes the state to `directory`, replacing any previous state there."""
+        annotations = self.annotations
+        raw_rows = sorted(annotations.raw_terms)
+        arrays = {
+            'proteins': str_array(annotations.proteins),
+            'annotation_indptr': annotations.matrix.indptr,
+            'annotation_indices': annotations.matrix.indices,
+            'expanded_indptr': self.expanded.indptr,
+            'expanded_indices': self.expanded.indices,
+            'term_counts': self.term_counts,
+            'complex_counts': self.complex_counts,
+        }
+        arrays.update({'raw_' + k: v for k, v in
+                       encode_str_map({str(r): annotations.raw_terms[r] for r in raw_rows}).items()})
+        meta = {
+            'version': STATE_VERSION,
+            'fingerprint': self.fingerprint,
+            'term_strings': dict(self.term_strings),
+            'pathways': self.pathways,
+            'has_part': {t: [missing, sorted(carriers)] for t, (missing, carriers) in self.has_part.items()},
+        }
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        tmp = tempfile.mkdtemp(prefix='.' + os.path.basename(directory), dir=parent)
+        save_arrays(tmp, arrays)
+        with open(os.path.join(tmp, 'state.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+
+    @classmethod
+    def load(cls, directory, go, fingerprint):
+        """
+        Reads a saved state, or returns None when there is none or it was
+        written by another STATE_VERSION, for another GO release or with
+        other resource files (a stale state is rebuilt from scratch).
+        """
+        try:
+            with open(os.path.join(directory, 'state.json')) as f:
+                meta = json.load(f)
+            if meta['version'] != STATE_VERSION or meta['fingerprint'] != fingerprint:
+                return None
+            arrays = {k: np.array(v) for k, v in load_arrays(directory).items()}
+        except (OSError, ValueError, KeyError):
+            return None
+        n_terms = len(go)
+        if len(arrays['term_counts']) != n_terms:
+            return None
+
+        proteins = arrays['proteins'].tolist()
+        shape = (len(proteins), n_terms)
+        matrix = sp.csr_matrix((np.ones(len(arrays['annotation_indices']), dtype=bool),
+                                arrays['annotation_indices'], arrays['annotation_indptr']), shape=shape)
+        expanded = sp.csr_matrix((np.ones(len(arrays['expanded_indices']), dtype=bool),
+                                  arrays['expanded_indices'], arrays['expanded_indptr']), shape=shape)
+        raw = decode_str_map({k[4:]: v for k, v in arrays.items() if k.startswith('raw_')})
+        raw_terms = {int(r): terms for r, terms in raw.items()}
+        has_part = {t: [missing, set(carriers)] for t, (missing, carriers) in meta['has_part'].items()}
+        return cls(AnnotationMatrix(proteins, matrix, go, raw_terms), expanded, arrays['term_counts'],
+                   arrays['complex_counts'], Counter(meta['term_strings']), meta['pathways'], has_part, fingerprint)
+
+
+def _same_row(a, i, b, j):
+    if (i in a.raw_terms) != (j in b.raw_terms):
+        return False
+    if i in a.raw_terms:
+        return a.raw_terms[i] == b.raw_terms[j]
+    ma, mb = a.matrix, b.matrix
+    return np.array_equal(ma.indices[ma.indptr[i]:ma.indptr[i + 1]], mb.indices[mb.indptr[j]:mb.indptr[j + 1]])
+
+
+def _column_counts(matrix):
+    return np.bincount(matrix.indices, minlength=matrix.shape[1]).astype(np.int64)
@@ -1,3 +1,112 @@
+import math
+import argparse
+import numpy as np
+from utils import IS_A, annotation_matrix, expand_annotations
+from annotations import AnnotationMatrix
+
+# slib loads go-basic.owl, where only is_a edges are plain subclass axioms
+IC_RELATIONS = (IS_A,)
+
+
+def annotation_counts(protein_go_terms, go, relations=IC_RELATIONS):
+    """
+    Counts, for every GO term, the proteins annotated with it or with one of
+    its descendants (one propagation of the protein x term incidence matrix).
+
+    Parameters:
+    - protein_go_terms (dict or AnnotationMatrix): {protein_id: set(GO_terms)}
+    - go (GOGraph): Parsed GO graph
+
+    Returns:
+    - tuple: (counts array indexed by term ID, number of annotated proteins)
+    """
+    if isinstance(protein_go_terms, AnnotationMatrix):
+        matrix = protein_go_terms.matrix
+    else:
+        _, matrix = annotation_matrix(protein_go_terms, go)
+    expanded = expand_annotations(matrix, go, relations)
+    counts = np.asarray(expanded.sum(axis=0)).ravel().astype(np.int64)
+    total = int(np.count_nonzero(np.diff(matrix.indptr)))
+    return counts, total
+
+
+def resnik_ic(counts, total, normalized=True):
+    """
+    Resnik IC, -log(count / total), for every term with a non-zero count.
+    The normalized variant divides by log(total), the IC of a term seen
+    once, so values lie in [0, 1]. Unannotated terms get 0.0, and so does
+    every term of a one-protein corpus, where each term is seen everywhere.
+    """
+    ic = np.zeros(len(counts), dtype=np.float64)
+    seen = counts > 0
+    if total > 0:
+        ic[seen] = np.log(total) - np.log(counts[seen])
+        if normalized and total > 1:
+            ic[seen] /= math.log(total)
+    return ic
+
+
+def write_ic_file(protein_go_terms, ic, go, output_file):
+    """
+    Writes one line per protein with the IC of each of its terms, in the
+    same row and term order as the _specific_GO_terms.tsv file.
+    """
+    with open(output_file, 'w') as f:
+        for terms in protein_go_terms.values():
+            if not terms:
+                continue
+            values = []
+            for term in sorted(terms):
+                i = go.term_index(term)
+                values.append(repr(float(ic[i])) if i is not None else '0.0')
+            f.write('\t'.join(values) + '\n')
+    return output_file
+
+
+def compute_ic(protein_go_terms, go, output_file, reference=None, normalized=True):
+    """
+    Native replacement for ICVector.groovy: corpus-based (normalized) Resnik
+    IC of every annotated term, written to output_file.
+
+    Parameters:
+    - protein_go_terms (dict or AnnotationMatrix): Most specific GO terms per protein
+    - go (GOGraph): Parsed GO graph
+    - output_file (str): Path of the IC table to write
+    - reference (tuple): Optional (counts, total) from load_ic_reference; when
+      given, IC is taken from that corpus instead of the genome itself
+    """
+    counts, total = reference if reference is not None else annotation_counts(protein_go_terms, go)
+    ic = resnik_ic(counts, total, normalized)
+    return write_ic_file(protein_go_terms, ic, go, output_file)
+
+
+def save_ic_reference(counts, total, go, output_file):
+    """Saves a reference corpus as GO_ID / occurrences / IC rows."""
+    ic = resnik_ic(counts, total)
+    with open(output_file, 'w') as f:
+        f.write(f"# total_annotated\t{total}\n")
+        f.write("GO_ID\toccurrences\tIC\n")
+        for i in np.flatnonzero(counts).tolist():
+            f.write(f"{go.ids[i]}\t{counts[i]}\t{float(ic[i])!r}\n")
+    return output_file
+
+
+def load_ic_reference(reference_file, go):
+    """Loads a reference corpus written by save_ic_reference as (counts, total)."""
+    counts = np.zeros(len(go), dtype=np.int64)
+    total = 0
+    with open(reference_file, 'r') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if parts[0] == '# total_annotated':
+                total = int(parts[1])
+            elif parts[0].startswith('GO:'):
+                i = go.term_index(parts[0])
+                if i is not None:
+                    counts[i] = int(parts[1])
+    return counts, total
+
+
 def calculate_ic_depth_breadth(ic_file):
     """
     Calculates IC depth, IC breadth, and normalized IC breadth.
@@ -33,3 +142,71 @@ def calculate_ic_depth_breadth(ic_file):
         'normalized_ic_breadth': normalized_ic_breadth
     }
 
+
+def _read_ic_rows(ic_file):
+    with open(ic_file) as f:
+        return [[float(x) for x in line.split('\t') if x.strip()] for line in f]
+
+
+def compare_ic_files(expected_file, actual_file, expected_reversed=False):
+    """
+    Compares two IC tables value by value, e.g. a native table against
+    ICVector.groovy output. ICVector.groovy pushes each protein onto the
+    front of its list, so its rows are in reverse order of the
+    _specific_GO_terms.tsv file; pass expected_reversed for such a table.
+
+    Returns:
+    - dict: number of values compared, rows whose number of values differ,
+      max and mean absolute difference, and the IC depth/breadth of both files
+    """
+    expected, actual = _read_ic_rows(expected_file), _read_ic_rows(actual_file)
+    if expected_reversed:
+        expected.reverse()
+    diffs, mismatched_rows = [], abs(len(expected) - len(actual))
+    for ve, va in zip(expected, actual):
+        if len(ve) != len(va):
+            mismatched_rows += 1
+            continue
+        diffs.extend(abs(a - b) for a, b in zip(ve, va))
+    return {
+        'values': len(diffs),
+        'mismatched_rows': mismatched_rows,
+        'max_abs_diff': max(diffs) if diffs else 0.0,
+        'mean_abs_diff': sum(diffs) / len(diffs) if diffs else 0.0,
+        'expected': calculate_ic_depth_breadth(expected_file),
+        'actual': calculate_ic_depth_breadth(actual_file),
+    }
+
+
+if __name__ == '__main__':
+    from main import load_annotations
+    from utils import load_go_graph
+    from annotations import load_annotation_matrix
+
+    parser = argparse.ArgumentParser(description='Native Information Content (IC) tools.')
+    parser.add_argument('--obo', default='data/go-basic.obo', help='Path to go-basic.obo')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ref = sub.add_parser('reference', help='Build a reference-corpus IC table from annotation files')
+    ref.add_argument('--output', required=True, help='Reference table to write')
+    ref.add_argument('annotation_files', nargs='+')
+    val = sub.add_parser('validate', help='Compare native IC against an ICVector.groovy output table')
+    val.add_argument('--specific_terms', default='examples/outputs/example_assembly_specific_GO_terms.tsv')
+    val.add_argument('--expected', default='examples/outputs/example_assembly_IC.tsv')
+    val.add_argument('--output', default='native_IC.tsv')
+    val.add_argument('--in_order', action='store_true', help='The expected table lists proteins in file order (ICVector.groovy writes them reversed)')
+    args = parser.parse_args()
+
+    go = load_go_graph(args.obo)
+    if args.command == 'reference':
+        counts, total = np.zeros(len(go), dtype=np.int64), 0
+        for path in args.annotation_files:
+            c, t = annotation_counts(load_annotation_matrix(path, go).specific(), go)
+            counts += c
+            total += t
+        save_ic_reference(counts, total, go, args.output)
+        print(f"Saved {args.output} ({total} annotated proteins)")
+    else:
+        specific = load_annotations(args.specific_terms)
+        compute_ic(specific, go, args.output)
+        for key, value in compare_ic_files(args.expected, args.output, expected_reversed=not args.in_order).items():
+            print(f"{key}\t{value}")
@@ -0,0 +1,103 @@
+import atexit
+import subprocess
+
+WORKER_SCRIPT = "groovy_scripts/gaef_worker.groovy"
+TAXON_SCRIPT = "groovy_scripts/taxon_consistency.groovy"
+IC_SCRIPT = "groovy_scripts/ICVector.groovy"
+
+
+class GroovyWorker(object):
+    """
+    Long-lived `groovy gaef_worker.groovy` process.
+
+    The worker loads the taxonomy ontologies, the ELK reasoner and the GO
+    graph once and then answers one request per line on stdin with "OK" or
+    "ERROR<TAB>message" on stdout. The process is started on the first
+    request and restarted if it dies.
+    """
+
+    def __init__(self, script=WORKER_SCRIPT):
+        self.script = script
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen(["groovy", self.script], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     text=True, bufsize=1)
+        ready = self.proc.stdout.readline().strip()
+        if ready != "READY":
+            self.close()
+            raise RuntimeError(f"Groovy worker failed to start (got {ready!r})")
+
+    def request(self, command, *args):
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        self.proc.stdin.write("\t".join((command,) + args) + "\n")
+        self.proc.stdin.flush()
+        response = self.proc.stdout.readline()
+        if not response:
+            self.proc = None
+            raise RuntimeError("Groovy worker exited unexpectedly")
+        status, _, message = response.rstrip("\n").partition("\t")
+        if status != "OK":
+            raise RuntimeError(f"Groovy worker error: {message}")
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            if self.proc.poll() is None:
+                self.proc.stdin.write("quit\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+        self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared_worker = None
+
+def shared_worker():
+    """One GroovyWorker per process, reused across genomes and closed at exit."""
+    global _shared_worker
+    if _shared_worker is None:
+        _shared_worker = GroovyWorker()
+        atexit.register(_shared_worker.close)
+    return _shared_worker
+
+
+def run_groovy_script(script, *args):
+    """One-shot `groovy script args...` run (the behaviour without a worker)."""
+    try:
+        result = subprocess.run(["groovy", script] + list(args), capture_output=True, text=True, check=True)
+        print("Groovy script output:")
+        print(result.stdout)
+        if result.stderr:
+            print("Groovy script error output:")
+            print(result.stderr)
+    except subprocess.CalledProcessError as e:
+        print("Error running Groovy script:")
+        print(e.stderr)
+
+
+def _run(worker, command, script, input_file, output_file):
+    if worker is not None:
+        try:
+            worker.request(command, input_file, output_file)
+            return
+        except (OSError, RuntimeError) as e:
+            print(f"{e}; falling back to {script}")
+    run_groovy_script(script, input_file, output_file)
+
+
+def run_taxon_consistency(consistency_file, output_file, worker=None):
+    _run(worker, "taxon", TAXON_SCRIPT, consistency_file, output_file)
+
+
+def run_ic(specific_terms_file, output_file, worker=None):
+    _run(worker, "ic", IC_SCRIPT, specific_terms_file, output_file)
@@ -1,77 +1,158 @@
 import csv
-import json
 import os
+import re
+import json
+import hashlib
 import argparse
-import subprocess
-import plotly.express as px
-from flask import Flask, render_template
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, render_template, request, jsonify, abort, url_for, send_from_directory
 from collections import defaultdict
-from information_content import calculate_ic_depth_breadth
+from information_content import calculate_ic_depth_breadth, compute_ic, load_ic_reference
 from completeness import read_essential_terms, count_essential_terms
-from utils import get_ancestors, get_specific, Ontology
-from consistency import check_consistency
+from utils import load_go_graph, expand_annotations
+from annotations import iter_annotations, load_annotation_matrix
+from incremental import EvaluationState
+from profiling import Profiler, NULL_PROFILER
+from consistency import (check_consistency, load_taxon_constraints, compile_taxon_constraints, load_taxon_lattice,
+    taxon_ontology_files, check_taxon_consistency, load_taxon_parents, taxon_ancestors, score_consistency)
 import plots
+import report
 import coherence
+import cache
+import jvm_worker
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
 def load_annotations(annotation_file):
     protein_go_terms = {}
-    with open(annotation_file, 'r') as f:
-        tsv_reader = csv.reader(f, delimiter='\t')
-        for row in tsv_reader:
-            if row:
-                protein_id = row[0]
-                go_terms = set(row[1:])  # Skip the protein ID
-                protein_go_terms[protein_id] = go_terms
+    for protein_id, go_terms in iter_annotations(annotation_file):
+        protein_go_terms[protein_id] = set(go_terms)
     return protein_go_terms
 
 term_file = "constraints/essential_terms.tsv"
 has_part_file = "constraints/has_part_relations.txt"
 ec2go_file = "constraints/ec2go_v2025-03-16"
-pathway_file = "constraints/metacyc_GO_v2025-03-16_with_EC.tsv"
+pathway_file = "constraints/metacyc_GO_v2025-03-16_slots.tsv"
+complexes_file = "constraints/protein_complexes.tsv"
 ontology_file = "data/go-basic.obo"
 taxa_constraints_file = "constraints/taxon_constraints.tsv"
+taxonomy_file = "data/nodes.dmp"
+# Resources an --incremental evaluation state was computed with
+state_sources = [ontology_file, has_part_file, ec2go_file, pathway_file, complexes_file]
 MACROMOLECULAR_COMPLEX = "GO:0032991"
 HOMODIMERIZATION = "GO:0042803"
 
-# @app.route('/')
-def evaluation(assembly_name, annotation_file, groovy_flag=False):
-	# Load annotations
-	protein_go_terms = load_annotations(annotation_file)
-	protein_go_terms_ancestors = get_ancestors(protein_go_terms)
-	protein_go_terms_specific = get_specific(protein_go_terms)
-	go = Ontology(ontology_file)
-	specific_terms_file = f"{assembly_name}_specific_GO_terms.tsv"
+def load_resources(cache_dir=None, ic_reference_file=None, taxonomy=taxonomy_file):
+	"""
+	Loads the GO graph and every constraint file, going through the binary
+	cache in cache.py (cache_dir=False disables it). An optional reference
+	IC corpus (see information_content.py) replaces per-genome IC. The NCBI
+	taxonomy (nodes.dmp), needed to score a genome's taxon ID, is loaded
+	when the file exists.
+	"""
+	go = cache.cached('go_graph', [ontology_file], lambda: load_go_graph(ontology_file),
+		cache.encode_go_graph, cache.decode_go_graph, cache_dir)
+	go.closure = cache.cached('go_closure', [ontology_file], go.ancestor_closure,
+		cache.encode_closure, cache.decode_closure, cache_dir)
+	taxon_constraints = cache.cached('taxon_constraints', [taxa_constraints_file, ontology_file],
+		lambda: compile_taxon_constraints(*load_taxon_constraints(taxa_constraints_file), go),
+		cache.encode_taxon_constraints, cache.decode_taxon_constraints, cache_dir)
+	taxon_lattice = cache.cached('taxon_lattice', taxon_ontology_files, lambda: load_taxon_lattice(taxon_ontology_files),
+		cache.encode_taxon_lattice, cache.decode_taxon_lattice, cache_dir)
+	taxon_parents = None
+	if taxonomy and os.path.exists(taxonomy):
+		taxon_parents = cache.cached('taxon_parents', [taxonomy], lambda: load_taxon_parents(taxonomy),
+			cache.encode_taxon_parents, cache.decode_taxon_parents, cache_dir)
+	ec2go_mapping = cache.cached('ec2go', [ec2go_file], lambda: coherence.parse_ec2go(ec2go_file),
+		cache.encode_str_map, cache.decode_str_list_map, cache_dir)
+	has_part_dict = cache.cached('has_part', [has_part_file], lambda: coherence.parse_has_part(has_part_file),
+		cache.encode_str_map, cache.decode_str_map, cache_dir)
+	pathway_index = cache.cached('pathways', [pathway_file, ec2go_file],
+		lambda: coherence.compile_pathways(coherence.load_pathway_slots(pathway_file), ec2go_mapping),
+		cache.encode_pathway_index, cache.decode_pathway_index, cache_dir)
+	complex_index = cache.cached('complexes', [complexes_file, ontology_file],
+		lambda: coherence.compile_complexes(coherence.load_complex_classifications(complexes_file), go),
+		cache.encode_complex_index, cache.decode_complex_index, cache_dir)
+	return {
+		'go': go,
+		'taxon_constraints': taxon_constraints,
+		'taxon_lattice': taxon_lattice,
+		'taxon_parents': taxon_parents,
+		'ec2go_mapping': ec2go_mapping,
+		'has_part_dict': has_part_dict,
+		'pathway_index': pathway_index,
+		'complex_index': complex_index,
+		'ic_reference': load_ic_reference(ic_reference_file, go) if ic_reference_file else None,
+	}
+
+def evaluation(assembly_name, annotation_file, groovy_flag=False, resources=None, output_dir='.', jvm=None, native_ic=False, taxon_id=None, incremental=False, profiler=NULL_PROFILER):
+	if resources is None:
+		resources = load_resources()
+	go = resources['go']
+	output_prefix = os.path.join(output_dir, assembly_name)
 
-	with open(specific_terms_file, "w") as f:
-		for protein, terms in protein_go_terms_specific.items():
-			if terms:  # skip proteins with no terms
-				f.write(protein + "\t" + "\t".join(sorted(terms)) + "\n")
+	# Load annotations (streamed into a protein x term matrix; per-protein
+	# expanded sets are only built block by block where a metric needs them)
+	with profiler.stage('load_annotations') as counts:
+		protein_go_terms = load_annotation_matrix(annotation_file, go)
+		counts.update(proteins=len(protein_go_terms), annotations=int(protein_go_terms.matrix.nnz))
+	state = None
+	if incremental:
+		# Update the saved state of the previous run: only added or modified
+		# proteins are expanded and only the metrics they touch are recomputed
+		with profiler.stage('incremental_update') as counts:
+			state_dir = f"{output_prefix}_state"
+			fingerprint = cache.file_digest(state_sources)
+			state = EvaluationState.load(state_dir, go, fingerprint) or EvaluationState.empty(go, fingerprint)
+			changes = state.update(protein_go_terms, resources['pathway_index'], resources['has_part_dict'], resources['complex_index'])
+			counts.update(changes)
+		print(f"Incremental update: {changes['added']} added, {changes['removed']} removed, {changes['changed']} changed proteins; "
+			f"{changes['changed_terms']} genome terms changed, {changes['rescored_pathways']} pathways rescored")
+		protein_go_terms_ancestors = state.expanded_annotations()
+		genome_go_terms = state.genome_terms()
+	else:
+		# Expanded once here, so its cost is not charged to the first metric reading it
+		with profiler.stage('expand_annotations') as counts:
+			expanded = expand_annotations(protein_go_terms.matrix, go)
+			protein_go_terms_ancestors = protein_go_terms.expanded(matrix=expanded)
+			counts.update(expanded_annotations=int(expanded.nnz))
+		with profiler.stage('genome_terms'):
+			genome_go_terms = protein_go_terms.expanded_genome_terms()
+	with profiler.stage('specific_terms') as counts:
+		protein_go_terms_specific = protein_go_terms.specific()
+		specific_terms_file = f"{output_prefix}_specific_GO_terms.tsv"
+
+		with open(specific_terms_file, "w") as f:
+			for protein, terms in protein_go_terms_specific.items():
+				if terms:  # skip proteins with no terms
+					f.write(protein + "\t" + "\t".join(sorted(terms)) + "\n")
+		counts.update(expanded_terms=len(genome_go_terms), specific_annotations=int(protein_go_terms_specific.matrix.nnz))
 
 
 	### COMPLETENESS ###
 	# Essential terms
-	core_terms, periph_terms = read_essential_terms(term_file)
-	core_ids = {e['term'] for e in core_terms}
-	periph_ids = {e['term'] for e in periph_terms}
-	core_labels = [e['Function'] for e in core_terms]
-	periph_labels = [e['Function'] for e in periph_terms]
+	with profiler.stage('essential_terms') as counts:
+		core_terms, periph_terms = read_essential_terms(term_file)
+		core_ids = {e['term'] for e in core_terms}
+		periph_ids = {e['term'] for e in periph_terms}
+		core_labels = [e['Function'] for e in core_terms]
+		periph_labels = [e['Function'] for e in periph_terms]
 
-	core_count = count_essential_terms(protein_go_terms_ancestors, core_ids)
-	periph_count = count_essential_terms(protein_go_terms_ancestors, periph_ids)
-	essential_percentage = (sum(core_count.values())/len(core_ids)) * 100 if core_ids else 0	
+		core_count = count_essential_terms(genome_go_terms, core_ids)
+		periph_count = count_essential_terms(genome_go_terms, periph_ids)
+		essential_percentage = (sum(core_count.values())/len(core_ids)) * 100 if core_ids else 0	
+		counts.update(terms=len(core_ids) + len(periph_ids))
 
 	# Completeness plots
-	core_vals   = [core_count.get(e['term'], 0) for e in core_terms]
-	fig_core    = px.bar(x=core_labels, y=core_vals,
-		labels={'x': 'Core Function', 'y': 'Presence'})
-	plot_core_html = fig_core.to_html(full_html=False, include_plotlyjs='cdn')
+	with profiler.stage('completeness_plots'):
+		core_vals   = [core_count.get(e['term'], 0) for e in core_terms]
+		fig_core    = plots.presence_bar(core_labels, core_vals, 'Core Function')
 
-	periph_vals   = [periph_count.get(e['term'], 0) for e in periph_terms]
-	fig_periph    = px.bar(x=periph_labels, y=periph_vals,
-		labels={'x': 'Peripheral Function', 'y': 'Presence'})
-	plot_periph_html = fig_periph.to_html(full_html=False, include_plotlyjs=False)
+		periph_vals   = [periph_count.get(e['term'], 0) for e in periph_terms]
+		fig_periph    = plots.presence_bar(periph_labels, periph_vals, 'Peripheral Function')
 
 	# Tables grouping
 	go_core   = {'Core': core_terms}
@@ -84,59 +165,75 @@ def evaluation(assembly_name, annotation_file, groovy_flag=False):
 
 	### COHERENCE ###
    # Pathway coherence
-	ec2go_mapping      = coherence.parse_ec2go(ec2go_file)
-	pathway_to_go      = coherence.map_pathways_to_go_terms(pathway_file, ec2go_mapping)
-	_, metacyc_completed, metacyc_annotated, pathway_details = coherence.analyze_genome(protein_go_terms_ancestors, pathway_to_go, ec2go_mapping)
-	metacyc_pct       = (len(metacyc_completed) / len(metacyc_annotated)) * 100
+	ec2go_mapping      = resources['ec2go_mapping']
+	pathway_index      = resources['pathway_index']
+	with profiler.stage('pathway_coherence') as counts:
+		if state is not None:
+			_, metacyc_completed, metacyc_annotated, pathway_details = state.pathway_results(pathway_index)
+		else:
+			_, metacyc_completed, metacyc_annotated, pathway_details = coherence.analyze_genome(genome_go_terms, pathway_index)
+		counts.update(pathways=len(pathway_index.pathways), annotated_pathways=len(metacyc_annotated))
+	metacyc_pct       = (len(metacyc_completed) / len(metacyc_annotated)) * 100 if metacyc_annotated else 0
 	total_completed   = len(metacyc_completed)
 	total_annotated   = len(metacyc_annotated)
 	total_incomplete  = total_annotated - total_completed
 
 	# Process coherence
-	has_part_dict = coherence.parse_has_part(has_part_file)
-	process_coherence, has_part_protein_details = coherence.check_has_part(protein_go_terms, has_part_dict)
+	has_part_dict = resources['has_part_dict']
+	with profiler.stage('process_coherence') as counts:
+		if state is not None:
+			process_coherence, has_part_protein_details = state.has_part_results(has_part_dict)
+		else:
+			process_coherence, has_part_protein_details = coherence.check_has_part(protein_go_terms, has_part_dict)
+		counts.update(has_part_checks=len(has_part_protein_details))
 
 	# Protein complex coherence
-	term_to_children, _, _ = coherence.parse_go_ontology(ontology_file)
-	complex_child_terms = coherence.get_all_child_terms(MACROMOLECULAR_COMPLEX, term_to_children)
-	complex_child_terms.add(MACROMOLECULAR_COMPLEX)
-	complex_classifications, _ = coherence.classify_complexes(protein_go_terms_ancestors, complex_child_terms)
+	with profiler.stage('complex_coherence') as counts:
+		if state is not None:
+			complex_classifications = state.complex_classifications(resources['complex_index'])
+		else:
+			complex_classifications = resources['complex_index'].classify(protein_go_terms)
+		counts.update(complexes=len(complex_classifications))
 	coherent_count, incoherent_count = coherence.count_complexes(complex_classifications)
 	complex_coherence = (coherent_count / (coherent_count + incoherent_count)) * 100 if (coherent_count + incoherent_count) > 0 else 0
-	term_names = {t: go.get_term(t)['name'] for t in complex_classifications}
+	term_names = {t: go.get_name(t) for t in complex_classifications}
 
 	### CONSISTENCY ###
 	# Taxonomic consistency
-	consistency_file =  check_consistency(protein_go_terms_ancestors, taxa_constraints_file, output_file = assembly_name + "_consistency.tsv")
-	if groovy_flag:
-		print("Evaluating taxonomic consistency with Groovy.")
-		groovy_script = "groovy_scripts/taxon_consistency.groovy"
-		groovy_output_file = f"{assembly_name}_taxon_explanations.tsv"
-		try:
-			result = subprocess.run(["groovy", groovy_script, consistency_file, groovy_output_file], capture_output=True, text=True, check=True)
-			print("Groovy script output:")
-			print(result.stdout)
-			if result.stderr:
-				print("Groovy script error output:")
-				print(result.stderr)
-		except subprocess.CalledProcessError as e:
-			print("Error running Groovy script:")
-			print(e.stderr)
-            
+	consistency_file = output_prefix + "_consistency.tsv"
+	lineage = None
+	if taxon_id is not None:
+		if resources.get('taxon_parents') is None:
+			raise FileNotFoundError(f"Scoring taxon {taxon_id} needs the NCBI taxonomy nodes.dmp (--taxonomy, default {taxonomy_file})")
+		lineage = taxon_ancestors(taxon_id, resources['taxon_parents'], resources['taxon_lattice'])
+	with profiler.stage('taxon_constraints') as counts:
+		constraint_hits = check_consistency(protein_go_terms_ancestors, resources['taxon_constraints'], consistency_file, lineage)
+		taxon_score = score_consistency(constraint_hits, resources['taxon_constraints'], lineage) if lineage is not None else None
+		counts.update(constrained_terms=len(constraint_hits))
+	explanations_file = f"{output_prefix}_taxon_explanations.tsv"
+	with profiler.stage('taxon_satisfiability', groovy=bool(groovy_flag)):
+		if groovy_flag:
+			print("Evaluating taxonomic consistency with Groovy.")
+			jvm_worker.run_taxon_consistency(consistency_file, explanations_file, jvm)
+		else:
+			check_taxon_consistency(assembly_name, constraint_hits, resources['taxon_constraints'], resources['taxon_lattice'], explanations_file)
+
 	### OVERVIEW ###
 	completeness_data = [
 		essential_percentage,
 		metacyc_pct,
 		process_coherence, 
 		complex_coherence]
+	if taxon_score is not None:
+		completeness_data.append(taxon_score['consistency_percentage'])
      
 	gauge_html = plots.create_completeness_gauge_html(completeness_data)
 	
 	context = {
         'assembly_name': assembly_name,
         'essential_percentage': round(essential_percentage, 2),
-        'plot_core_html': plot_core_html,
-        'plot_periph_html': plot_periph_html,
+        'plot_core': fig_core,
+        'plot_periph': fig_periph,
         'go_categories_core': go_core,
         'go_categories_periph': go_periph,
         'found_terms': found_terms,
@@ -153,69 +250,458 @@ def evaluation(assembly_name, annotation_file, groovy_flag=False):
         'pathway_details': pathway_details,
         'gauge_html': gauge_html
     }
+	if taxon_score is not None:
+		context['taxon_id'] = taxon_id
+		context.update(taxon_score)
+		context['consistency_percentage'] = round(taxon_score['consistency_percentage'], 2)
    
-	if groovy_flag:
-		satisfiable = True
-		if os.path.exists(groovy_output_file):
-			with open(groovy_output_file, encoding="utf-8") as f:
-				next(f)  # skip header
-				for line in f:
-					parts = line.strip().split("\t")
-					if len(parts) >= 2 and parts[1].lower() == "false":
-						satisfiable = False
-						break
-			context["satisfiable"] = satisfiable
-
-	if groovy_flag:
-		print("Calculating Information Content (IC) with Groovy.")
-		groovy_IC = "groovy_scripts/ICVector.groovy"
-		groovy_IC_output_file = f"{assembly_name}_IC.tsv"
-		try:
-			result = subprocess.run(["groovy", groovy_IC, specific_terms_file, groovy_IC_output_file], capture_output=True, text=True, check=True)
-			print("Groovy script output:")
-			print(result.stdout)
-			if result.stderr:
-				print("Groovy script error output:")
-				print(result.stderr)
-		except subprocess.CalledProcessError as e:
-			print("Error running Groovy script:")
-			print(e.stderr)
-
-	if groovy_flag:
-		# Calculate IC depth and breadth
-		depth, breadth, normalized_breadth = calculate_ic_depth_breadth(groovy_IC_output_file)
-		context["ic_depth"] = depth
-		context["ic_breadth"] = breadth
-		context["normalized_ic_breadth"] = normalized_breadth
+	satisfiable = True
+	if os.path.exists(explanations_file):
+		with open(explanations_file, encoding="utf-8") as f:
+			next(f)  # skip header
+			for line in f:
+				parts = line.strip().split("\t")
+				if len(parts) >= 2 and parts[1].lower() == "false":
+					satisfiable = False
+					break
+		context["satisfiable"] = satisfiable
+
+	### INFORMATION CONTENT ###
+	# ICVector.groovy with --groovy; the native engine, whose values differ
+	# from slib's, only when asked for (native_ic or a reference corpus)
+	native_ic = native_ic or resources.get('ic_reference') is not None
+	if groovy_flag or native_ic:
+		ic_output_file = f"{output_prefix}_IC.tsv"
+		with profiler.stage('information_content', groovy=not native_ic):
+			if native_ic:
+				compute_ic(protein_go_terms_specific, go, ic_output_file, resources.get('ic_reference'))
+			else:
+				print("Calculating Information Content (IC) with Groovy.")
+				jvm_worker.run_ic(specific_terms_file, ic_output_file, jvm)
+			context.update(calculate_ic_depth_breadth(ic_output_file))
+
+	if state is not None:
+		with profiler.stage('save_state'):
+			state.save(state_dir)
 
 	return context
 
+def write_reports(context, output_dir='.', report_tables='inline', assets=None, report_format='legacy', profiler=NULL_PROFILER):
+    output_prefix = os.path.join(output_dir, context['assembly_name'])
+
+    # Save HTML using full context, or only the summary with the detail
+    # tables embedded compressed / written next to it (see report.py).
+    # assets come from plots.write_report_assets for offline reports.
+    assets = assets or plots.CDN_ASSETS
+    with profiler.stage('html_report'):
+        page = context if report_tables == 'inline' else report.summary_context(context, report_tables, output_prefix)
+        html = render_template("html_output_template.html", **page, assets=assets,
+                               plot_core_html=plots.figure_html(context['plot_core'], 'core-plot', assets),
+                               plot_periph_html=plots.figure_html(context['plot_periph'], 'periph-plot', assets))
+        with open(output_prefix + "_report.html", "w", encoding="utf-8") as f:
+            f.write(html)
+
+    # Save the report data (page-only fields removed) in the versioned schema,
+    # with the stages profiled so far (--profile)
+    data = report.report_data(context)
+    if profiler.enabled:
+        data['profile'] = profiler.summary()
+    with profiler.stage('report_data'):
+        data_file = report.write_report_data(data, output_prefix, report_format)
+
+    print(f"Saved {output_prefix}_report.html and {data_file}")
+    if profiler.enabled:
+        trace_file = profiler.write_chrome_trace(output_prefix + "_profile.trace.json")
+        print(f"Saved profile trace {trace_file}")
+
+#### BATCH MODE ####
+SUMMARY_FIELDS = [
+    'assembly_name', 'annotation_file', 'status',
+    'essential_percentage', 'metacyc_complete_percentage', 'complete_has_part_percentage', 'complex_coherence',
+    'metacyc_completed', 'metacyc_annotated', 'satisfiable', 'taxon_id', 'consistency_percentage', 'violated_constraints',
+    'ic_depth', 'ic_breadth', 'normalized_ic_breadth',
+    'error']
+
+# Set in the parent before the pool starts so forked workers share the
+# parsed ontology and constraint structures copy-on-write.
+_batch_resources = None
+
+def read_manifest(manifest_file, annotation_dir=None):
+    """
+    Reads a batch manifest: one assembly per line, optionally followed by a
+    TAB and its annotation file and another TAB and its NCBI taxon ID.
+    Assemblies without an annotation file are looked up as
+    {annotation_dir}/{assembly_name}.tsv. Blank lines and lines starting
+    with '#' are ignored.
+
+    Returns:
+    - list: (assembly_name, annotation_file, taxon_id or None) tuples
+    """
+    entries = []
+    with open(manifest_file, 'r') as f:
+        for row in csv.reader(f, delimiter='\t'):
+            if not row or not row[0].strip() or row[0].startswith('#'):
+                continue
+            assembly_name = row[0].strip()
+            if len(row) > 1 and row[1].strip():
+                annotation_file = row[1].strip()
+            else:
+                annotation_file = os.path.join(annotation_dir or '.', assembly_name + '.tsv')
+            taxon_id = row[2].strip() if len(row) > 2 and row[2].strip() else None
+            entries.append((assembly_name, annotation_file, taxon_id))
+    return entries
+
+def _load_shared_resources(output_dir, profile, cache_dir, ic_reference_file, taxonomy):
+    """
+    Loads the resources shared by the genomes of a batch or a service. With
+    profile, the load is written to {output_dir}/resources_profile.trace.json,
+    since it belongs to no genome's profile.
+    """
+    profiler = Profiler() if profile else NULL_PROFILER
+    with profiler.stage('load_resources'):
+        resources = load_resources(cache_dir, ic_reference_file, taxonomy)
+    if profiler.enabled:
+        trace_file = profiler.write_chrome_trace(os.path.join(output_dir, "resources_profile.trace.json"))
+        print(f"Saved profile trace {trace_file}")
+    return resources
+
+def _init_batch_worker(cache_dir, ic_reference_file, taxonomy):
+    global _batch_resources
+    if _batch_resources is None:
+        # Spawned (not forked) worker: warm-start from the binary cache
+        _batch_resources = load_resources(cache_dir, ic_reference_file, taxonomy)
+
+def _evaluate_batch_entry(assembly_name, annotation_file, taxon_id, output_dir, persistent_jvm, report_options, eval_options,
+                          profile=False):
+    summary = {'assembly_name': assembly_name, 'annotation_file': annotation_file, 'taxon_id': taxon_id}
+    profiler = Profiler() if profile else NULL_PROFILER
+    # Each pool process keeps one Groovy worker alive across its genomes
+    jvm = jvm_worker.shared_worker() if eval_options.get('groovy_flag') and persistent_jvm else None
+    try:
+        with app.app_context():
+            context = evaluation(assembly_name, annotation_file, resources=_batch_resources,
+                                 output_dir=output_dir, jvm=jvm, taxon_id=taxon_id, profiler=profiler, **eval_options)
+            write_reports(context, output_dir, profiler=profiler, **report_options)
+    except Exception as e:
+        summary.update(status='failed', error=f"{type(e).__name__}: {e}")
+        return summary
+    summary['status'] = 'ok'
+    summary.update({k: context[k] for k in SUMMARY_FIELDS if k in context})
+    return summary
+
+def run_batch(manifest_file, annotation_dir=None, output_dir='.', workers=None, cache_dir=None,
+              ic_reference_file=None, persistent_jvm=True, taxonomy=taxonomy_file, report_tables='inline',
+              report_assets='cdn', report_format='legacy', profile=False, **eval_options):
+    """
+    Evaluates every assembly in a manifest in one process pool.
+
+    The ontology and constraint files are loaded once in the parent; each
+    genome still gets its own reports, and one row per genome is written to
+    {output_dir}/batch_summary.tsv. eval_options are passed to evaluation().
+    With report_assets='shared', plotly.js and the other report assets are
+    written once to {output_dir}/report_assets/ for all reports. With
+    profile, every genome is profiled on its own (see profiling.py) and the
+    shared resource load in resources_profile.trace.json.
+    """
+    global _batch_resources
+    entries = read_manifest(manifest_file, annotation_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    _batch_resources = _load_shared_resources(output_dir, profile, cache_dir, ic_reference_file, taxonomy)
+    report_options = {'report_tables': report_tables, 'report_format': report_format,
+                      'assets': plots.write_report_assets(output_dir) if report_assets == 'shared' else None}
+
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(entries), 1)), mp_context=ctx,
+                             initializer=_init_batch_worker, initargs=(cache_dir, ic_reference_file, taxonomy)) as pool:
+        futures = [pool.submit(_evaluate_batch_entry, name, path, taxon_id, output_dir, persistent_jvm, report_options, eval_options, profile)
+                   for name, path, taxon_id in entries]
+        summaries = [future.result() for future in futures]
+
+    summary_file = os.path.join(output_dir, "batch_summary.tsv")
+    with open(summary_file, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, delimiter='\t', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(summaries)
+    failed = sum(1 for row in summaries if row['status'] != 'ok')
+    print(f"Evaluated {len(summaries) - failed}/{len(summaries)} assemblies; summary saved to {summary_file}")
+    return summaries
+
+#### SERVICE MODE ####
+# Upload suffixes kept on the stored annotation file (see annotations.open_annotation_file)
+UPLOAD_SUFFIXES = ('.gz', '.zst')
+# Report data file of each --report_format
+REPORT_DATA_SUFFIXES = {'json': '_report.json', 'json.gz': '_report.json.gz', 'msgpack': '_report.msgpack', 'legacy': '_report.json'}
+# Longest ?wait a request may block for a result, in seconds
+MAX_WAIT_S = 60
+# Evaluation keys: the SHA-256 hex digest of the submission
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+# Set by run_service
+_service = None
+
+class EvaluationService(object):
+    """
+    Evaluations submitted over HTTP (--serve), run on a process pool that
+    shares the resources loaded at startup.
+
+    A submission is keyed by the SHA-256 of the uploaded annotation file
+    (with the taxon ID and assembly name, when given) and evaluated into
+    {output_dir}/{key}/. Finished evaluations leave a result.json there, so
+    resubmitting the same file returns the stored reports immediately, also
+    after a restart; failed evaluations are retried on resubmission.
+    """
+
+    def __init__(self, output_dir, pool, report_options, eval_options, profile=False):
+        self.output_dir = output_dir
+        self.pool = pool
+        self.report_options = report_options
+        self.eval_options = eval_options
+        self.profile = profile
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, upload, assembly_name=None, taxon_id=None):
+        """Stores an uploaded annotation file and queues its evaluation, unless it was already submitted."""
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(prefix='.upload', dir=self.output_dir)
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: upload.stream.read(1 << 20), b''):
+                h.update(chunk)
+                f.write(chunk)
+        h.update(f"\0{taxon_id or ''}\0{assembly_name or ''}".encode('utf-8'))
+        key = h.hexdigest()
+        with self.lock:
+            job = self._job(key)
+            if job is not None and job['status'] != 'failed':
+                os.remove(tmp)
+                return job
+            job_dir = os.path.join(self.output_dir, key)
+            os.makedirs(job_dir, exist_ok=True)
+            suffix = next((s for s in UPLOAD_SUFFIXES if (upload.filename or '').endswith(s)), '')
+            annotation_file = os.path.join(job_dir, 'annotations.tsv' + suffix)
+            os.replace(tmp, annotation_file)
+            job = {'id': key, 'assembly_name': assembly_name or f"assembly_{key[:12]}", 'status': 'queued',
+                   'done': threading.Event()}
+            self.jobs[key] = job
+            future = self.pool.submit(_evaluate_batch_entry, job['assembly_name'], annotation_file, taxon_id, job_dir,
+                                      True, self.report_options, self.eval_options, self.profile)
+        # Outside the lock: the callback runs right here if the future is already done
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return job
+
+    def _finish(self, key, future):
+        # Runs on the executor's callback thread, concurrently with requests
+        try:
+            summary = future.result()
+        except Exception as e:
+            summary = {'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+        with self.lock:
+            job = self.jobs[key]
+            if summary['status'] == 'ok':
+                job['summary'] = {k: summary[k] for k in SUMMARY_FIELDS if k in summary and k != 'annotation_file'}
+                with open(os.path.join(self.output_dir, key, 'result.json'), 'w') as f:
+                    json.dump({'assembly_name': job['assembly_name'], 'summary': job['summary']}, f)
+                job['status'] = 'done'
+            else:
+                job['error'] = summary.get('error')
+                job['status'] = 'failed'
+        job['done'].set()
+
+    @staticmethod
+    def valid_key(key):
+        """Whether key has the form of an evaluation key, so it is safe to use as a directory name."""
+        return KEY_PATTERN.fullmatch(key) is not None
+
+    def _job(self, key):
+        job = self.jobs.get(key)
+        if job is None:
+            result_file = os.path.join(self.output_dir, key, 'result.json')
+            if not os.path.exists(result_file):
+                return None
+            with open(result_file) as f:
+                result = json.load(f)
+            job = self.jobs[key] = {'id': key, 'assembly_name': result['assembly_name'], 'status': 'done',
+                                    'summary': result['summary'], 'done': threading.Event()}
+            job['done'].set()
+        return job
+
+    def job(self, key, wait=0):
+        """The job of a key (None if unknown), after waiting up to wait seconds for it to finish."""
+        if not self.valid_key(key):
+            return None
+        with self.lock:
+            job = self._job(key)
+        if job is not None and wait > 0:
+            job['done'].wait(min(wait, MAX_WAIT_S))
+        return job
+
+    def report_files(self, job):
+        """File names of a finished job that may be served: its reports, never its uploaded input."""
+        name = job['assembly_name']
+        files = {name + '_report.html', name + REPORT_DATA_SUFFIXES[self.report_options['report_format']]}
+        if self.report_options['report_tables'] == 'files':
+            files.update(f"{name}_report_{table}.json" for table in report.REPORT_TABLE_NAMES)
+        if self.profile:
+            files.add(name + '_profile.trace.json')
+        return files
+
+    def asset_files(self):
+        """File names of the shared report assets, relative to report_assets/."""
+        return {os.path.basename(path) for path in self.report_options['assets'].values()}
+
+    def describe(self, job):
+        """JSON view of a job, with the URLs of its reports once done."""
+        view = {k: job[k] for k in ('id', 'assembly_name', 'status', 'summary', 'error') if k in job}
+        if job['status'] == 'done':
+            name = job['assembly_name']
+            data_suffix = REPORT_DATA_SUFFIXES[self.report_options['report_format']]
+            view['report_html'] = url_for('evaluation_file', key=job['id'], filename=name + '_report.html')
+            view['report_data'] = url_for('evaluation_file', key=job['id'], filename=name + data_suffix)
+        return view
+
+def _status_code(job):
+    # 202 while queued, 500 once failed (the error is in the body)
+    return {'queued': 202, 'failed': 500}.get(job['status'], 200)
+
+def _wait_arg():
+    try:
+        return float(request.values.get('wait', 0))
+    except ValueError:
+        abort(400, 'wait must be a number of seconds')
+
+@app.route('/')
+def service_status():
+    if _service is None:
+        abort(503, 'Not running as a service (main.py --serve)')
+    with _service.lock:
+        statuses = [job['status'] for job in _service.jobs.values()]
+    return jsonify({'status': 'ok', 'jobs': {s: statuses.count(s) for s in ('queued', 'done', 'failed')}})
+
+@app.route('/evaluations', methods=['POST'])
+def submit_evaluation():
+    """
+    Evaluates the uploaded annotation_file (form fields assembly_name and
+    taxon_id are optional). Answers 200 with the reports when the file was
+    evaluated before, or finishes within ?wait seconds; 202 while queued
+    and 500 when the evaluation failed.
+    """
+    if _service is None:
+        abort(503, 'Not running as a service (main.py --serve)')
+    upload = request.files.get('annotation_file')
+    if upload is None:
+        abort(400, 'No annotation_file uploaded')
+    job = _service.submit(upload, request.form.get('assembly_name') or None, request.form.get('taxon_id') or None)
+    job = _service.job(job['id'], _wait_arg())
+    return jsonify(_service.describe(job)), _status_code(job)
+
+@app.route('/evaluations/<key>')
+def evaluation_status(key):
+    """Status of an evaluation; ?wait blocks up to that many seconds for it to finish."""
+    if _service is None:
+        abort(503, 'Not running as a service (main.py --serve)')
+    if not _service.valid_key(key):
+        abort(404, 'Unknown evaluation')
+    job = _service.job(key, _wait_arg())
+    if job is None:
+        abort(404, f"Unknown evaluation {key}")
+    return jsonify(_service.describe(job)), _status_code(job)
+
+@app.route('/evaluations/<key>/<path:filename>')
+def evaluation_file(key, filename):
+    """Report files of a finished evaluation and the shared report assets; nothing else is served."""
+    if _service is None:
+        abort(503, 'Not running as a service (main.py --serve)')
+    if key == plots.REPORT_ASSETS_DIR:
+        allowed = _service.asset_files()
+    elif not _service.valid_key(key):
+        abort(404, 'Unknown evaluation')
+    else:
+        job = _service.job(key)
+        if job is None or job['status'] != 'done':
+            abort(404, f"No finished evaluation {key}")
+        allowed = _service.report_files(job)
+    if filename not in allowed:
+        abort(404, f"No report file {filename}")
+    return send_from_directory(os.path.abspath(os.path.join(_service.output_dir, key)), filename)
+
+def run_service(host='127.0.0.1', port=5000, output_dir='.', workers=None, cache_dir=None, ic_reference_file=None,
+                taxonomy=taxonomy_file, report_tables='inline', report_format='legacy', profile=False, **eval_options):
+    """
+    Serves evaluations over HTTP with the Flask app (see EvaluationService).
+
+    The ontology and constraint indices are loaded once, then the worker
+    processes are forked before the server starts, so every evaluation
+    starts from the loaded resources. Reports share the plotly.js and
+    stylesheet written to {output_dir}/report_assets/.
+    """
+    global _batch_resources, _service
+    os.makedirs(output_dir, exist_ok=True)
+    _batch_resources = _load_shared_resources(output_dir, profile, cache_dir, ic_reference_file, taxonomy)
+    assets = {k: '../' + v for k, v in plots.write_report_assets(output_dir).items()}
+    report_options = {'report_tables': report_tables, 'report_format': report_format, 'assets': assets}
+
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_batch_worker,
+                             initargs=(cache_dir, ic_reference_file, taxonomy)) as pool:
+        # Start every worker now, while the process has no server threads
+        for future in [pool.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+        _service = EvaluationService(output_dir, pool, report_options, eval_options, profile)
+        print(f"Serving evaluations on http://{host}:{port}/ with {workers} workers; results in {output_dir}")
+        app.run(host=host, port=port, threaded=True)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Evaluate GO annotation completeness/coherence/consistency.')
-    parser.add_argument('--assembly_name', required=True, help='Assembly name (e.g., GCF_000007085.1_ASM708v1)')
-    parser.add_argument('--annotation_file', required=True, help='Path to tab-separated GO annotation file (protein_id	GO:term1	GO:term2)')
-    parser.add_argument('--groovy', action='store_true', help='Run Groovy scripts for IC calculation and taxonomic consistency')
+    parser.add_argument('--assembly_name', help='Assembly name (e.g., GCF_000007085.1_ASM708v1)')
+    parser.add_argument('--annotation_file', help='Path to tab-separated GO annotation file (protein_id	GO:term1	GO:term2)')
+    parser.add_argument('--groovy', action='store_true', help='Run Groovy scripts for IC calculation (ICVector.groovy) and taxonomic consistency (taxon_consistency.groovy)')
+    parser.add_argument('--native_ic', action='store_true', help='Calculate IC natively instead of with ICVector.groovy; the values differ from slib\'s (see the README)')
+    parser.add_argument('--ic_reference', default=None, help='Reference-corpus IC table (python information_content.py reference) used instead of per-genome IC; implies --native_ic')
+    parser.add_argument('--no_jvm_worker', action='store_true', help='Run each Groovy script as a one-shot process instead of a persistent worker')
+    parser.add_argument('--cache_dir', default=None, help=f'Directory for parsed ontology/constraint caches (default: {cache.CACHE_DIR})')
+    parser.add_argument('--no_cache', action='store_true', help='Parse ontology and constraint files without the binary cache')
+    parser.add_argument('--batch', metavar='MANIFEST', help='Evaluate every assembly listed in MANIFEST (assembly_name[TAB annotation_file[TAB taxon_id]] per line)')
+    parser.add_argument('--annotation_dir', default=None, help='Batch mode: directory holding {assembly_name}.tsv for manifest rows without an annotation file')
+    parser.add_argument('--taxon_id', default=None, help='NCBI taxon ID of the assembly (e.g. 562 or NCBITaxon:562); scores its taxon constraints')
+    parser.add_argument('--taxonomy', default=taxonomy_file, help=f'NCBI taxdump nodes.dmp used with --taxon_id (default: {taxonomy_file})')
+    parser.add_argument('--output_dir', default='.', help='Directory for the output files')
+    parser.add_argument('--incremental', action='store_true', help='Keep per-protein state in {output_dir}/{assembly_name}_state and, on later runs, only recompute what the changed proteins affect')
+    parser.add_argument('--report_tables', choices=report.REPORT_TABLE_MODES, default='inline', help='Detail tables of the HTML report: rendered inline, embedded as compressed JSON, or written to JSON side files; the last two are paged in the browser')
+    parser.add_argument('--report_assets', choices=['cdn', 'shared'], default='cdn', help='Load plotly.js from the CDN, or write it and the other report assets once to {output_dir}/report_assets/ so reports render offline')
+    parser.add_argument('--report_format', choices=report.REPORT_FORMATS, default='legacy', help='Machine-readable report: the indented JSON dump read by existing consumers, or the compact versioned schema as JSON, gzip-compressed JSON or msgpack (needs msgpack); see the README before switching')
+    parser.add_argument('--profile', action='store_true', help='Record wall time, CPU time, peak RSS and item counts per stage into the JSON report and {output_dir}/{assembly_name}_profile.trace.json (Chrome trace format)')
+    parser.add_argument('--workers', type=int, default=None, help='Batch and service mode: number of worker processes (default: CPU count)')
+    parser.add_argument('--serve', action='store_true', help='Run as an HTTP service: load the resources once and evaluate uploaded annotation files on a worker pool, with results in --output_dir')
+    parser.add_argument('--host', default='127.0.0.1', help='Service mode: address to listen on')
+    parser.add_argument('--port', type=int, default=5000, help='Service mode: port to listen on')
 
     args = parser.parse_args()
-    
-    with app.app_context():
-        context = evaluation(args.assembly_name, args.annotation_file, args.groovy)
-
-        # Save HTML using full context
-        html = render_template("html_output_template.html", **context)
-        with open(args.assembly_name + "_report.html", "w", encoding="utf-8") as f:
-            f.write(html)
-
-        # Save JSON with selected fields removed
-        json_context = context.copy()
-        json_context.pop("plot_core_html", None)
-        json_context.pop("plot_periph_html", None)
-        json_context.pop("gauge_html", None)
-        json_context.pop("ec2go_mapping", None)
-        json_context.pop("term_names", None)
+    cache_dir = False if args.no_cache else args.cache_dir
 
-        with open(args.assembly_name + "_report.json", "w") as f:
-            json.dump(json_context, f, indent=2, default=str)
+    eval_options = {'groovy_flag': args.groovy, 'native_ic': args.native_ic, 'incremental': args.incremental}
 
-        print(f"Saved {args.assembly_name}_report.html and {args.assembly_name}_report.json")
-        
+    if args.serve:
+        run_service(args.host, args.port, args.output_dir, args.workers, cache_dir, args.ic_reference, args.taxonomy,
+                    args.report_tables, args.report_format, args.profile, groovy_flag=args.groovy, native_ic=args.native_ic)
+    elif args.batch:
+        run_batch(args.batch, args.annotation_dir, args.output_dir, args.workers, cache_dir,
+                  args.ic_reference, not args.no_jvm_worker, args.taxonomy, args.report_tables, args.report_assets, args.report_format, args.profile, **eval_options)
+    else:
+        if not (args.assembly_name and args.annotation_file):
+            parser.error('--assembly_name and --annotation_file are required unless --batch is given')
+        os.makedirs(args.output_dir, exist_ok=True)
+        jvm = jvm_worker.GroovyWorker() if args.groovy and not args.no_jvm_worker else None
+        profiler = Profiler() if args.profile else NULL_PROFILER
+        with app.app_context():
+            with profiler.stage('load_resources'):
+                resources = load_resources(cache_dir, args.ic_reference, args.taxonomy)
+            context = evaluation(args.assembly_name, args.annotation_file, resources=resources,
+                                 output_dir=args.output_dir, jvm=jvm, taxon_id=args.taxon_id, profiler=profiler, **eval_options)
+            assets = plots.write_report_assets(args.output_dir) if args.report_assets == 'shared' else None
+            write_reports(context, args.output_dir, args.report_tables, assets, args.report_format, profiler)
+        if jvm is not None:
+            jvm.close()
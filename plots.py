@@ -1,12 +1,70 @@
+import os
 import re
+import tempfile
+import numpy as np
+import plotly
+import plotly.io as pio
+import plotly.express as px
 import plotly.graph_objects as graph_obj
+from plotly.io.json import to_json_plotly
 from jinja2 import Template
 
-def create_completeness_gauge_html(complete_percentages):
-    categories = ['Essential Term Completeness', 'Pathway Coherence', 'Process Coherence', 'Protein Complex Coherence']
-    completeness_data = dict(zip(categories, complete_percentages))
+PLOTLY_JS_VERSION = plotly.offline.get_plotlyjs_version()
+STYLESHEET = "static/css/styles.css"
+REPORT_ASSETS_DIR = "report_assets"
+
+# Assets of a report that loads plotly.js and the icon font from their CDNs
+# and the stylesheet from the repository's static/ directory
+CDN_ASSETS = {
+    'plotly_js': f"https://cdn.plot.ly/plotly-{PLOTLY_JS_VERSION}.min.js",
+    'stylesheet': STYLESHEET,
+    'icons': "https://fonts.googleapis.com/css2?family=Material+Symbols+Outlined",
+}
+
+# Stand-in for the Material Symbols font in shared (offline) assets: the
+# ligature text of each icon span is hidden and a Unicode glyph is drawn
+# from its data-icon attribute instead.
+ICON_GLYPHS = {
+    'dashboard': '\\25A6',
+    'genetics': '\\2695',
+    'route': '\\21C4',
+    'my_location': '\\25CE',
+    'arrow_right': '\\25B8',
+    'check_circle': '\\2714',
+    'cancel': '\\2716',
+    'help': '?',
+}
+
+ICONS_CSS = Template(""".material-symbols-outlined {
+    font-size: 0;
+    display: inline-block;
+}
+
+.material-symbols-outlined::before {
+    font-size: 20px;
+    line-height: 1;
+}
+{% for name, glyph in glyphs.items() %}
+.material-symbols-outlined[data-icon="{{ name }}"]::before { content: "{{ glyph }}"; }
+{%- endfor %}
+""")
 
-    html_template = Template("""
+# Shared by all reports of an output directory (see write_report_assets):
+# the default plotly template, which figures then no longer embed, and
+# the function that draws a figure with it.
+PLOTS_JS = Template("""const GAEF_PLOT_TEMPLATE = {{ template }};
+
+function gaefPlot(id, figure) {
+    figure.layout.template = GAEF_PLOT_TEMPLATE;
+    Plotly.newPlot(id, figure.data, figure.layout, {responsive: true});
+}
+""")
+
+FIGURE_TEMPLATE = Template("""<div id="{{ div_id }}" class="plotly-graph-div" style="height:100%; width:100%;"></div>
+<script>gaefPlot("{{ div_id }}", {{ figure }});</script>
+""")
+
+GAUGE_TEMPLATE = Template("""
         <div class="gauge-table-container">
             <table class="gauge-table">
                 <thead>
@@ -16,7 +74,7 @@ def create_completeness_gauge_html(complete_percentages):
                     </tr>
                 </thead>
                 <tbody>
-                    {% for category, value in completeness_data.items() %}
+                    {% for category in completeness_data %}
                     <tr>
                         <td>{{ category }}</td>
                         <td>
@@ -30,25 +88,84 @@ def create_completeness_gauge_html(complete_percentages):
 
         <script>
             document.addEventListener("DOMContentLoaded", function() {
-                {% for category, value in completeness_data.items() %}
-                Plotly.newPlot('gauge-{{ loop.index }}', [{
-                    type: 'indicator',
-                    mode: 'gauge+number',
-                    value: {{ value }},
-                    gauge: {
-                        axis: { range: [0, 100] },
-                        bar: { color: {{ "'#4caf50'" if value > 50 else "'#f44336'" }} },
-                        steps: [
-                            { range: [0, 50], color: '#f4f4f4' },
-                            { range: [50, 100], color: '#e0e0e0' }
-                        ]
-                    }
-                }], {
-                    width: 120, height: 120, margin: { t: 0, b: 0, l: 0, r: 0 }
+                {{ completeness_data.values() | list | tojson }}.forEach(function(value, i) {
+                    Plotly.newPlot('gauge-' + (i + 1), [{
+                        type: 'indicator',
+                        mode: 'gauge+number',
+                        value: value,
+                        gauge: {
+                            axis: { range: [0, 100] },
+                            bar: { color: value > 50 ? '#4caf50' : '#f44336' },
+                            steps: [
+                                { range: [0, 50], color: '#f4f4f4' },
+                                { range: [50, 100], color: '#e0e0e0' }
+                            ]
+                        }
+                    }], {
+                        width: 120, height: 120, margin: { t: 0, b: 0, l: 0, r: 0 }
+                    });
                 });
-                {% endfor %}
             });
         </script>
     """)
 
-    return html_template.render(completeness_data=completeness_data)
+
+def create_completeness_gauge_html(complete_percentages):
+    categories = ['Essential Term Completeness', 'Pathway Coherence', 'Process Coherence', 'Protein Complex Coherence', 'Taxonomic Consistency']
+    completeness_data = {c: float(v) for c, v in zip(categories, complete_percentages)}
+    return GAUGE_TEMPLATE.render(completeness_data=completeness_data)
+
+
+def presence_bar(labels, values, label):
+    """Bar chart of the presence (0/1) of each essential function."""
+    return px.bar(x=labels, y=np.asarray(values, dtype=np.int8), labels={'x': label, 'y': 'Presence'})
+
+
+def figure_html(fig, div_id, assets=CDN_ASSETS):
+    """
+    HTML of a figure for the report. With shared assets the figure is
+    embedded without its plotly template and with numeric arrays as base64
+    typed arrays, and drawn by gaefPlot from the shared plots.js.
+    """
+    if 'plots_js' not in assets:
+        return fig.to_html(full_html=False, include_plotlyjs=False, div_id=div_id)
+    spec = fig.to_plotly_json()
+    spec['layout'].pop('template', None)
+    return FIGURE_TEMPLATE.render(div_id=div_id, figure=to_json_plotly(spec))
+
+
+def _write_atomic(path, text):
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def write_report_assets(output_dir):
+    """
+    Writes the files shared by every report in output_dir to
+    {output_dir}/report_assets/, so that the reports render without network
+    access: the plotly.js bundled with the installed plotly package (written
+    once per version), the stylesheet, plots.js and icons.css, which draws
+    the sidebar and status icons without the web icon font.
+
+    Returns:
+    - dict: asset paths relative to output_dir, for the report template
+    """
+    assets_dir = os.path.join(output_dir, REPORT_ASSETS_DIR)
+    os.makedirs(assets_dir, exist_ok=True)
+    plotly_js = f"plotly-{PLOTLY_JS_VERSION}.min.js"
+    if not os.path.exists(os.path.join(assets_dir, plotly_js)):
+        _write_atomic(os.path.join(assets_dir, plotly_js), plotly.offline.get_plotlyjs())
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), STYLESHEET), encoding='utf-8') as f:
+        _write_atomic(os.path.join(assets_dir, "styles.css"), f.read())
+    template = to_json_plotly(pio.templates[pio.templates.default].to_plotly_json())
+    _write_atomic(os.path.join(assets_dir, "plots.js"), PLOTS_JS.render(template=template))
+    _write_atomic(os.path.join(assets_dir, "icons.css"), ICONS_CSS.render(glyphs=ICON_GLYPHS))
+    return {
+        'plotly_js': f"{REPORT_ASSETS_DIR}/{plotly_js}",
+        'stylesheet': f"{REPORT_ASSETS_DIR}/styles.css",
+        'plots_js': f"{REPORT_ASSETS_DIR}/plots.js",
+        'icons': f"{REPORT_ASSETS_DIR}/icons.css",
+    }
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _Stage(object):
+    def __init__(self, profiler, name, counts):
+        self.profiler = profiler
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.depth = self.profiler._depth
+        self.profiler._depth += 1
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.child_cpu = _children_cpu()
+        return self.counts
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter()
+        self.profiler._depth -= 1
+        self.profiler.stages.append({
+            'stage': self.name,
+            'depth': self.depth,
+            'start_s': self.wall - self.profiler.start,
+            'wall_s': wall - self.wall,
+            # CPU of this process plus that of finished subprocesses (Groovy)
+            'cpu_s': (time.process_time() - self.cpu) + (_children_cpu() - self.child_cpu),
+            'peak_rss_mb': _peak_rss_mb(),
+            'counts': self.counts,
+        })
+        return False
+
+
+class Profiler(object):
+    """
+    Per-stage instrumentation of one evaluation (--profile).
+
+    `with profiler.stage(name) as counts:` records the wall time, CPU time
+    (including finished subprocesses) and the process's peak RSS at the end
+    of the stage; item counts are added to the yielded dict. Stages may
+    nest. The result goes into the JSON report (summary) and a Chrome trace
+    (write_chrome_trace, viewable in chrome://tracing or Perfetto).
+    """
+    enabled = True
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+        self._depth = 0
+
+    def stage(self, name, **counts):
+        return _Stage(self, name, counts)
+
+    def summary(self):
+        """Stages in start order, with times rounded to microseconds."""
+        rows = []
+        for s in sorted(self.stages, key=lambda s: s['start_s']):
+            row = dict(s)
+            for key in ('start_s', 'wall_s', 'cpu_s'):
+                row[key] = round(row[key], 6)
+            if row['peak_rss_mb'] is not None:
+                row['peak_rss_mb'] = round(row['peak_rss_mb'], 1)
+            rows.append(row)
+        return rows
+
+    def write_chrome_trace(self, output_file):
+        """Writes the stages as complete ('X') events of the Chrome trace format."""
+        pid, tid = os.getpid(), threading.get_ident()
+        events = []
+        for s in self.summary():
+            args = dict(s['counts'], cpu_ms=round(s['cpu_s'] * 1000, 3), peak_rss_mb=s['peak_rss_mb'])
+            events.append({'name': s['stage'], 'cat': 'gaef', 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round(s['start_s'] * 1e6, 1), 'dur': round(s['wall_s'] * 1e6, 1), 'args': args})
+        with open(output_file, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return output_file
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler(object):
+    """Stand-in used when profiling is off: stages cost one method call."""
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name, **counts):
+        return self._stage
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,250 @@
+import os
+import re
+import gzip
+import json
+import base64
+
+# Context entries that --report_tables embedded/files moves out of the HTML
+DETAIL_KEYS = ('pathway_details', 'has_part_data', 'complex_classifications', 'consistency_violations',
+               'ec2go_mapping', 'term_names')
+REPORT_TABLE_MODES = ('inline', 'embedded', 'files')
+# Detail tables of report_tables
+REPORT_TABLE_NAMES = ('pathways', 'has_part', 'complexes', 'violations')
+
+
+def report_tables(context):
+    """
+    Detail tables of a report context as compact, row-oriented JSON-ready
+    dicts, read by templates/lazy_tables.js:
+
+    - pathways: [pathway, GO term, complete (0/1), [missing reaction slots,
+      each a list of alternative EC numbers]] rows plus ec_go, {EC number:
+      associated GO terms} for those ECs
+    - has_part: [annotated term, missing parts, [proteins]] rows, one per
+      term rather than one per protein
+    - complexes: [GO term, name, status] rows
+    - violations: [GO term, constraint, taxon, proteins] rows, when the
+      genome was scored against a taxon
+    """
+    ec2go = context['ec2go_mapping']
+    pathways, ec_go = [], {}
+    for pathway, details in context['pathway_details'].items():
+        for ec in (ec for slot in details['missing_components'] for ec in slot):
+            ec_go[ec] = ', '.join(ec2go.get(ec, ['Unknown']))
+        pathways.append([pathway, details['original_go_term'], int(details['complete']), details['missing_components']])
+
+    has_part = {}
+    for entry in context['has_part_data']:
+        key = (entry['annotated_term'], ', '.join(entry['missing_parts']))
+        has_part.setdefault(key, []).append(entry['protein_id'])
+
+    term_names = context['term_names']
+    tables = {
+        'pathways': {'rows': pathways, 'ec_go': ec_go},
+        'has_part': {'rows': [[term, missing, proteins] for (term, missing), proteins in has_part.items()]},
+        'complexes': {'rows': [[t, term_names[t], status] for t, status in context['complex_classifications'].items()]},
+    }
+    if 'consistency_violations' in context:
+        tables['violations'] = {'rows': [[v['GO_ID'], v['constraint'], v['taxon'], v['proteins']]
+                                         for v in context['consistency_violations']]}
+    return tables
+
+
+def _dumps(table):
+    return json.dumps(table, separators=(',', ':'))
+
+
+def embed_tables(tables):
+    """{name: base64 gzip-compressed JSON} for embedding in the HTML page."""
+    return {name: base64.b64encode(gzip.compress(_dumps(table).encode('utf-8'), mtime=0)).decode('ascii')
+            for name, table in tables.items()}
+
+
+def write_table_files(tables, output_prefix):
+    """
+    Writes each table to {output_prefix}_report_{name}.json and returns
+    {name: file name}, relative to the report so the page can fetch it.
+    """
+    sources = {}
+    for name, table in tables.items():
+        path = f"{output_prefix}_report_{name}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_dumps(table))
+        sources[name] = os.path.basename(path)
+    return sources
+
+
+def summary_context(context, mode, output_prefix):
+    """
+    Template context for a report whose detail tables are loaded by the
+    page on demand (mode 'embedded' or 'files') instead of rendered inline.
+    """
+    tables = report_tables(context)
+    sources = embed_tables(tables) if mode == 'embedded' else write_table_files(tables, output_prefix)
+    summary = {k: v for k, v in context.items() if k not in DETAIL_KEYS}
+    summary['lazy_tables'] = {'mode': mode, 'tables': sources}
+    return summary
+
+
+#### REPORT DATA ####
+REPORT_SCHEMA = 'gaef-report'
+REPORT_SCHEMA_VERSION = 1
+REPORT_FORMATS = ('legacy', 'json', 'json.gz', 'msgpack')
+
+# Context entries that only serve the HTML page
+PAGE_KEYS = ('plot_core', 'plot_periph', 'gauge_html', 'ec2go_mapping', 'term_names')
+
+# Report entries with a dedicated encoding; everything else is a scalar
+# metric stored as is under 'metrics'
+STRUCTURED_KEYS = ('go_categories_core', 'go_categories_periph', 'found_terms', 'has_part_data',
+                   'complex_classifications', 'pathway_details', 'consistency_violations', 'profile')
+
+
+class _Interner(object):
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def __call__(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def report_data(context):
+    """The report entries of an evaluation context (what _report.json holds)."""
+    return {k: v for k, v in context.items() if k not in PAGE_KEYS}
+
+
+def encode_report(data):
+    """
+    Compact, schema-versioned form of the report data.
+
+    Term IDs (GO terms, EC numbers, taxa and constraint types) and protein
+    IDs are interned into the 'terms' and 'proteins' tables and referenced by index. Sets are
+    stored as sorted arrays, and has_part rows are grouped by consecutive
+    runs of one annotated term; --profile stages are stored as is.
+    decode_report restores the original entries, including the order of the rows.
+    """
+    term = _Interner()
+    protein = _Interner()
+
+    essential = {}
+    for key in ('go_categories_core', 'go_categories_periph'):
+        essential[key] = {category: [[term(e['term']), e['Function']] for e in entries]
+                          for category, entries in data[key].items()}
+
+    has_part = []
+    for entry in data['has_part_data']:
+        annotated, missing = term(entry['annotated_term']), [term(t) for t in entry['missing_parts']]
+        if has_part and has_part[-1][0] == annotated and has_part[-1][1] == missing:
+            has_part[-1][2].append(protein(entry['protein_id']))
+        else:
+            has_part.append([annotated, missing, [protein(entry['protein_id'])]])
+
+    encoded = {
+        'schema': REPORT_SCHEMA,
+        'version': REPORT_SCHEMA_VERSION,
+        'metrics': {k: v for k, v in data.items() if k not in STRUCTURED_KEYS},
+        'essential_terms': essential,
+        'found_terms': sorted(term(t) for t in sorted(data['found_terms'])),
+        'has_part': has_part,
+        'complexes': [[term(t), status == 'coherent'] for t, status in data['complex_classifications'].items()],
+        'pathways': [[pathway, term(d['original_go_term']), d['complete'],
+                      [[term(t) for t in component] for component in d['missing_components']]]
+                     for pathway, d in data['pathway_details'].items()],
+    }
+    if 'consistency_violations' in data:
+        encoded['violations'] = [[term(v['GO_ID']), term(v['constraint']), term(v['taxon']), v['proteins']]
+                                 for v in data['consistency_violations']]
+    if 'profile' in data:
+        encoded['profile'] = data['profile']
+    encoded['terms'] = term.values
+    encoded['proteins'] = protein.values
+    return encoded
+
+
+def decode_report(encoded):
+    """Report data from encode_report output (see encode_report)."""
+    if encoded.get('schema') != REPORT_SCHEMA:
+        raise ValueError("Not a GAEF report")
+    if encoded['version'] > REPORT_SCHEMA_VERSION:
+        raise ValueError(f"Report schema version {encoded['version']} is newer than this version of GAEF "
+                         f"(up to {REPORT_SCHEMA_VERSION})")
+    terms, proteins = encoded['terms'], encoded['proteins']
+
+    data = dict(encoded['metrics'])
+    for key, categories in encoded['essential_terms'].items():
+        data[key] = {category: [{'term': terms[t], 'category': category, 'Function': function}
+                                for t, function in entries] for category, entries in categories.items()}
+    data['found_terms'] = {terms[t] for t in encoded['found_terms']}
+    data['has_part_data'] = [{'protein_id': proteins[p], 'annotated_term': terms[t], 'missing_parts': [terms[m] for m in missing]}
+                             for t, missing, carriers in encoded['has_part'] for p in carriers]
+    data['complex_classifications'] = {terms[t]: 'coherent' if coherent else 'incoherent'
+                                       for t, coherent in encoded['complexes']}
+    data['pathway_details'] = {pathway: {'complete': complete, 'original_go_term': terms[t],
+                                         'missing_components': [[terms[m] for m in component] for component in missing]}
+                               for pathway, t, complete, missing in encoded['pathways']}
+    if 'violations' in encoded:
+        data['consistency_violations'] = [{'GO_ID': terms[t], 'constraint': terms[c], 'taxon': terms[x], 'proteins': n}
+                                          for t, c, x, n in encoded['violations']]
+    if 'profile' in encoded:
+        data['profile'] = encoded['profile']
+    return data
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("Writing or reading .msgpack reports requires the 'msgpack' package (pip install msgpack)")
+    return msgpack
+
+
+def write_report_data(data, output_prefix, fmt='legacy'):
+    """
+    Writes the report data as {output_prefix}_report.json, by default the
+    indented JSON dump earlier versions wrote, or in the compact schema as
+    _report.json ('json'), _report.json.gz or _report.msgpack (optional
+    msgpack package). Returns the file written.
+    """
+    if fmt == 'legacy':
+        path = output_prefix + "_report.json"
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+        return path
+    encoded = encode_report(data)
+    if fmt == 'msgpack':
+        packed = _msgpack().packb(encoded, use_bin_type=True)
+        path = output_prefix + "_report.msgpack"
+        with open(path, 'wb') as f:
+            f.write(packed)
+    elif fmt == 'json.gz':
+        path = output_prefix + "_report.json.gz"
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(_dumps(encoded))
+    else:
+        path = output_prefix + "_report.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_dumps(encoded))
+    return path
+
+
+def load_report(path):
+    """
+    Reads report data written by write_report_data in any format, including
+    legacy _report.json dumps (whose found_terms is the repr of a set).
+    """
+    if path.endswith('.msgpack'):
+        with open(path, 'rb') as f:
+            encoded = _msgpack().unpackb(f.read(), raw=False, strict_map_key=False)
+    else:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            encoded = json.load(f)
+    if 'schema' in encoded:
+        return decode_report(encoded)
+    encoded['found_terms'] = set(re.findall(r'GO:\d{7}', encoded.get('found_terms', '')))
+    return encoded
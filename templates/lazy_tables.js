@@ -0,0 +1,191 @@
+            // Detail tables of a report written with --report_tables embedded/files.
+            // Each table is decoded (or fetched) the first time it scrolls into
+            // view, and only one page of rows is ever in the DOM.
+            const PAGE_SIZE = 50;
+            const tableData = {};
+
+            function loadTable(name) {
+                const spec = JSON.parse(document.getElementById('report-tables').textContent);
+                if (!tableData[name]) {
+                    const source = spec.tables[name];
+                    let text;
+                    if (spec.mode === 'files') {
+                        text = fetch(source).then(response => {
+                            if (!response.ok) throw new Error(`${source}: ${response.status}`);
+                            return response.text();
+                        });
+                    } else {
+                        // gzip-compressed, base64-encoded JSON
+                        const bytes = Uint8Array.from(atob(source), c => c.charCodeAt(0));
+                        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+                        text = new Response(stream).text();
+                    }
+                    tableData[name] = text.then(JSON.parse);
+                }
+                return tableData[name];
+            }
+
+            function cell(text, className, colSpan) {
+                const td = document.createElement('td');
+                td.textContent = text;
+                if (className) td.className = className;
+                if (colSpan) td.colSpan = colSpan;
+                return td;
+            }
+
+            function row(...cells) {
+                const tr = document.createElement('tr');
+                tr.append(...cells);
+                return tr;
+            }
+
+            class PagedTable {
+                constructor(table, rows, renderRow, emptyText) {
+                    this.tbody = table.querySelector('tbody');
+                    this.columns = table.querySelectorAll('thead th').length;
+                    this.rows = rows;
+                    this.shown = rows;
+                    this.renderRow = renderRow;
+                    this.emptyText = emptyText;
+                    this.page = 0;
+
+                    this.pager = document.createElement('div');
+                    this.pager.className = 'pager';
+                    this.prev = document.createElement('button');
+                    this.prev.textContent = '‹ Previous';
+                    this.next = document.createElement('button');
+                    this.next.textContent = 'Next ›';
+                    this.label = document.createElement('span');
+                    this.pager.append(this.prev, this.label, this.next);
+                    table.after(this.pager);
+                    this.prev.addEventListener('click', () => this.show(this.page - 1));
+                    this.next.addEventListener('click', () => this.show(this.page + 1));
+                }
+
+                filter(predicate) {
+                    this.shown = this.rows.filter(predicate);
+                    this.show(0);
+                }
+
+                show(page) {
+                    const pages = Math.max(1, Math.ceil(this.shown.length / PAGE_SIZE));
+                    this.page = Math.min(Math.max(page, 0), pages - 1);
+                    const start = this.page * PAGE_SIZE;
+                    const rows = this.shown.slice(start, start + PAGE_SIZE).flatMap(this.renderRow);
+                    if (!rows.length && this.emptyText) rows.push(row(cell(this.emptyText, '', this.columns)));
+                    this.tbody.replaceChildren(...rows);
+                    this.label.textContent = ` Page ${this.page + 1} of ${pages} (${this.shown.length} rows) `;
+                    this.prev.disabled = this.page === 0;
+                    this.next.disabled = this.page === pages - 1;
+                }
+            }
+
+            function whenVisible(element, callback) {
+                const observer = new IntersectionObserver(entries => {
+                    if (entries.some(entry => entry.isIntersecting)) {
+                        observer.disconnect();
+                        callback();
+                    }
+                });
+                observer.observe(element);
+            }
+
+            function lazyTable(tableId, name, setup) {
+                const table = document.getElementById(tableId);
+                if (!table) return;
+                whenVisible(table, () => {
+                    const tbody = table.querySelector('tbody');
+                    tbody.replaceChildren(row(cell('Loading…', '', table.querySelectorAll('thead th').length)));
+                    loadTable(name).then(data => setup(table, data)).catch(error => {
+                        tbody.replaceChildren(row(cell(`Could not load ${name}: ${error.message}`, 'missing',
+                            table.querySelectorAll('thead th').length)));
+                    });
+                });
+            }
+
+            function matches(values, term) {
+                return values.some(value => String(value).toLowerCase().includes(term));
+            }
+
+            document.addEventListener('DOMContentLoaded', function () {
+                // Pathways: [pathway, GO term, complete, missing reaction slots (alternative EC numbers)]; ec_go maps EC to GO terms
+                lazyTable('metacyc-table', 'pathways', (table, data) => {
+                    const expanded = new Set();
+                    const search = document.getElementById('pathway-search-input');
+                    const status = document.getElementById('pathway-status-filter');
+                    const paged = new PagedTable(table, data.rows, pathway => {
+                        const [name, term, complete, slots] = pathway;
+                        const toggle = document.createElement('button');
+                        toggle.className = 'toggle-details';
+                        const details = document.createElement('table');
+                        details.className = 'relation-details';
+                        details.innerHTML = '<thead><tr><th>Missing Reaction (any EC Number)</th><th>Associated GO Terms</th></tr></thead>';
+                        const body = document.createElement('tbody');
+                        body.append(...(slots.length ? slots.map(ecs => row(cell(ecs.join(' or ')), cell(ecs.map(ec => data.ec_go[ec]).join(' | '))))
+                                                   : [row(cell('No missing components', '', 2))]));
+                        details.append(body);
+                        const detailsCell = document.createElement('td');
+                        detailsCell.colSpan = 4;
+                        detailsCell.append(details);
+                        const detailsRow = row(detailsCell);
+                        detailsRow.className = 'pathway-details';
+                        const setOpen = open => {
+                            detailsRow.style.display = open ? '' : 'none';
+                            toggle.textContent = open ? '[-]' : '[+]';
+                        };
+                        setOpen(expanded.has(pathway));
+                        toggle.addEventListener('click', () => {
+                            expanded.has(pathway) ? expanded.delete(pathway) : expanded.add(pathway);
+                            setOpen(expanded.has(pathway));
+                        });
+                        const toggleCell = document.createElement('td');
+                        toggleCell.append(toggle);
+                        const summary = row(cell(name), cell(term), cell(complete ? 'Complete' : 'Incomplete', complete ? 'found' : 'missing'), toggleCell);
+                        summary.className = 'pathway-summary';
+                        return [summary, detailsRow];
+                    });
+                    const apply = () => {
+                        const term = search.value.toLowerCase();
+                        const wanted = status.value;
+                        paged.filter(([name, goTerm, complete, slots]) => {
+                            const ecs = slots.flat();
+                            return (wanted === 'all' || (wanted === 'complete') === Boolean(complete)) &&
+                                (!term || matches([name, goTerm, ...ecs, ...ecs.map(ec => data.ec_go[ec])], term));
+                        });
+                    };
+                    search.addEventListener('input', apply);
+                    status.addEventListener('change', apply);
+                    document.getElementById('expand-all-metacyc').addEventListener('click', () => {
+                        paged.shown.forEach(pathway => expanded.add(pathway));
+                        paged.show(paged.page);
+                    });
+                    document.getElementById('collapse-all-metacyc').addEventListener('click', () => {
+                        expanded.clear();
+                        paged.show(paged.page);
+                    });
+                    paged.show(0);
+                });
+
+                // has_part: [annotated term, missing parts, [proteins]], one row per protein
+                lazyTable('protein-table', 'has_part', (table, data) => {
+                    const rows = data.rows.flatMap(([term, missing, proteins]) => proteins.map(protein => [protein, term, missing || 'None']));
+                    const paged = new PagedTable(table, rows, values => [row(...values.map(value => cell(value)))]);
+                    const search = document.getElementById('haspart-search-input');
+                    search.addEventListener('input', () => {
+                        const term = search.value.toLowerCase();
+                        paged.filter(values => !term || matches(values, term));
+                    });
+                    paged.show(0);
+                });
+
+                // Complexes: [GO term, name, status]
+                lazyTable('complex-table', 'complexes', (table, data) => {
+                    new PagedTable(table, data.rows, ([term, name, status]) => [row(cell(term), cell(name),
+                        cell(status.charAt(0).toUpperCase() + status.slice(1), status === 'coherent' ? 'found' : 'missing'))]).show(0);
+                });
+
+                // Violated taxon constraints: [GO term, constraint, taxon, proteins]
+                lazyTable('violations-table', 'violations', (table, data) => {
+                    new PagedTable(table, data.rows, values => [row(...values.map(value => cell(value)))], 'No violated constraints').show(0);
+                });
+            });
@@ -0,0 +1,18 @@
+import os
+import re
+
+import main
+import report
+import aggregate
+
+EXAMPLE_INPUT = 'examples/input/example_annotation_file.tsv'
+
+
+def test_dashboard_stylesheet_is_next_to_it(resources, tmp_path):
+    context = main.evaluation('example_assembly', EXAMPLE_INPUT, resources=resources, output_dir=str(tmp_path))
+    report_file = report.write_report_data(report.report_data(context), str(tmp_path / 'example_assembly'))
+    output_dir = tmp_path / 'comparison'
+    assert aggregate.aggregate([report_file], str(output_dir)) == 1
+    with open(output_dir / 'dashboard.html') as f:
+        stylesheet = re.search(r'<link rel="stylesheet" href="([^"]+)"', f.read()).group(1)
+    assert os.path.isfile(output_dir / stylesheet)
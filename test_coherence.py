@@ -0,0 +1,123 @@
+import ast
+from collections import defaultdict
+
+import main
+import coherence
+from annotations import build_annotation_matrix
+
+
+#### PATHWAY COHERENCE ####
+LEGACY_PATHWAY_FILE = 'constraints/metacyc_GO_v2025-03-16_with_EC.tsv'
+
+
+def legacy_pathway_completeness(pathway_file, ec2go, genome_go_set):
+    # coherence.map_pathways_to_go_terms and analyze_genome before the slot model
+    completeness = {}
+    with open(pathway_file) as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split('\t')
+            original_go_term, pathway = parts[0], parts[1]
+            go_terms_sets = []
+            if len(parts) > 2 and parts[2].strip():
+                for ec_list in ast.literal_eval(parts[2]):
+                    go_terms_set = set()
+                    for ec in ec_list:
+                        go_terms_set.update(ec2go.get(ec, ()))
+                    if go_terms_set:
+                        go_terms_sets.append(go_terms_set)
+            if original_go_term in genome_go_set:
+                completeness[pathway] = not go_terms_sets or any(
+                    all(t in genome_go_set for t in combo) for combo in go_terms_sets)
+    return completeness
+
+
+def test_slots_cover_the_legacy_ec_combinations():
+    assert coherence.load_pathway_slots(LEGACY_PATHWAY_FILE) == coherence.load_pathway_slots(main.pathway_file)
+
+
+def test_pathway_index_matches_legacy(resources, example_annotations):
+    genome_go_set = example_annotations.expanded_genome_terms()
+    expected = legacy_pathway_completeness(LEGACY_PATHWAY_FILE, resources['ec2go_mapping'], genome_go_set)
+    completeness, completed, annotated, details = coherence.analyze_genome(genome_go_set, resources['pathway_index'])
+    assert completeness == expected
+    assert set(completed) == {p for p, complete in expected.items() if complete}
+    assert annotated == set(expected)
+    assert all(details[p]['missing_components'] for p, complete in completeness.items() if not complete)
+
+
+#### COMPLEX COHERENCE ####
+def legacy_complex_terms(obo_file):
+    # coherence.parse_go_ontology + get_all_child_terms before the GOGraph
+    children = defaultdict(set)
+    term_id = None
+    with open(obo_file) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                term_id = None
+            elif line.startswith('id: '):
+                term_id = line[4:]
+            elif term_id and line.startswith('is_a: '):
+                children[line[6:].split('!')[0].strip()].add(term_id)
+            elif term_id and line.startswith('relationship: part_of '):
+                children[line.split()[2]].add(term_id)
+    terms, stack = set(), [coherence.MACROMOLECULAR_COMPLEX]
+    while stack:
+        term = stack.pop()
+        if term not in terms:
+            terms.add(term)
+            stack.extend(children[term])
+    return terms
+
+
+def legacy_classify_complexes(protein_go_terms, complex_child_terms, homodimer_terms=None):
+    complex_term_to_proteins = defaultdict(set)
+    for protein_id, terms in protein_go_terms.items():
+        if coherence.MACROMOLECULAR_COMPLEX in terms:
+            for term in complex_child_terms.intersection(terms):
+                complex_term_to_proteins[term].add(protein_id)
+    return {term: "coherent" if (homodimer_terms and term in homodimer_terms) or len(proteins) > 1 else "incoherent"
+            for term, proteins in complex_term_to_proteins.items()}
+
+
+def complex_annotations(go, example_terms, complex_terms):
+    """
+    The example input plus carriers of every complex term: one protein, two
+    proteins, or one protein with HOMODIMERIZATION activity, in turn.
+    """
+    rows = list(example_terms.items())
+    for i, term in enumerate(sorted(complex_terms)):
+        carriers = 2 if i % 3 == 1 else 1
+        extra = {coherence.HOMODIMERIZATION} if i % 3 == 2 else set()
+        rows.extend((f"complex_{i}_{k}", {term} | extra) for k in range(carriers))
+    return build_annotation_matrix(rows, go)
+
+
+def test_complex_index_matches_legacy(go, example_terms):
+    complex_terms = legacy_complex_terms(main.ontology_file)
+    annotations = complex_annotations(go, example_terms, complex_terms)
+    expanded = dict(annotations.expanded().items())
+    homodimer_terms = {t for p, terms in expanded.items() if coherence.HOMODIMERIZATION in terms
+                       for t in complex_terms & terms}
+
+    expected = legacy_classify_complexes(expanded, complex_terms, homodimer_terms)
+    assert coherence.compile_complexes({}, go).classify(annotations) == expected
+    assert set(expected) == complex_terms
+
+
+def test_complex_index_curated_classes(go, example_terms):
+    complex_terms = sorted(legacy_complex_terms(main.ontology_file))
+    annotations = complex_annotations(go, example_terms, complex_terms)
+    classes = (coherence.SINGLE_SUBUNIT, coherence.EITHER, coherence.MULTI_SUBUNIT)
+    # Offset from the carrier pattern, so multi-subunit complexes also get a single carrier
+    classifications = {t: classes[(i + 2) % 3] for i, t in enumerate(complex_terms)}
+    index = coherence.compile_complexes(classifications, go)
+
+    carriers = defaultdict(set)
+    for protein_id, terms in annotations.expanded().items():
+        for term in terms.intersection(complex_terms):
+            carriers[term].add(protein_id)
+    expected = {t: "coherent" if len(proteins) >= (1 if classifications[t] != coherence.MULTI_SUBUNIT else 2) else "incoherent"
+                for t, proteins in carriers.items()}
+    assert index.classify(annotations) == expected
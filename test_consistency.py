@@ -0,0 +1,75 @@
+import csv
+import os
+from collections import defaultdict
+
+import pandas as pd
+
+import main
+import consistency
+
+EXAMPLE_OUTPUTS = 'examples/outputs'
+BUNDLED_GENOME = 'GCF_000007085.1_ASM708v1'
+
+
+def legacy_check_consistency(protein_go_terms, constraints_file, output_file):
+    # consistency.check_consistency before the compiled TaxonConstraints
+    constraints = pd.read_csv(constraints_file, sep="\t", dtype=str)
+    only_map = defaultdict(set)
+    never_map = defaultdict(set)
+    for _, row in constraints.iterrows():
+        if row["Constraint_Type"] == "only_in_taxon":
+            only_map[row["GO_ID"]].add(row["Taxon_ID"])
+        elif row["Constraint_Type"] == "never_in_taxon":
+            never_map[row["GO_ID"]].add(row["Taxon_ID"])
+    with open(output_file, 'w') as out:
+        out.write("protein_name\tGO_ID\tnever_in_taxon\tonly_in_taxon\n")
+        for protein_id, go_terms in protein_go_terms.items():
+            for go in go_terms:
+                only_taxa = list(only_map[go])
+                never_taxa = list(never_map[go])
+                if only_taxa or never_taxa:
+                    out.write("\t".join([protein_id, go, ",".join(never_taxa), ",".join(only_taxa)]) + "\n")
+    return output_file
+
+
+def consistency_rows(consistency_file):
+    """Rows of a _consistency.tsv table, with the taxa as sets (their order is arbitrary)."""
+    with open(consistency_file) as f:
+        return {(row['protein_name'], row['GO_ID'], frozenset(filter(None, row['never_in_taxon'].split(','))),
+                 frozenset(filter(None, row['only_in_taxon'].split(','))))
+                for row in csv.DictReader(f, delimiter='\t')}
+
+
+def test_check_consistency_matches_legacy(resources, example_annotations, tmp_path):
+    expanded = example_annotations.expanded()
+    legacy_file = legacy_check_consistency(dict(expanded.items()), main.taxa_constraints_file, str(tmp_path / 'legacy.tsv'))
+    native_file = str(tmp_path / 'native.tsv')
+    hits = consistency.check_consistency(expanded, resources['taxon_constraints'], native_file)
+
+    expected = consistency_rows(legacy_file)
+    assert consistency_rows(native_file) == expected
+    assert sum(count for count, _ in hits.values()) == len(expected)
+
+
+def test_taxon_satisfiability_matches_groovy(resources, tmp_path):
+    # The bundled _consistency.tsv and taxon_consistency.groovy output were
+    # produced together, so they pin the native check whatever the OBO
+    constraints = resources['taxon_constraints']
+    index = {go_id: c for c, go_id in enumerate(constraints.go_ids)}
+    hits = {}
+    for protein_id, go_id, _, _ in sorted(consistency_rows(os.path.join(EXAMPLE_OUTPUTS, 'example_assembly_consistency.tsv'))):
+        count, examples = hits.get(index[go_id], (0, []))
+        hits[index[go_id]] = (count + 1, examples + [protein_id][:consistency.EXPLANATION_EXAMPLES - len(examples)])
+
+    with open(os.path.join(EXAMPLE_OUTPUTS, 'example_assembly_taxon_explanations.tsv')) as f:
+        expected = next(csv.DictReader(f, delimiter='\t'))
+    output_file = str(tmp_path / 'explanations.tsv')
+    satisfiable, pairs = consistency.check_taxon_consistency(BUNDLED_GENOME, hits, constraints, resources['taxon_lattice'], output_file)
+
+    assert str(satisfiable).lower() == expected['IsSatisfiable']
+    # Every minimal conflict goes through the never_in_taxon cellular
+    # organisms constraint that the Groovy explanation also lists
+    assert 'requires never in taxon T131567' in expected['Explanation']
+    assert pairs and all('NCBITaxon_131567' + consistency.NEGATION_SUFFIX in pair[:2] for pair in pairs)
+    with open(output_file) as f:
+        assert next(csv.DictReader(f, delimiter='\t'))['Genome'] == BUNDLED_GENOME
@@ -0,0 +1,77 @@
+import coherence
+from annotations import build_annotation_matrix
+from incremental import EvaluationState
+
+
+def revise(example_terms):
+    """
+    A revision of the example input: every 7th protein removed, every 5th
+    given the terms of its neighbour, a few new proteins and a changed order.
+
+    Returns:
+    - tuple: (rows, numbers of added, removed and changed proteins)
+    """
+    proteins = list(example_terms)
+    rows, removed, changed = [], 0, 0
+    for i, protein_id in enumerate(proteins):
+        terms = set(example_terms[protein_id])
+        if i % 7 == 0:
+            removed += 1
+            continue
+        if i % 5 == 0:
+            revised = terms | example_terms[proteins[i - 1]]
+            if revised != terms:
+                changed += 1
+            terms = revised
+        rows.append((protein_id, terms))
+    added = [(f"new_{i}", set(example_terms[proteins[i]])) for i in range(0, 60, 3)]
+    rows = rows[len(rows) // 2:] + added + rows[:len(rows) // 2]
+    return rows, {'added': len(added), 'removed': removed, 'changed': changed}
+
+
+def assert_matches_full_path(state, annotations, resources):
+    genome_go_terms = annotations.expanded_genome_terms()
+    assert state.genome_terms() == genome_go_terms
+    assert dict(state.expanded_annotations().items()) == dict(annotations.expanded().items())
+    assert state.pathway_results(resources['pathway_index']) == coherence.analyze_genome(genome_go_terms, resources['pathway_index'])
+    assert state.has_part_results(resources['has_part_dict']) == coherence.check_has_part(annotations, resources['has_part_dict'])
+    assert state.complex_classifications(resources['complex_index']) == resources['complex_index'].classify(annotations)
+
+
+def update(state, annotations, resources):
+    return state.update(annotations, resources['pathway_index'], resources['has_part_dict'], resources['complex_index'])
+
+
+def test_incremental_diff_matches_full_evaluation(go, resources, example_terms, example_annotations, tmp_path):
+    state = EvaluationState.empty(go, 'fingerprint')
+    changes = update(state, example_annotations, resources)
+    assert (changes['added'], changes['removed'], changes['changed']) == (len(example_annotations), 0, 0)
+    assert_matches_full_path(state, example_annotations, resources)
+
+    rows, expected = revise(example_terms)
+    revised = build_annotation_matrix(rows, go)
+    changes = update(state, revised, resources)
+    assert {k: changes[k] for k in expected} == expected
+    assert_matches_full_path(state, revised, resources)
+
+    # A saved state picks up where it left off; back to the original input
+    state.save(str(tmp_path / 'state'))
+    loaded = EvaluationState.load(str(tmp_path / 'state'), go, 'fingerprint')
+    assert_matches_full_path(loaded, revised, resources)
+    changes = update(loaded, example_annotations, resources)
+    assert (changes['added'], changes['removed']) == (expected['removed'], expected['added'])
+    assert_matches_full_path(loaded, example_annotations, resources)
+
+
+def test_unchanged_input_recomputes_nothing(go, resources, example_annotations):
+    state = EvaluationState.empty(go, 'fingerprint')
+    update(state, example_annotations, resources)
+    changes = update(state, example_annotations, resources)
+    assert changes == {'added': 0, 'removed': 0, 'changed': 0, 'changed_terms': 0, 'rescored_pathways': 0}
+
+
+def test_stale_state_is_not_loaded(go, resources, example_annotations, tmp_path):
+    state = EvaluationState.empty(go, 'fingerprint')
+    update(state, example_annotations, resources)
+    state.save(str(tmp_path / 'state'))
+    assert EvaluationState.load(str(tmp_path / 'state'), go, 'other resources') is None
@@ -0,0 +1,76 @@
+import math
+
+import pytest
+
+import main
+from utils import Ontology
+from information_content import (compute_ic, annotation_counts, save_ic_reference, load_ic_reference,
+                                 compare_ic_files, calculate_ic_depth_breadth)
+
+EXAMPLE_INPUT = 'examples/input/example_annotation_file.tsv'
+SPECIFIC_TERMS = 'examples/outputs/example_assembly_specific_GO_terms.tsv'
+GROOVY_IC = 'examples/outputs/example_assembly_IC.tsv'
+
+
+def read_ic_rows(ic_file):
+    with open(ic_file) as f:
+        return [[float(x) for x in line.split('\t') if x.strip()] for line in f]
+
+
+def resnik_reference(protein_go_terms, ontology):
+    """Normalized Resnik IC rows, by direct counting over the is_a ancestors of each protein."""
+    annotated = [terms for terms in protein_go_terms.values() if terms]
+    total = len(annotated)
+    counts = {}
+    for terms in annotated:
+        for term in set().union(*(ontology.get_ancestors(t) for t in terms)):
+            counts[term] = counts.get(term, 0) + 1
+    ic = lambda t: math.log(total / counts[t]) / math.log(total) if t in counts else 0.0
+    return [[ic(t) for t in sorted(terms)] for terms in annotated]
+
+
+@pytest.fixture(scope='module')
+def specific_terms(resources):
+    return main.load_annotations(SPECIFIC_TERMS)
+
+
+def test_native_ic_matches_resnik_reference(go, specific_terms, tmp_path):
+    output_file = compute_ic(specific_terms, go, str(tmp_path / 'native_IC.tsv'))
+    expected = resnik_reference(specific_terms, Ontology(main.ontology_file, with_rels=False))
+    rows = read_ic_rows(output_file)
+    assert len(rows) == len(expected)
+    for row, expected_row in zip(rows, expected):
+        assert row == pytest.approx(expected_row, rel=1e-12, abs=1e-12)
+
+
+def test_reference_corpus_round_trip(go, specific_terms, tmp_path):
+    reference_file = save_ic_reference(*annotation_counts(specific_terms, go), go, str(tmp_path / 'reference.tsv'))
+    own = compute_ic(specific_terms, go, str(tmp_path / 'own_IC.tsv'))
+    shared = compute_ic(specific_terms, go, str(tmp_path / 'shared_IC.tsv'), load_ic_reference(reference_file, go))
+    assert read_ic_rows(shared) == read_ic_rows(own)
+
+
+def test_validate_aligns_groovy_rows(go, specific_terms, tmp_path):
+    # ICVector.groovy writes its rows in reverse order of the specific terms.
+    # Only the alignment is pinned: the bundled table comes from the real GO
+    # through slib, so its values are not comparable with the synthetic graph
+    output_file = compute_ic(specific_terms, go, str(tmp_path / 'native_IC.tsv'))
+    aligned = compare_ic_files(GROOVY_IC, output_file, expected_reversed=True)
+    assert aligned['mismatched_rows'] == 0
+    assert aligned['values'] == sum(map(len, specific_terms.values()))
+    assert compare_ic_files(GROOVY_IC, output_file)['mismatched_rows'] > 0
+
+
+def test_one_protein_genome(go, specific_terms, tmp_path):
+    # Every term of a lone protein is seen in the whole corpus
+    protein_id, terms = next((p, t) for p, t in specific_terms.items() if len(t) > 1)
+    rows = read_ic_rows(compute_ic({protein_id: terms}, go, str(tmp_path / 'one_IC.tsv')))
+    assert rows == [[0.0] * len(terms)]
+
+
+def test_native_ic_is_opt_in(resources, tmp_path):
+    # Without --groovy, IC is only computed with --native_ic (or --ic_reference)
+    context = main.evaluation('example_assembly', EXAMPLE_INPUT, resources=resources, output_dir=str(tmp_path))
+    assert 'ic_depth' not in context and not (tmp_path / 'example_assembly_IC.tsv').exists()
+    context = main.evaluation('example_assembly', EXAMPLE_INPUT, resources=resources, output_dir=str(tmp_path), native_ic=True)
+    assert context['ic_depth'] == calculate_ic_depth_breadth(str(tmp_path / 'example_assembly_IC.tsv'))['ic_depth']
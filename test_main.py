@@ -0,0 +1,67 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+import plots
+from profiling import Profiler
+
+EXAMPLE_INPUT = 'examples/input/example_annotation_file.tsv'
+
+
+def test_profile_expands_annotations_in_its_own_stage(resources, tmp_path):
+    profiler = Profiler()
+    main.evaluation('example_assembly', EXAMPLE_INPUT, resources=resources, output_dir=str(tmp_path), profiler=profiler)
+    stages = {s['stage']: s for s in profiler.summary()}
+    assert stages['expand_annotations']['counts']['expanded_annotations'] > 0
+    assert list(stages).index('expand_annotations') < list(stages).index('taxon_constraints')
+
+
+@pytest.fixture
+def client(resources, tmp_path, monkeypatch):
+    """A test client of the service mode, evaluating on a thread pool."""
+    monkeypatch.setattr(main, '_batch_resources', resources)
+    assets = {k: '../' + v for k, v in plots.write_report_assets(str(tmp_path)).items()}
+    report_options = {'report_tables': 'inline', 'report_format': 'legacy', 'assets': assets}
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(main, '_service', main.EvaluationService(str(tmp_path), pool, report_options, {}))
+        yield main.app.test_client()
+
+
+def submit(client, data, **fields):
+    fields['annotation_file'] = (io.BytesIO(data), 'annotations.tsv')
+    return client.post('/evaluations?wait=60', data=fields, content_type='multipart/form-data')
+
+
+def test_evaluation_round_trip(client):
+    with open(EXAMPLE_INPUT, 'rb') as f:
+        response = submit(client, f.read(), assembly_name='example_assembly')
+    assert response.status_code == 200
+    view = response.get_json()
+    assert main.KEY_PATTERN.fullmatch(view['id']) and view['status'] == 'done'
+    assert client.get(f"/evaluations/{view['id']}").status_code == 200
+    assert client.get(view['report_data']).status_code == 200
+    # The upload itself is not served
+    assert client.get(f"/evaluations/{view['id']}/annotations.tsv").status_code == 404
+
+
+def test_failed_evaluation_is_a_server_error(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('evaluation failed')
+    monkeypatch.setattr(main, 'evaluation', fail)
+    response = submit(client, b'protein\tGO:0008150\n')
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'RuntimeError: evaluation failed'
+    assert client.get(f"/evaluations/{response.get_json()['id']}").status_code == 500
+
+
+@pytest.mark.parametrize('key', ['..', '..%2F..%2Fetc', 'A' * 64, '0' * 63, '0' * 32])
+def test_malformed_keys_are_rejected(client, tmp_path, key):
+    # Nothing outside the service directory is looked at
+    os.makedirs(tmp_path / ('0' * 32), exist_ok=True)
+    (tmp_path / ('0' * 32) / 'result.json').write_text('{"assembly_name": "x", "summary": {}}')
+    assert client.get(f"/evaluations/{key}").status_code == 404
+    assert client.get(f"/evaluations/{key}/x_report.html").status_code == 404
+    assert not main.EvaluationService.valid_key(key.replace('%2F', '/'))
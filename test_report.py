@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import main
+import report
+
+EXAMPLE_INPUT = 'examples/input/example_annotation_file.tsv'
+
+
+@pytest.fixture(scope='module')
+def example_report(resources, tmp_path_factory):
+    """Report data of a full evaluation of the example input."""
+    output_dir = str(tmp_path_factory.mktemp('report'))
+    return report.report_data(main.evaluation('example_assembly', EXAMPLE_INPUT, resources=resources, output_dir=output_dir))
+
+
+def test_encode_decode_round_trip(example_report):
+    encoded = json.loads(json.dumps(report.encode_report(example_report)))
+    assert encoded['schema'] == report.REPORT_SCHEMA
+    decoded = report.decode_report(encoded)
+    assert decoded == example_report
+    # Row order is part of the report, not only the set of rows
+    assert decoded['has_part_data'] == example_report['has_part_data']
+    assert list(decoded['pathway_details']) == list(example_report['pathway_details'])
+
+
+@pytest.mark.parametrize('fmt', ['json', 'json.gz', 'msgpack'])
+def test_written_report_round_trip(example_report, fmt, tmp_path):
+    if fmt == 'msgpack':
+        pytest.importorskip('msgpack')
+    path = report.write_report_data(example_report, str(tmp_path / 'example_assembly'), fmt)
+    assert report.load_report(path) == example_report
+
+
+def test_newer_schema_is_rejected(example_report):
+    encoded = report.encode_report(example_report)
+    encoded['version'] = report.REPORT_SCHEMA_VERSION + 1
+    with pytest.raises(ValueError):
+        report.decode_report(encoded)
+
+
+def test_default_format_is_the_legacy_dump(example_report, tmp_path):
+    # Consumers of the previous _report.json keep reading the same layout
+    path = report.write_report_data(example_report, str(tmp_path / 'example_assembly'))
+    with open(path) as f:
+        data = json.load(f)
+    assert path.endswith('_report.json') and 'schema' not in data
+    assert data['essential_percentage'] == example_report['essential_percentage']
+    assert report.load_report(path)['found_terms'] == example_report['found_terms']
@@ -0,0 +1,42 @@
+from utils import get_ancestors, get_specific
+from annotations import build_annotation_matrix
+
+
+def legacy_get_specific(protein_go_terms, ontology):
+    # utils.get_specific before the closure rewrite
+    result = {}
+    for protein_id, terms in protein_go_terms.items():
+        specific = set(terms)
+        for term in terms:
+            ancestors = set(ontology.get_ancestors(term))
+            ancestors.discard(term)
+            specific -= ancestors
+        result[protein_id] = specific
+    return result
+
+
+def test_get_specific_matches_legacy(go, legacy_ontology, example_terms):
+    expected = legacy_get_specific(example_terms, legacy_ontology)
+    assert get_specific(example_terms, go) == expected
+    # Terms are dropped on the example, so the comparison is not vacuous
+    assert expected != example_terms
+
+
+def test_annotation_matrix_specific_matches_legacy(legacy_ontology, example_terms, example_annotations):
+    assert dict(example_annotations.specific().items()) == legacy_get_specific(example_terms, legacy_ontology)
+
+
+def test_get_ancestors_matches_legacy(go, legacy_ontology, example_terms):
+    expected = {protein_id: set().union(*(legacy_ontology.get_ancestors(t) for t in terms))
+                for protein_id, terms in example_terms.items()}
+    assert get_ancestors(example_terms, go) == expected
+
+
+def test_alt_ids_expand_from_their_primary_term(go, legacy_ontology):
+    # The annotation matrix reads an alt_id as its primary term, so the
+    # expanded set has the primary ID where the legacy one kept the alt_id;
+    # the most specific terms keep the ID as written
+    alt_id, primary = sorted(go.alt_ids.items())[0]
+    annotations = build_annotation_matrix([('protein', {alt_id})], go)
+    assert annotations.expanded()['protein'] == legacy_ontology.get_ancestors(alt_id) - {alt_id} | {primary}
+    assert dict(annotations.specific().items()) == {'protein': {alt_id}}
@@ -2,6 +2,8 @@ from collections import deque, Counter
 import warnings
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
 from xml.etree import ElementTree as ET
 import math
 
@@ -160,47 +162,380 @@ class Ontology(object):
 
 
 
+IS_A = 'is_a'
+PART_OF = 'part_of'
+NAMESPACE_LIST = [NAMESPACES['bp'], NAMESPACES['mf'], NAMESPACES['cc']]
+
+
+class GOGraph(object):
+    """
+    Compact, integer-indexed GO graph shared by every metric.
+
+    Terms are numbered 0..n-1 in file order. Parent and child edges are
+    stored CSR-style: the parents of term i are
+    parent_idx[parent_ptr[i]:parent_ptr[i + 1]], and parent_rel holds the
+    index of the edge's relation in `relations` (0 is always 'is_a').
+    Obsolete terms keep their slot but are never returned by lookups;
+    alt_ids resolve to the index of their primary term.
+    """
+
+    def __init__(self, ids, names, namespace, obsolete, alt_ids, relations,
+                 parent_ptr, parent_idx, parent_rel):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.namespace = np.asarray(namespace, dtype=np.int8)
+        self.obsolete = np.asarray(obsolete, dtype=bool)
+        self.alt_ids = dict(alt_ids)
+        self.relations = list(relations)
+        self.parent_ptr = np.asarray(parent_ptr, dtype=np.int64)
+        self.parent_idx = np.asarray(parent_idx, dtype=np.int32)
+        self.parent_rel = np.asarray(parent_rel, dtype=np.int8)
+
+        self.closure = None
+        self._strict_closure = None
+        self._relation_closures = {}
+
+        self.index = {term_id: i for i, term_id in enumerate(self.ids)}
+        for alt_id, term_id in self.alt_ids.items():
+            self.index.setdefault(alt_id, self.index[term_id])
+
+        # Children are the transpose of the parent edges
+        n = len(self.ids)
+        sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.parent_ptr))
+        order = np.argsort(self.parent_idx, kind='stable')
+        self.child_idx = sources[order]
+        self.child_rel = self.parent_rel[order]
+        self.child_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent_idx, minlength=n), out=self.child_ptr[1:])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def term_index(self, term_id):
+        """Integer index of a primary or alt id, or None if unknown/obsolete."""
+        i = self.index.get(term_id)
+        if i is None or self.obsolete[i]:
+            return None
+        return i
+
+    def has_term(self, term_id):
+        return self.term_index(term_id) is not None
+
+    def get_name(self, term_id):
+        i = self.term_index(term_id)
+        return self.names[i] if i is not None else None
+
+    def get_namespace(self, term_id):
+        i = self.term_index(term_id)
+        if i is None or self.namespace[i] < 0:
+            return None
+        return NAMESPACE_LIST[self.namespace[i]]
+
+    def relation_codes(self, relations):
+        """Array of relation codes for the given names (None means all)."""
+        if relations is None:
+            return np.arange(len(self.relations), dtype=np.int8)
+        return np.array([self.relations.index(r) for r in relations if r in self.relations], dtype=np.int8)
+
+    def parent_indices(self, i, relations=None):
+        lo, hi = self.parent_ptr[i], self.parent_ptr[i + 1]
+        parents = self.parent_idx[lo:hi]
+        if relations is not None:
+            parents = parents[np.isin(self.parent_rel[lo:hi], self.relation_codes(relations))]
+        return parents
+
+    def child_indices(self, i, relations=None):
+        lo, hi = self.child_ptr[i], self.child_ptr[i + 1]
+        children = self.child_idx[lo:hi]
+        if relations is not None:
+            children = children[np.isin(self.child_rel[lo:hi], self.relation_codes(relations))]
+        return children
+
+    def get_parents(self, term_id, relations=None):
+        i = self.term_index(term_id)
+        if i is None:
+            return set()
+        return {self.ids[p] for p in self.parent_indices(i, relations)}
+
+    def _reachable(self, start, step):
+        seen = {start}
+        q = deque([start])
+        while q:
+            for j in step(q.popleft()):
+                j = int(j)
+                if j not in seen:
+                    seen.add(j)
+                    q.append(j)
+        return seen
+
+    def ancestor_indices(self, i, relations=None):
+        """Indices reachable from i through parent edges, including i."""
+        return self._reachable(i, lambda t: self.parent_indices(t, relations))
+
+    def descendant_indices(self, i, relations=None):
+        """Indices reachable from i through child edges, including i."""
+        return self._reachable(i, lambda t: self.child_indices(t, relations))
+
+    def ancestor_closure(self, relations=None):
+        """
+        Ancestor-closure matrix (built on first use). relations=None follows
+        every relation; other relation subsets are memoized separately.
+        """
+        if relations is not None:
+            key = tuple(sorted(relations))
+            if key not in self._relation_closures:
+                self._relation_closures[key] = build_ancestor_closure(self, relations)
+            return self._relation_closures[key]
+        if self.closure is None:
+            self.closure = build_ancestor_closure(self)
+        return self.closure
+
+    def strict_ancestor_closure(self):
+        """Ancestor-closure matrix without the diagonal (a term is not its own ancestor)."""
+        if self._strict_closure is None:
+            closure = self.ancestor_closure().tocoo()
+            keep = closure.row != closure.col
+            self._strict_closure = sp.csr_matrix((closure.data[keep], (closure.row[keep], closure.col[keep])),
+                                                 shape=closure.shape)
+        return self._strict_closure
+
+    def get_ancestors(self, term_id, relations=None):
+        i = self.term_index(term_id)
+        if i is None:
+            return set()
+        if relations is None:
+            closure = self.ancestor_closure()
+            rows = closure.indices[closure.indptr[i]:closure.indptr[i + 1]]
+        else:
+            rows = self.ancestor_indices(i, relations)
+        return {self.ids[j] for j in rows}
+
+    def get_descendants(self, term_id, relations=None):
+        i = self.term_index(term_id)
+        if i is None:
+            return set()
+        return {self.ids[j] for j in self.descendant_indices(i, relations)}
+
+
+def load_go_graph(filename='data/go-basic.obo'):
+    """
+    Parses an OBO file once into a GOGraph.
+
+    Every `is_a` line and every `relationship:` line becomes a parent edge
+    tagged with its relation type, so consumers can choose which edges to
+    follow (e.g. all relations for annotation propagation, is_a/part_of for
+    complex descendants).
+    """
+    return parse_obo(filename)[0]
+
+
+def parse_obo(filename, tags=()):
+    """
+    Streams an OBO file once into a GOGraph (see load_go_graph), also
+    collecting the values of the given other term tags (e.g. 'xref', 'def').
+
+    Returns:
+    - GOGraph
+    - dict: {tag: list of (term ID, value) in file order}
+    """
+    tagged = {tag: [] for tag in tags}
+    ids, names, namespace, obsolete = [], [], [], []
+    alt_ids = {}
+    raw_parents = []
+    relations = [IS_A]
+    rel_code = {IS_A: 0}
+    ns_code = {ns: k for k, ns in enumerate(NAMESPACE_LIST)}
+
+    in_term = False
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == '[':
+                in_term = line == '[Term]'
+                if in_term:
+                    ids.append(None)
+                    names.append('')
+                    namespace.append(-1)
+                    obsolete.append(False)
+                    raw_parents.append([])
+                continue
+            if not in_term:
+                continue
+            key, _, value = line.partition(': ')
+            if key == 'id':
+                ids[-1] = value
+            elif key == 'name':
+                names[-1] = value
+            elif key == 'namespace':
+                namespace[-1] = ns_code.get(value, -1)
+            elif key == 'alt_id':
+                alt_ids[value] = len(ids) - 1
+            elif key == 'is_a':
+                raw_parents[-1].append((value.split(' ! ')[0], 0))
+            elif key == 'relationship':
+                it = value.split()
+                if it[0] not in rel_code:
+                    rel_code[it[0]] = len(relations)
+                    relations.append(it[0])
+                raw_parents[-1].append((it[1], rel_code[it[0]]))
+            elif key == 'is_obsolete' and value == 'true':
+                obsolete[-1] = True
+            elif key in tagged:
+                tagged[key].append((len(ids) - 1, value))
+
+    index = {term_id: i for i, term_id in enumerate(ids)}
+    alt_ids = {alt_id: ids[i] for alt_id, i in alt_ids.items() if alt_id not in index}
+    for alt_id, term_id in alt_ids.items():
+        index[alt_id] = index[term_id]
+
+    parent_ptr = [0]
+    parent_idx, parent_rel = [], []
+    for i, parents in enumerate(raw_parents):
+        edges = set()
+        for p_id, rel in parents:
+            j = index.get(p_id)
+            if j is not None and not obsolete[j] and (j, rel) not in edges:
+                edges.add((j, rel))
+                parent_idx.append(j)
+                parent_rel.append(rel)
+        parent_ptr.append(len(parent_idx))
+
+    go = GOGraph(ids, names, namespace, obsolete, alt_ids, relations,
+                 parent_ptr, parent_idx, parent_rel)
+    return go, {tag: [(ids[i], value) for i, value in values] for tag, values in tagged.items()}
+
+
+def build_ancestor_closure(go, relations=None):
+    """
+    Transitive closure of the parent edges as an n x n boolean CSR matrix:
+    row i holds every ancestor of term i, including i itself.
+
+    Cycles (e.g. through has_part/part_of pairs) are collapsed into strongly
+    connected components first, so each component's closure is computed
+    once, in topological order, from the closures of its parent components.
+    """
+    n = len(go)
+    children = np.repeat(np.arange(n, dtype=np.int32), np.diff(go.parent_ptr))
+    parents = go.parent_idx
+    if relations is not None:
+        keep = np.isin(go.parent_rel, go.relation_codes(relations))
+        children, parents = children[keep], parents[keep]
+    edges = sp.csr_matrix((np.ones(len(children), dtype=bool), (children, parents)), shape=(n, n))
+    n_comp, labels = connected_components(edges, directed=True, connection='strong')
+
+    order = np.argsort(labels, kind='stable').astype(np.int32)
+    member_ptr = np.zeros(n_comp + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=n_comp), out=member_ptr[1:])
+
+    comp_edges = {(c, p) for c, p in zip(labels[children].tolist(), labels[parents].tolist()) if c != p}
+    comp_parents = [[] for _ in range(n_comp)]
+    comp_children = [[] for _ in range(n_comp)]
+    pending = [0] * n_comp
+    for c, p in comp_edges:
+        comp_parents[c].append(p)
+        comp_children[p].append(c)
+        pending[c] += 1
+
+    closure = [None] * n_comp
+    q = deque(c for c in range(n_comp) if pending[c] == 0)
+    while q:
+        c = q.popleft()
+        parts = [order[member_ptr[c]:member_ptr[c + 1]]]
+        parts.extend(closure[p] for p in comp_parents[c])
+        closure[c] = np.unique(np.concatenate(parts)) if len(parts) > 1 else np.sort(parts[0])
+        for child in comp_children[c]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                q.append(child)
+
+    lengths = np.array([len(closure[c]) for c in labels], dtype=np.int64)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate([closure[c] for c in labels]) if n else np.zeros(0, dtype=np.int32)
+    return sp.csr_matrix((np.ones(len(indices), dtype=bool), indices.astype(np.int32), indptr), shape=(n, n))
+
+
+def annotation_matrix(protein_go_terms, go):
+    """
+    Protein x term incidence matrix of the annotated terms.
+
+    Terms are mapped through go.term_index (alt_ids resolve to their primary
+    term); unknown and obsolete terms are left out.
+
+    Returns:
+    - tuple: (list of protein IDs, boolean CSR matrix of shape (proteins, terms))
+    """
+    proteins = list(protein_go_terms)
+    indptr = [0]
+    indices = []
+    for protein_id in proteins:
+        idx = {go.term_index(t) for t in protein_go_terms[protein_id]}
+        idx.discard(None)
+        indices.extend(sorted(idx))
+        indptr.append(len(indices))
+    matrix = sp.csr_matrix((np.ones(len(indices), dtype=bool), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                           shape=(len(proteins), len(go)))
+    return proteins, matrix
+
+
+def expand_annotations(matrix, go, relations=None):
+    """Propagates an incidence matrix to all ancestors (one sparse product)."""
+    return (matrix @ go.ancestor_closure(relations)).tocsr()
+
+
+def matrix_to_sets(proteins, matrix, go):
+    """Converts rows of an incidence matrix back to {protein_id: set(GO_terms)}."""
+    ids = go.ids
+    indptr, indices = matrix.indptr, matrix.indices
+    return {protein_id: set(map(ids.__getitem__, indices[indptr[r]:indptr[r + 1]].tolist()))
+            for r, protein_id in enumerate(proteins)}
+
+
 #### GET ANCESTORS ####
 
-def get_ancestors(protein_go_terms, obo_file='data/go-basic.obo'):
+def get_ancestors(protein_go_terms, go):
     """
     Expands GO terms to include their ancestors for each protein.
 
     Parameters:
     - protein_go_terms (dict): {protein_id: set(GO_terms)}
-    - obo_file (str): Path to GO ontology file
+    - go (GOGraph): Parsed GO graph (see load_go_graph)
 
     Returns:
     - dict: {protein_id: set(GO_terms + ancestors)}
     """
-    go = Ontology(obo_file, with_rels=True)
-    result = {}
-    for protein_id, terms in protein_go_terms.items():
-        expanded = set()
-        for term in terms:
-            expanded.update(go.get_ancestors(term))
-        result[protein_id] = expanded
-    return result
+    proteins, matrix = annotation_matrix(protein_go_terms, go)
+    return matrix_to_sets(proteins, expand_annotations(matrix, go), go)
 
 #### GET SPECIFIC TERMS ####
-def get_specific(protein_go_terms, obo_file='data/go-basic.obo'):
+def get_specific(protein_go_terms, go):
     """
     Filters GO terms to retain only the most specific (non-ancestor) terms.
 
+    A term is dropped when it is a proper ancestor of another term annotated
+    to the same protein. All proteins are handled at once: the incidence
+    matrix times the strict ancestor closure marks every proper ancestor of
+    each protein's terms, and its overlap with the incidence matrix is the
+    redundant set. Terms missing from the ontology are kept as they are.
+
     Parameters:
     - protein_go_terms (dict): {protein_id: set(GO_terms)}
-    - obo_file (str): Path to GO ontology file
+    - go (GOGraph): Parsed GO graph (see load_go_graph)
 
     Returns:
     - dict: {protein_id: set(most specific GO_terms)}
     """
-    go = Ontology(obo_file, with_rels=True)
+    proteins, matrix = annotation_matrix(protein_go_terms, go)
+    redundant = matrix.multiply(matrix @ go.strict_ancestor_closure()).tocsr()
+    indptr, indices = redundant.indptr, redundant.indices
     result = {}
-    for protein_id, terms in protein_go_terms.items():
-        specific = set(terms)
-        for term in terms:
-            ancestors = go.get_ancestors(term)
-            ancestors.discard(term)
-            specific -= ancestors
-        result[protein_id] = specific
+    for r, protein_id in enumerate(proteins):
+        terms = protein_go_terms[protein_id]
+        if indptr[r] == indptr[r + 1]:
+            result[protein_id] = set(terms)
+            continue
+        drop = set(indices[indptr[r]:indptr[r + 1]].tolist())
+        result[protein_id] = {t for t in terms if go.term_index(t) not in drop}
     return result